@@ -0,0 +1,103 @@
+""" Recall@k and latency of approximate label search against exact search.
+
+For every ontology in resources/ontologies the label embedding index is loaded (or built),
+then each sampled label vector is used as a query against the rest of its category.
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/ann_recall.py --k 10 --n-probe 1 2 4 8 16 32
+"""
+import argparse
+import glob
+import json
+import time
+from typing import List
+
+import numpy as np
+
+from seequery.embeddings.label_index import LabelEmbeddingIndex
+from seequery.embeddings.vector_search import ExactSearch, IVFFlatSearch
+from seequery.ontology.ontology_manager import OntologyManager
+from seequery.pipeline.linker.bert_linker import BertVectorizer
+
+
+def recall_report(matrix: np.ndarray, k: int, n_probes: List[int], n_lists: int,
+                  n_queries: int, seed: int = 0) -> List[dict]:
+    """ Compare IVF search with exact search on one matrix of unit length label vectors.
+
+    Args:
+        matrix (np.ndarray): unit length label vectors
+        k (int): number of neighbours compared
+        n_probes (List[int]): n_probe values to evaluate
+        n_lists (int): IVF clusters, 0 picks sqrt(label count)
+        n_queries (int): number of labels used as queries
+        seed (int): random seed used to sample queries
+
+    Returns:
+        List[dict]: one row per n_probe value
+    """
+    rng = np.random.RandomState(seed)
+    query_ids = rng.choice(len(matrix), min(n_queries, len(matrix)), replace=False)
+    n_lists = n_lists or int(np.sqrt(len(matrix)))
+
+    exact = ExactSearch(matrix)
+    start = time.perf_counter()
+    # the query label itself is always its own nearest neighbour, ask for one more and drop it
+    expected = [set(exact.search(matrix[i], k + 1)[0]) - {i} for i in query_ids]
+    exact_ms = 1000 * (time.perf_counter() - start) / len(query_ids)
+
+    rows = []
+    for n_probe in n_probes:
+        start = time.perf_counter()
+        ivf = IVFFlatSearch(matrix, n_lists, n_probe)
+        build_s = time.perf_counter() - start
+
+        hits = 0.0
+        start = time.perf_counter()
+        for i, neighbours in zip(query_ids, expected):
+            found = set(ivf.search(matrix[i], k + 1)[0]) - {i}
+            hits += len(found & neighbours) / max(len(neighbours), 1)
+        ann_ms = 1000 * (time.perf_counter() - start) / len(query_ids)
+
+        rows.append({"n_lists": ivf.n_lists, "n_probe": ivf.n_probe, f"recall@{k}": hits / len(query_ids),
+                     "ann_ms": ann_ms, "exact_ms": exact_ms, "build_s": build_s})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ontologies', nargs='*', default=sorted(glob.glob('resources/ontologies/*.owl')))
+    parser.add_argument('--index-dir', default='resources/embeddings/label_index')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--n-lists', type=int, default=0)
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--min-labels', type=int, default=200, help='skip smaller categories')
+    parser.add_argument('--output', help='store the report as JSON')
+    args = parser.parse_args()
+
+    vectorizer = BertVectorizer()
+    report = []
+    for path in args.ontologies:
+        ontology_mngr = OntologyManager({'onto_id': path})
+        index = LabelEmbeddingIndex.load_or_build(ontology_mngr, vectorizer, args.index_dir)
+        for category in ontology_mngr.onto_map:
+            labels = index.labels(category)
+            if len(labels) < max(args.min_labels, args.k + 1):
+                continue
+            matrix = np.asarray(index.vectors(category), dtype=np.float32)
+            matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-8)
+            for row in recall_report(matrix, args.k, args.n_probe, args.n_lists, args.queries):
+                row.update({"ontology": path, "category": category.name, "labels": len(labels)})
+                report.append(row)
+                print(f"{path}\t{category.name}\t{len(labels)} labels\tn_lists={row['n_lists']}\t"
+                      f"n_probe={row['n_probe']}\trecall@{args.k}={row[f'recall@{args.k}']:.3f}\t"
+                      f"ann={row['ann_ms']:.3f}ms\texact={row['exact_ms']:.3f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+""" Accuracy guard, latency and memory of int8 and bf16 BERT backends against fp32.
+
+Each evaluation set is translated with every backend. Linking decisions (best ontology label of
+each linked chunk of each template) and final queries are compared with those of fp32, with
+translation and vector caches disabled so that every backend really runs. A '-jit' suffix runs a
+backend's TorchScript traced encoder. Each backend runs in a fresh process, so that its peak RSS
+belongs to it alone. The script exits with status 1 if any backend falls below --min-query-agreement.
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/backend_accuracy.py --backends fp32 int8 bf16 fp32-jit
+"""
+import argparse
+import copy
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+
+from seequery.embeddings.traced_encoder import TracedEncoder
+from seequery.pizza_evaluation import cqs as pizza_cqs
+from seequery.translator import CQToSPARQLOWL
+from seequery.trh_evaluation import cqs as trh_cqs
+from seequery.utils.helpers import Helpers
+
+
+def linking_decisions(output: Optional[dict]) -> Dict[str, Optional[str]]:
+    """ Collect the best label chosen for each linked chunk.
+
+    Args:
+        output (Optional[dict]): pipeline output, None if translation failed
+
+    Returns:
+        Dict[str, Optional[str]]: '<template>/<chunk>' mapped to the best label, None without candidates
+    """
+    decisions: Dict[str, Optional[str]] = dict()
+    if output is None:
+        return decisions
+    for template_idx, meta_enriched_vocab in enumerate(output.get('vocab_for_templates', [])):
+        if not meta_enriched_vocab['success']:
+            continue
+        for chunk_idx, item in meta_enriched_vocab['vocab'].items():
+            if not item.is_explicit_match:
+                best = item.scored_candidates[0].onto_label if len(item.scored_candidates) > 0 else None
+                decisions[f'{template_idx}/{chunk_idx}'] = best
+    return decisions
+
+
+def summarize(output: Optional[dict]) -> Optional[dict]:
+    """ Keep what backends are compared on, small enough to be sent back from a worker process.
+
+    Args:
+        output (Optional[dict]): pipeline output, None if translation failed
+
+    Returns:
+        Optional[dict]: CQ, linking decisions and queries, None if translation failed
+    """
+    if output is None:
+        return None
+    return {"cq": output.get('cq'), "decisions": linking_decisions(output), "queries": output['queries']}
+
+
+def weights_megabytes(model: Union[torch.nn.Module, TracedEncoder]) -> float:
+    """ Measure the size of serialized model weights, which is not the memory a backend takes.
+
+    Args:
+        model (Union[torch.nn.Module, TracedEncoder]): model or traced encoder
+
+    Returns:
+        float: megabytes
+    """
+    buffer = io.BytesIO()
+    if isinstance(model, TracedEncoder):
+        torch.jit.save(model.module, buffer)
+    else:
+        torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def run_backend(config: dict, backend: str, cqs: List[str]) -> Tuple[dict, List[Optional[dict]]]:
+    """ Translate CQs with a backend.
+
+    Args:
+        config (dict): application config, ontology included
+        backend (str): backend name, with a '-jit' suffix for its traced encoder
+        cqs (List[str]): CQs to translate
+
+    Returns:
+        Tuple[dict, List[Optional[dict]]]: measurements and output summaries, None where translation failed
+    """
+    config = copy.deepcopy(config)
+    name, _, variant = backend.partition('-')
+    config.setdefault('embeddings', {})['backend'] = name
+    torchscript = config['embeddings'].get('torchscript') or {}
+    config['embeddings']['torchscript'] = dict(torchscript, enabled=variant == 'jit')
+    config['embeddings'].pop('vector_cache', None)
+    config['pipeline'].pop('cache', None)
+
+    start = time.perf_counter()
+    translator = CQToSPARQLOWL(config=config)
+    startup = time.perf_counter() - start
+
+    outputs = []
+    latencies = []
+    for cq in cqs:
+        start = time.perf_counter()
+        result = translator.translate(cq, dump_debug_info=True)
+        latencies.append(1000 * (time.perf_counter() - start))
+        outputs.append(summarize(result[0][1] if result and isinstance(result[0], tuple) else None))
+
+    linking = translator.pipeline.metrics.to_json().get('EntityLinker', {}).get('wall_time', {})
+    active = translator.embeddings_mngr.backend  # bf16 may have fallen back to fp32
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss_unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {"backend": active.name + ('-jit' if active.torchscript else ''),
+            "startup_s": startup,
+            "bert_load_s": translator.startup_times['bert'],
+            "weights_mb": weights_megabytes(translator.embeddings_mngr.model),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / rss_unit,
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p95": float(np.percentile(latencies, 95)),
+            "linking_ms_mean": 1000 * linking.get('sum', 0.0) / max(linking.get('count', 0), 1)}, outputs
+
+
+def agreement(reference: List[Optional[dict]], candidate: List[Optional[dict]]) -> dict:
+    """ Compare linking decisions and queries with those of the reference backend.
+
+    Args:
+        reference (List[Optional[dict]]): summaries of fp32 outputs
+        candidate (List[Optional[dict]]): summaries of outputs of another backend
+
+    Returns:
+        dict: agreement rates and CQs whose queries changed
+    """
+    decisions = 0
+    same_decisions = 0
+    changed = []
+    for ref_output, cand_output in zip(reference, candidate):
+        ref_decisions = ref_output['decisions'] if ref_output else dict()
+        cand_decisions = cand_output['decisions'] if cand_output else dict()
+        for key in set(ref_decisions) | set(cand_decisions):
+            decisions += 1
+            same_decisions += ref_decisions.get(key) == cand_decisions.get(key)
+        ref_queries = ref_output['queries'] if ref_output else None
+        cand_queries = cand_output['queries'] if cand_output else None
+        if ref_queries != cand_queries:
+            changed.append((ref_output or cand_output or {}).get('cq'))
+    return {"linking_agreement": same_decisions / max(decisions, 1),
+            "query_agreement": 1 - len(changed) / max(len(reference), 1),
+            "changed_cqs": changed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--backends', nargs='+', default=['fp32', 'int8', 'bf16'])
+    parser.add_argument('--pizza-ontology', default='pizza')
+    parser.add_argument('--trh-ontology', default='trh')
+    parser.add_argument('--min-query-agreement', type=float, default=0.95,
+                        help='report a failure below this share of CQs with unchanged queries')
+    parser.add_argument('--output', help='store the report as JSON')
+    args = parser.parse_args()
+
+    base_config = CQToSPARQLOWL.load_config(args.config)
+    if base_config is None:
+        parser.error(f"{args.config} is not a valid YAML config")
+    report = []
+    failed = False
+    evaluation_sets = [('pizza', args.pizza_ontology, pizza_cqs), ('trh', args.trh_ontology, trh_cqs)]
+    for name, ontology, cqs in evaluation_sets:
+        if not os.path.exists(Helpers.onto2path(ontology)):
+            print(f"{name}\tskipped, ontology {ontology} not found")
+            continue
+        config = copy.deepcopy(base_config)
+        config['ontology']['onto_id'] = ontology
+
+        reference = None
+        for backend in args.backends:
+            # a fresh process per backend, peak RSS would otherwise include the previous backends
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                row, outputs = pool.apply(run_backend, (config, backend, cqs))
+            row["evaluation_set"] = name
+            if reference is None:
+                reference = outputs  # the first backend, fp32 by default, is the reference
+            else:
+                row.update(agreement(reference, outputs))
+            report.append(row)
+            print(f"{name}\t{backend} ({row['backend']})\tweights {row['weights_mb']:.0f}MB\t"
+                  f"peak RSS {row['peak_rss_mb']:.0f}MB\t"
+                  f"BERT load {row['bert_load_s']:.2f}s\tp50 {row['latency_ms_p50']:.1f}ms\t"
+                  f"p95 {row['latency_ms_p95']:.1f}ms\tlinking {row['linking_ms_mean']:.1f}ms"
+                  + (f"\tlinking agreement {row['linking_agreement']:.3f}\tquery agreement "
+                     f"{row['query_agreement']:.3f}" if 'query_agreement' in row else ""))
+            if row.get('query_agreement', 1.0) < args.min_query_agreement:
+                print(f"FAILED {name}/{backend}: queries changed for {row['changed_cqs']}")
+                failed = True
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+""" Re-fit similarity thresholds of the entity linker for a truncated BERT encoder.
+
+Each evaluation set is translated with the full encoder and with every depth asked for, with the
+similarity thresholds lifted so that every candidate label the linker scores is recorded. Labels the
+full encoder accepts under the configured min_entity_similarity/min_relation_similarity are the
+reference; for each depth the thresholds agreeing best with it (F1 over accepted item/label pairs)
+are reported with the latency of that depth, then the evaluation set is translated again with the
+fitted thresholds to measure query agreement. Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/calibrate_depth.py --depths 8 6 4 --output depth.json
+
+and copy the suggested values to embeddings.num_layers and pipeline.entity_linker in config.yaml.
+"""
+import argparse
+import copy
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from seequery.pipeline.linker.entity_linker import EntityLinker
+from seequery.pipeline.match_item import MatchItem
+from seequery.pipeline.scored_translation import ScoredTranslation
+from seequery.pizza_evaluation import cqs as pizza_cqs
+from seequery.translator import CQToSPARQLOWL
+from seequery.trh_evaluation import cqs as trh_cqs
+from seequery.utils.helpers import Helpers
+from seequery.utils.linking_category import LinkingCategory
+
+# threshold keys of the entity linker config and the categories they apply to
+THRESHOLDS = {'min_entity_similarity': (LinkingCategory.CLASS, LinkingCategory.INDIVIDUAL),
+              'min_relation_similarity': (LinkingCategory.OBJECT_PROPERTY, LinkingCategory.DATA_PROPERTY)}
+
+# (cq, item text, category), label and similarity of a candidate translation
+Candidate = Tuple[Tuple[str, str, LinkingCategory], str, float]
+
+
+def load_translator(config: dict, num_layers: int) -> Tuple[CQToSPARQLOWL, EntityLinker]:
+    """ Start a translator running the given number of encoder layers, without caches.
+
+    Args:
+        config (dict): application config, ontology included
+        num_layers (int): encoder layers, 0 for all
+
+    Returns:
+        Tuple[CQToSPARQLOWL, EntityLinker]: translator and its entity linker
+    """
+    config = copy.deepcopy(config)
+    config.setdefault('embeddings', {})['num_layers'] = num_layers
+    config['embeddings'].pop('vector_cache', None)
+    config['pipeline'].pop('cache', None)
+    translator = CQToSPARQLOWL(config=config)
+    linker = next(component for component in translator.pipeline.components
+                  if isinstance(component, EntityLinker))
+    return translator, linker
+
+
+def score_candidates(translator: CQToSPARQLOWL, linker: EntityLinker,
+                     cqs: List[str]) -> Tuple[List[Candidate], List[float]]:
+    """ Translate CQs with thresholds lifted, recording every candidate translation the linker scores.
+
+    Args:
+        translator (CQToSPARQLOWL): translator
+        linker (EntityLinker): its entity linker
+        cqs (List[str]): CQs to translate
+
+    Returns:
+        Tuple[List[Candidate], List[float]]: candidates and translation latencies in milliseconds
+    """
+    candidates: List[Candidate] = []
+    link_many = linker.link_many
+
+    def recording_link_many(requests: List[Tuple[MatchItem, LinkingCategory, int, str]]
+                            ) -> List[List[ScoredTranslation]]:
+        results = link_many(requests)
+        for (item, category, _, cq), translations in zip(requests, results):
+            candidates.extend(((cq, item.normalized_text, category), translation.onto_label,
+                               translation.score) for translation in translations)
+        return results
+
+    configured = {key: linker.config[key] for key in THRESHOLDS}
+    linker.config.update({key: -np.inf for key in THRESHOLDS})
+    setattr(linker, 'link_many', recording_link_many)
+    latencies = []
+    try:
+        for cq in cqs:
+            start = time.perf_counter()
+            translator.translate(cq, dump_debug_info=True)
+            latencies.append(1000 * (time.perf_counter() - start))
+    finally:
+        del linker.link_many
+        linker.config.update(configured)
+    return list(dict.fromkeys(candidates)), latencies
+
+
+def fit_threshold(candidates: List[Candidate], reference: set) -> Tuple[float, float]:
+    """ Find the threshold whose accepted candidates agree best with the reference ones.
+
+    Args:
+        candidates (List[Candidate]): candidates of one threshold's categories
+        reference (set): (request, label) pairs accepted with the full encoder
+
+    Returns:
+        Tuple[float, float]: threshold and F1 agreement, the stricter threshold wins ties
+    """
+    best_threshold, best_f1 = 1.0, 0.0 if len(reference) > 0 else 1.0
+    accepted = true_positives = 0
+    ordered = sorted(candidates, key=lambda candidate: -candidate[2])
+    for i, (request, label, score) in enumerate(ordered):
+        accepted += 1
+        true_positives += (request, label) in reference
+        if i + 1 < len(ordered) and ordered[i + 1][2] == score:
+            continue  # a threshold accepts all candidates of the same score
+        f1 = 2 * true_positives / (accepted + len(reference)) if len(reference) > 0 else 0.0
+        if f1 > best_f1:
+            best_threshold, best_f1 = score, f1
+    return float(best_threshold), best_f1
+
+
+def query_agreement(reference: List[Optional[list]], candidate: List[Optional[list]]) -> float:
+    """ Share of CQs translated to the same queries.
+
+    Args:
+        reference (List[Optional[list]]): queries of each CQ with the full encoder
+        candidate (List[Optional[list]]): queries of each CQ with a truncated one
+
+    Returns:
+        float: agreement rate
+    """
+    return sum(ref == cand for ref, cand in zip(reference, candidate)) / max(len(reference), 1)
+
+
+def translate_queries(translator: CQToSPARQLOWL, cqs: List[str]) -> List[Optional[list]]:
+    """ Translate CQs with the thresholds currently configured.
+
+    Args:
+        translator (CQToSPARQLOWL): translator
+        cqs (List[str]): CQs to translate
+
+    Returns:
+        List[Optional[list]]: queries of each CQ, None where translation failed
+    """
+    queries = []
+    for cq in cqs:
+        result = translator.translate(cq, dump_debug_info=True)
+        queries.append(result[0][1]['queries'] if result and isinstance(result[0], tuple) else None)
+    return queries
+
+
+def calibrate(config: dict, depths: List[int], cqs: List[str]) -> List[dict]:
+    """ Fit thresholds of every depth on an evaluation set.
+
+    Args:
+        config (dict): application config, ontology included
+        depths (List[int]): encoder layers to calibrate for
+        cqs (List[str]): evaluation CQs
+
+    Returns:
+        List[dict]: one row per depth, the full encoder first
+    """
+    translator, linker = load_translator(config, 0)
+    configured = {key: linker.config[key] for key in THRESHOLDS}
+    candidates, latencies = score_candidates(translator, linker, cqs)
+    reference = {key: {(request, label) for request, label, score in candidates
+                       if request[2] in THRESHOLDS[key] and score >= configured[key]} for key in THRESHOLDS}
+    reference_queries = translate_queries(translator, cqs)
+    rows = [{"num_layers": translator.embeddings_mngr.model.config.num_hidden_layers,
+             "thresholds": configured, "latency_ms_p50": float(np.percentile(latencies, 50)),
+             "query_agreement": 1.0}]
+    del translator, linker
+
+    for depth in depths:
+        translator, linker = load_translator(config, depth)
+        candidates, latencies = score_candidates(translator, linker, cqs)
+        thresholds, f1 = dict(), dict()
+        for key, categories in THRESHOLDS.items():
+            thresholds[key], f1[key] = fit_threshold([candidate for candidate in candidates
+                                                      if candidate[0][2] in categories], reference[key])
+        linker.config.update(thresholds)
+        rows.append({"num_layers": translator.embeddings_mngr.model.config.num_hidden_layers,
+                     "thresholds": thresholds, "f1": f1,
+                     "latency_ms_p50": float(np.percentile(latencies, 50)),
+                     "query_agreement": query_agreement(reference_queries,
+                                                        translate_queries(translator, cqs))})
+        del translator, linker
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--depths', nargs='+', type=int, default=[8, 6, 4])
+    parser.add_argument('--pizza-ontology', default='pizza')
+    parser.add_argument('--trh-ontology', default='trh')
+    parser.add_argument('--output', help='store the report as JSON')
+    args = parser.parse_args()
+
+    base_config = CQToSPARQLOWL.load_config(args.config)
+    if base_config is None:
+        parser.error(f"{args.config} is not a valid YAML config")
+    report = []
+    evaluation_sets = [('pizza', args.pizza_ontology, pizza_cqs), ('trh', args.trh_ontology, trh_cqs)]
+    for name, ontology, cqs in evaluation_sets:
+        if not os.path.exists(Helpers.onto2path(ontology)):
+            print(f"{name}\tskipped, ontology {ontology} not found")
+            continue
+        config = copy.deepcopy(base_config)
+        config['ontology']['onto_id'] = ontology
+        for row in calibrate(config, args.depths, cqs):
+            row["evaluation_set"] = name
+            report.append(row)
+            print(f"{name}\t{row['num_layers']} layers\tp50 {row['latency_ms_p50']:.1f}ms\t"
+                  + "\t".join(f"{key} {value:.3f}" + (f" (F1 {row['f1'][key]:.3f})" if 'f1' in row else "")
+                              for key, value in row['thresholds'].items())
+                  + f"\tquery agreement {row['query_agreement']:.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+""" End-to-end cold start, latency, throughput and memory of translation for each bundled ontology.
+
+Every ontology is measured in a fresh interpreter, so that cold start covers loading spaCy, the
+ontology, BERT and all indexes, and peak RSS belongs to that ontology alone. CQs are those of
+pizza_evaluation.py and trh_evaluation.py, plus a file with one CQ per line if given.
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/run_benchmarks.py --output results.json
+    PYTHONPATH=. python benchmarks/run_benchmarks.py --output results.json --baseline baseline.json
+    PYTHONPATH=. python benchmarks/run_benchmarks.py --results results.json --baseline baseline.json
+
+With --baseline, metrics worse than the baseline by more than --tolerance are reported as regressions
+and the script exits with status 1.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# metrics compared against a baseline, True if higher is better
+COMPARED_METRICS = {
+    'cold_start_s': False,
+    'latency_ms_p50': False,
+    'latency_ms_p95': False,
+    'latency_ms_p99': False,
+    'batch_cqs_per_s': True,
+    'peak_rss_mb': False,
+}
+
+
+def load_cqs(cq_file: Optional[str] = None) -> List[str]:
+    """ Collect CQs from the evaluation scripts and an optional file.
+
+    Args:
+        cq_file (Optional[str]): file with one CQ per line
+
+    Returns:
+        List[str]: CQs
+    """
+    from seequery.pizza_evaluation import cqs as pizza_cqs
+    from seequery.trh_evaluation import cqs as trh_cqs
+
+    cqs = pizza_cqs + trh_cqs
+    if cq_file:
+        with open(cq_file, 'r') as f:
+            cqs += [line.strip() for line in f if line.strip() != ""]
+    return cqs
+
+
+def measure_ontology(config_path: str, ontology: str, cqs: List[str], repeats: int, batch_size: int) -> dict:
+    """ Load a translator for an ontology and measure it, meant to run in a fresh interpreter.
+
+    Args:
+        config_path (str): path to config YAML file
+        ontology (str): ontology id or path
+        cqs (List[str]): CQs to translate
+        repeats (int): how many times CQs are translated one by one and in batches
+        batch_size (int): CQs translated together in batch mode
+
+    Returns:
+        dict: measurements
+    """
+    from seequery.translator import CQToSPARQLOWL
+
+    config = CQToSPARQLOWL.load_config(config_path)
+    if config is None:
+        raise ValueError(f"{config_path} is not a valid YAML config")
+    config['ontology']['onto_id'] = ontology
+    # repeated CQs would be served from the translation and vector caches, latencies are measured without them
+    config['pipeline'].pop('cache', None)
+    config.setdefault('embeddings', {}).pop('vector_cache', None)
+
+    start = time.perf_counter()
+    translator = CQToSPARQLOWL(config=config)
+    cold_start = time.perf_counter() - start
+    startup_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    translator.translate_many(cqs[:batch_size], batch_size)  # warm up
+    latencies = []
+    for _ in range(repeats):
+        for cq in cqs:
+            start = time.perf_counter()
+            translator.translate(cq)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        translator.translate_many(cqs, batch_size)
+    batch_seconds = time.perf_counter() - start
+
+    latencies_ms = 1000 * np.array(latencies)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss_unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        "ontology": ontology,
+        "cqs": len(cqs),
+        "snapshot_hit": translator.ontology_mngr.ontology is None,
+        "cold_start_s": cold_start,
+        "startup_s": translator.startup_times,
+        "latency_ms_mean": float(latencies_ms.mean()),
+        "latency_ms_p50": float(np.percentile(latencies_ms, 50)),
+        "latency_ms_p95": float(np.percentile(latencies_ms, 95)),
+        "latency_ms_p99": float(np.percentile(latencies_ms, 99)),
+        "batch_cqs_per_s": repeats * len(cqs) / batch_seconds,
+        "startup_rss_mb": startup_rss / rss_unit,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / rss_unit,
+        "stages": translator.pipeline.metrics.to_json(),
+    }
+
+
+def run_isolated(args: argparse.Namespace, ontology: str) -> dict:
+    """ Measure an ontology in a child interpreter.
+
+    Args:
+        args (argparse.Namespace): command line arguments
+        ontology (str): ontology id or path
+
+    Returns:
+        dict: measurements, or the error the child failed with
+    """
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        output = f.name
+    command = [sys.executable, __file__, '--single', ontology, '--single-output', output,
+               '--config', args.config, '--repeats', str(args.repeats), '--batch-size', str(args.batch_size)]
+    if args.cq_file:
+        command += ['--cq-file', args.cq_file]
+    try:
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if completed.returncode != 0:
+            return {"ontology": ontology, "error": completed.stderr.strip().splitlines()[-1:]}
+        with open(output, 'r') as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """ Find metrics worse than in the baseline by more than a relative tolerance.
+
+    Args:
+        results (dict): current results
+        baseline (dict): stored results
+        tolerance (float): allowed relative change, e.g. 0.1 for 10%
+
+    Returns:
+        List[str]: descriptions of regressions
+    """
+    regressions = []
+    for name, current in results['ontologies'].items():
+        previous = baseline['ontologies'].get(name)
+        if previous is None or 'error' in previous:
+            continue
+        if 'error' in current:
+            regressions.append(f"{name}: failed ({current['error']})")
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous[metric], current[metric]
+            if old <= 0:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{name}: {metric} {old:.3f} -> {new:.3f} ({100 * change:+.1f}%)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ontologies', nargs='*', default=sorted(glob.glob('resources/ontologies/*.owl')))
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--cq-file', help='file with extra CQs, one per line')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--output', help='store results as JSON')
+    parser.add_argument('--results', help='compare stored results instead of running')
+    parser.add_argument('--baseline', help='stored results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    parser.add_argument('--single-output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        measurements = measure_ontology(args.config, args.single, load_cqs(args.cq_file), args.repeats,
+                                        args.batch_size)
+        with open(args.single_output, 'w') as f:
+            json.dump(measurements, f)
+        return
+
+    if args.results:
+        with open(args.results, 'r') as f:
+            results = json.load(f)
+    else:
+        ontologies: Dict[str, dict] = dict()
+        for ontology in args.ontologies:
+            row = run_isolated(args, ontology)
+            ontologies[os.path.basename(ontology)] = row
+            if 'error' in row:
+                print(f"{ontology}\tfailed: {row['error']}")
+            else:
+                print(f"{ontology}\tcold start {row['cold_start_s']:.2f}s\t"
+                      f"p50 {row['latency_ms_p50']:.1f}ms\tp95 {row['latency_ms_p95']:.1f}ms\t"
+                      f"p99 {row['latency_ms_p99']:.1f}ms\t"
+                      f"batch {row['batch_cqs_per_s']:.1f} CQ/s\tpeak RSS {row['peak_rss_mb']:.0f}MB")
+        results = {"python": platform.python_version(), "machine": platform.machine(),
+                   "cpus": os.cpu_count(), "repeats": args.repeats, "batch_size": args.batch_size,
+                   "ontologies": ontologies}
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+        print(f"No regressions beyond {100 * args.tolerance:.0f}% against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
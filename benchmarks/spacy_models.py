@@ -0,0 +1,102 @@
+""" POS tag and lemma agreement and latency of a lightweight spaCy pipeline against the reference one.
+
+Both pipelines are loaded through SpacyProcessor with the same excluded components, the evaluation
+CQs are processed with nlp.pipe and tokens are compared where both pipelines tokenize the same way.
+Run from the repository root:
+
+    PYTHONPATH=. python benchmarks/spacy_models.py --reference en_core_web_trf --candidate en_core_web_sm
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Tuple
+
+from spacy.tokens import Doc
+
+from seequery.pizza_evaluation import cqs as pizza_cqs
+from seequery.trh_evaluation import cqs as trh_cqs
+from seequery.utils.spacy_processor import SpacyProcessor
+
+
+def timed_pipe(processor: SpacyProcessor, texts: List[str], repeats: int) -> Tuple[List[Doc], float]:
+    """ Process texts a number of times and measure the mean time per text.
+
+    Args:
+        processor (SpacyProcessor): processor to measure
+        texts (List[str]): texts to process
+        repeats (int): how many times all texts are processed
+
+    Returns:
+        Tuple[List[Doc], float]: documents of the last run and milliseconds per text
+    """
+    processor.pipe(texts[:1])  # warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        docs = processor.pipe(texts)
+    return docs, 1000 * (time.perf_counter() - start) / (repeats * len(texts))
+
+
+def agreement(reference: List[Doc], candidate: List[Doc]) -> dict:
+    """ Count tokens with the same tag and lemma, over tokens both documents share.
+
+    Args:
+        reference (List[Doc]): documents of the reference pipeline
+        candidate (List[Doc]): documents of the candidate pipeline, in the same order
+
+    Returns:
+        dict: token counts and agreement ratios
+    """
+    tokens = aligned = same_tag = same_lemma = same_cq = 0
+    for ref_doc, cand_doc in zip(reference, candidate):
+        cand_tokens = {(t.idx, len(t)): t for t in cand_doc}
+        tokens += len(ref_doc)
+        cq_agrees = len(ref_doc) == len(cand_doc)
+        for ref_token in ref_doc:
+            cand_token = cand_tokens.get((ref_token.idx, len(ref_token)))
+            if cand_token is None:
+                cq_agrees = False
+                continue
+            aligned += 1
+            same_tag += ref_token.tag_ == cand_token.tag_
+            same_lemma += ref_token.lemma_ == cand_token.lemma_
+            cq_agrees = cq_agrees and ref_token.tag_ == cand_token.tag_ \
+                and ref_token.lemma_ == cand_token.lemma_
+        same_cq += cq_agrees
+    return {"tokens": tokens, "aligned": aligned,
+            "tag_agreement": same_tag / max(aligned, 1),
+            "lemma_agreement": same_lemma / max(aligned, 1),
+            "cq_agreement": same_cq / max(len(reference), 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reference', default='en_core_web_trf')
+    parser.add_argument('--candidate', default='en_core_web_sm')
+    parser.add_argument('--exclude', nargs='*', default=SpacyProcessor.DEFAULT_EXCLUDED)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', help='store the report as JSON')
+    args = parser.parse_args()
+
+    texts = list(dict.fromkeys(pizza_cqs + trh_cqs))
+    report: Dict[str, Any] = {"cqs": len(texts)}
+    docs = dict()
+    for role, model in [('reference', args.reference), ('candidate', args.candidate)]:
+        processor = SpacyProcessor.load(model, args.exclude, args.batch_size)
+        docs[role], ms_per_cq = timed_pipe(processor, texts, args.repeats)
+        report[role] = {"model": model, "components": processor.nlp.pipe_names, "ms_per_cq": ms_per_cq}
+        print(f"{role}\t{model}\t{processor.nlp.pipe_names}\t{ms_per_cq:.3f}ms/CQ")
+
+    report.update(agreement(docs['reference'], docs['candidate']))
+    print(f"tag agreement={report['tag_agreement']:.3f}\tlemma agreement={report['lemma_agreement']:.3f}\t"
+          f"identical CQs={report['cq_agreement']:.3f}\t"
+          f"aligned tokens={report['aligned']}/{report['tokens']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
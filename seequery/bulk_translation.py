@@ -0,0 +1,287 @@
+""" Sharded, resumable translation of large CQ files with a pool of worker processes.
+
+The input file holds one CQ per line. It is split into shards of consecutive CQs, each worker process
+loads its own translator once and translates whole shards. Every shard is written to its own JSONL
+file atomically, next to its statistics, so an interrupted run started again with the same arguments
+only translates shards whose output is missing and still summarizes all of them. Run from the repository root:
+
+    PYTHONPATH=. python seequery/bulk_translation.py cqs.txt out_dir --config config.yaml --workers 4
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+import spacy
+
+from seequery.pipeline.translation_cache import TranslationCache
+from seequery.translator import CQToSPARQLOWL
+from seequery.utils.helpers import Helpers
+
+MANIFEST = 'manifest.json'
+SUMMARY = 'summary.json'
+
+# translator of the current worker process
+_translator: Optional[CQToSPARQLOWL] = None
+
+
+def _init_worker(config: dict, torch_threads: int) -> None:
+    """ Load a translator once per worker process.
+
+    Args:
+        config (dict): application config
+        torch_threads (int): intra-op threads of each worker, 0 keeps the torch default
+    """
+    global _translator
+    if torch_threads > 0:
+        import torch
+        torch.set_num_threads(torch_threads)
+    logging.basicConfig(filename=f'bulk_translation.{os.getpid()}.log', level=logging.INFO)
+    _translator = CQToSPARQLOWL(config=config)
+
+
+def _stats_path(shard_path: str) -> str:
+    """ Get the path of the statistics stored next to a shard.
+
+    Args:
+        shard_path (str): path of the shard JSONL file
+
+    Returns:
+        str: path of its statistics JSON file
+    """
+    return f'{os.path.splitext(shard_path)[0]}.stats.json'
+
+
+def _write_atomically(path: str, lines: List[str]) -> None:
+    """ Write a file under a temporary name and move it in place, so that it is either whole or missing.
+
+    Args:
+        path (str): file to write
+        lines (List[str]): its content
+    """
+    with open(f'{path}.tmp', 'w') as f:
+        f.writelines(lines)
+    os.replace(f'{path}.tmp', path)
+
+
+def _translate_shard(task: Tuple[int, int, List[str], str, int]) -> dict:
+    """ Translate a shard and store it atomically, run in a worker process.
+
+    Args:
+        task (Tuple[int, int, List[str], str, int]): shard id, index of its first CQ, its CQs,
+                                                     output path and translation batch size
+
+    Returns:
+        dict: shard statistics, also stored next to the shard
+    """
+    shard_id, first_index, cqs, path, batch_size = task
+    if _translator is None:
+        raise RuntimeError("bulk_translation::worker started without _init_worker")
+    started = time.perf_counter()
+    records: List[dict] = []
+    latencies: List[float] = []
+    for start in range(0, len(cqs), batch_size):
+        batch_started = time.perf_counter()
+        # CQs the pipeline fails on become ERROR records, the shard is written anyway
+        batch = _translator.translate_records(cqs[start:start + batch_size])
+        # each CQ of a batch is attributed an equal share of its time
+        latencies += [(time.perf_counter() - batch_started) / len(batch)] * len(batch)
+        records += batch
+
+    stats = {"shard": shard_id, "cqs": len(cqs), "errors": sum(r['status'] != 'OK' for r in records),
+             "seconds": time.perf_counter() - started, "latencies": latencies, "pid": os.getpid()}
+    # statistics first, a shard whose output exists always has them
+    _write_atomically(_stats_path(path), [json.dumps(stats)])
+    _write_atomically(path, [json.dumps({"index": first_index + offset, **record}) + '\n'
+                             for offset, record in enumerate(records)])
+    return stats
+
+
+class BulkTranslationJob:
+    """ Translate a CQ file shard by shard, resuming from shards already written. """
+    def __init__(self, input_path: str, output_dir: str, config: dict, shard_size: int = 500,
+                 workers: int = 1, batch_size: int = 64, torch_threads: int = 0) -> None:
+        """ Describe a job.
+
+        Args:
+            input_path (str): file with one CQ per line
+            output_dir (str): directory shard outputs, manifest and summary are written to
+            config (dict): application config
+            shard_size (int): CQs per shard
+            workers (int): worker processes, each holding a loaded translator
+            batch_size (int): CQs translated together within a shard
+            torch_threads (int): intra-op threads of each worker, 0 keeps the torch default
+        """
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.config = config
+        self.shard_size = shard_size
+        self.workers = workers
+        self.batch_size = batch_size
+        self.torch_threads = torch_threads
+
+    def run(self) -> dict:
+        """ Translate all shards without output yet and summarize the job.
+
+        Returns:
+            dict: throughput of this run, errors and latencies of all shards
+        """
+        with open(self.input_path, 'r') as f:
+            cqs = [line.strip() for line in f if line.strip() != ""]
+        shards = [cqs[start:start + self.shard_size] for start in range(0, len(cqs), self.shard_size)]
+        self._check_manifest(len(cqs))
+
+        tasks = [(shard_id, shard_id * self.shard_size, shard, self.shard_path(shard_id), self.batch_size)
+                 for shard_id, shard in enumerate(shards) if not os.path.exists(self.shard_path(shard_id))]
+        logging.info(f"BulkTranslationJob::{len(cqs)} CQs, {len(shards)} shards, {len(tasks)} to translate")
+
+        started = time.perf_counter()
+        translated = 0
+        if len(tasks) > 0:
+            # spawn, so that workers do not inherit torch or owlready2 state of the parent
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(min(self.workers, len(tasks)), initializer=_init_worker,
+                              initargs=(self.config, self.torch_threads)) as pool:
+                for shard_stats in pool.imap_unordered(_translate_shard, tasks):
+                    translated += 1
+                    print(f"shard {shard_stats['shard']}: {shard_stats['cqs']} CQs in "
+                          f"{shard_stats['seconds']:.1f}s, {shard_stats['errors']} errors "
+                          f"({translated}/{len(tasks)})")
+        wall_seconds = time.perf_counter() - started
+
+        stats = []
+        for shard_id in range(len(shards)):
+            with open(_stats_path(self.shard_path(shard_id)), 'r') as f:
+                stats.append(json.load(f))
+        summary = self._summarize(stats, [task[0] for task in tasks], wall_seconds, len(cqs))
+
+        _write_atomically(os.path.join(self.output_dir, SUMMARY), [json.dumps(summary, indent=2)])
+        return summary
+
+    def shard_path(self, shard_id: int) -> str:
+        """ Get the output path of a shard.
+
+        Args:
+            shard_id (int): shard id
+
+        Returns:
+            str: path of the shard JSONL file
+        """
+        return os.path.join(self.output_dir, f'shard-{shard_id:05d}.jsonl')
+
+    def config_fingerprint(self) -> str:
+        """ Hash what translations depend on the way the translation cache does (ontology file, mappings,
+            config, models and code), so that shards translated with different settings never mix.
+            Models are identified by the names and versions the config asks for, without loading them.
+
+        Returns:
+            str: hex digest
+        """
+        onto_id = self.config['ontology']['onto_id']
+        ontology_path = onto_id if os.path.exists(onto_id) else Helpers.onto2path(onto_id)
+        pipeline_config = self.config['pipeline']
+        mapping_paths = [section['mapping_path'] for section in pipeline_config.values()
+                         if isinstance(section, dict) and 'mapping_path' in section]
+        spacy_config = self.config.get('spacy', {'model': self.config.get('spacy_model', 'en_core_web_trf')})
+        spacy_model = spacy_config['model']
+        # the BERT model is fixed, its backend, depth and tracing are part of the embeddings config
+        models = [f"{spacy_model}-{spacy.util.get_package_version(spacy_model)}", 'bert-base-uncased']
+        return TranslationCache.fingerprint(ontology_path, mapping_paths, pipeline_config, models,
+                                            self.config.get('embeddings'))
+
+    def _check_manifest(self, cq_count: int) -> None:
+        """ Store what the output directory is a translation of, or check it when resuming.
+
+        Args:
+            cq_count (int): number of CQs in the input file
+
+        Raises:
+            ValueError: if the output directory holds shards of different input or settings
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = {"input": os.path.abspath(self.input_path),
+                    "input_fingerprint": Helpers.file_fingerprint(self.input_path),
+                    "cqs": cq_count,
+                    "shard_size": self.shard_size,
+                    "ontology": self.config['ontology']['onto_id'],
+                    "config_fingerprint": self.config_fingerprint()}
+        path = os.path.join(self.output_dir, MANIFEST)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                stored = json.load(f)
+            changed = [key for key in ['input_fingerprint', 'shard_size', 'ontology', 'config_fingerprint']
+                       if stored.get(key) != manifest[key]]
+            if len(changed) > 0:
+                raise ValueError(f"{self.output_dir} holds a run with different {', '.join(changed)}, "
+                                 f"use another output directory")
+            return
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f'{path}.tmp', path)
+
+    def _summarize(self, stats: List[dict], translated_ids: List[int], wall_seconds: float,
+                   cq_count: int) -> dict:
+        """ Aggregate statistics of all shards, whichever run translated them.
+
+        Args:
+            stats (List[dict]): statistics of every shard
+            translated_ids (List[int]): ids of shards translated in this run
+            wall_seconds (float): time this run spent translating
+            cq_count (int): number of CQs in the input file
+
+        Returns:
+            dict: job summary, throughput of this run
+        """
+        latencies = np.array([latency for shard_stats in stats for latency in shard_stats['latencies']])
+        translated = int(sum(shard_stats['cqs'] for shard_stats in stats
+                             if shard_stats['shard'] in translated_ids))
+        summary = {
+            "cqs": cq_count,
+            "shards": len(stats),
+            "shards_translated": len(translated_ids),
+            "shards_resumed": len(stats) - len(translated_ids),
+            "cqs_translated": translated,
+            "errors": int(sum(shard_stats['errors'] for shard_stats in stats)),
+            "workers": self.workers,
+            "wall_seconds": wall_seconds,
+            "cqs_per_second": translated / wall_seconds if wall_seconds > 0 else 0.0,
+            "worker_seconds": float(sum(shard_stats['seconds'] for shard_stats in stats)),
+        }
+        if len(latencies) > 0:
+            summary.update({"latency_ms_mean": 1000 * float(latencies.mean()),
+                            "latency_ms_p50": 1000 * float(np.percentile(latencies, 50)),
+                            "latency_ms_p95": 1000 * float(np.percentile(latencies, 95))})
+        return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='file with one CQ per line')
+    parser.add_argument('output_dir')
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--onto-id', help='overrides ontology.onto_id of the config')
+    parser.add_argument('--shard-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--torch-threads', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(filename='bulk_translation.log', level=logging.INFO)
+    config = CQToSPARQLOWL.load_config(args.config)
+    if config is None:
+        parser.error(f"{args.config} is not a valid YAML config")
+    if args.onto_id:
+        config['ontology']['onto_id'] = args.onto_id
+
+    job = BulkTranslationJob(args.input, args.output_dir, config, args.shard_size,
+                             args.workers, args.batch_size, args.torch_threads)
+    print(json.dumps(job.run(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
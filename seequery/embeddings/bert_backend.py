@@ -0,0 +1,187 @@
+import contextlib
+import logging
+import os
+import re
+from typing import ContextManager, List, Optional, Union
+
+import torch
+from transformers import BertConfig, BertModel
+
+from seequery.embeddings.traced_encoder import TracedEncoder
+
+
+class BertBackend:
+    """ How BERT runs on CPU: fp32 eager, int8 dynamic quantization of Linear layers or bf16 weights
+        with autocast.
+
+        Quantized and bf16 weights are stored as checkpoints the first time they are produced, later
+        start-ups load them directly instead of converting the fp32 model again. Any backend can run
+        only the first layers of the encoder. fp32 and int8 encoders can also be traced with TorchScript,
+        the traced encoder is stored next to the checkpoints and replaces the model at later start-ups.
+    """
+    BACKENDS = ('fp32', 'int8', 'bf16')
+    BUCKETS = [16, 32, 64, 128]
+
+    def __init__(self, name: str = 'fp32', checkpoint_dir: Optional[str] = None, torchscript: bool = False,
+                 buckets: Optional[List[int]] = None) -> None:
+        """ Select a backend.
+
+        Args:
+            name (str): 'fp32', 'int8' or 'bf16', bf16 falls back to fp32 on CPUs without bf16 instructions
+            checkpoint_dir (Optional[str]): directory converted checkpoints are kept in,
+                                            None to convert every time
+            torchscript (bool): run a traced and frozen encoder, not available with bf16
+            buckets (Optional[List[int]]): sequence lengths inputs of a traced encoder are padded to
+        """
+        if name not in self.BACKENDS:
+            raise ValueError(f"Unknown BERT backend '{name}', expected one of {', '.join(self.BACKENDS)}")
+        if name == 'bf16' and not self.bf16_supported():
+            logging.warning("BertBackend::this CPU has no bf16 instructions, falling back to fp32")
+            name = 'fp32'
+        if name == 'bf16' and torchscript:
+            logging.warning("BertBackend::bf16 autocast is not traced, "
+                            "running the encoder without TorchScript")
+            torchscript = False
+        self.name = name
+        self.checkpoint_dir = checkpoint_dir
+        self.torchscript = torchscript
+        self.buckets = buckets or self.BUCKETS
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> 'BertBackend':
+        """ Select the backend described by the embeddings config.
+
+        Args:
+            config (Optional[dict]): embeddings section of the config
+
+        Returns:
+            BertBackend: backend
+        """
+        config = config or {}
+        torchscript = config.get('torchscript') or {}
+        return cls(config.get('backend', 'fp32'), config.get('checkpoint_dir'),
+                   torchscript.get('enabled', False), torchscript.get('buckets'))
+
+    @staticmethod
+    def bf16_supported() -> bool:
+        """ Check if the CPU runs bf16 matrix multiplications natively.
+
+        Returns:
+            bool: True if AVX512-BF16 or AMX is available
+        """
+        try:
+            with open('/proc/cpuinfo', 'r') as f:
+                flags = f.read()
+        except OSError:
+            return False
+        return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+    @staticmethod
+    def truncated_depth(model_name: str, num_layers: int) -> int:
+        """ Get how many encoder layers run when at most num_layers are asked for.
+
+        Args:
+            model_name (str): pretrained model name or path
+            num_layers (int): encoder layers to keep, 0 for all
+
+        Returns:
+            int: layers kept, 0 if that is the whole encoder
+        """
+        if num_layers <= 0:
+            return 0
+        return num_layers if num_layers < BertConfig.from_pretrained(model_name).num_hidden_layers else 0
+
+    def load(self, model_name: str, num_layers: int = 0) -> Union[BertModel, TracedEncoder]:
+        """ Load a model for this backend, from a stored checkpoint if there is one.
+
+        Args:
+            model_name (str): pretrained model name or path
+            num_layers (int): encoder layers to keep, 0 for all. Weights of the others are not loaded,
+                              last_hidden_state then is the output of the last layer kept.
+
+        Returns:
+            Union[BertModel, TracedEncoder]: model in eval mode, or its traced encoder with TorchScript
+        """
+        config = BertConfig.from_pretrained(model_name)
+        depth = self.truncated_depth(model_name, num_layers)
+        if depth > 0:
+            config.num_hidden_layers = depth
+        if not self.torchscript:
+            return self._load_model(model_name, config, depth)
+
+        path = self.checkpoint_path(model_name, depth, 'jit.pt')
+        if path and os.path.exists(path):
+            return TracedEncoder.load(path, config, self.buckets)
+        return TracedEncoder.trace(self._load_model(model_name, config, depth), path, self.buckets)
+
+    def _load_model(self, model_name: str, config: BertConfig, depth: int) -> BertModel:
+        """ Load the eager model of this backend, from a stored checkpoint if there is one.
+
+        Args:
+            model_name (str): pretrained model name or path
+            config (BertConfig): model config, depth included
+            depth (int): encoder layers kept, 0 for all
+
+        Returns:
+            BertModel: model in eval mode
+        """
+        if self.name == 'fp32':
+            return BertModel.from_pretrained(model_name, config=config).eval()
+
+        path = self.checkpoint_path(model_name, depth)
+        if path and os.path.exists(path):
+            logging.debug(f"BertBackend::loading {path}")
+            model = self._convert(BertModel(config))
+            model.load_state_dict(torch.load(path))
+            return model.eval()
+
+        model = self._convert(BertModel.from_pretrained(model_name, config=config).eval())
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            torch.save(model.state_dict(), f'{path}.tmp')
+            os.replace(f'{path}.tmp', path)
+            logging.debug(f"BertBackend::saved {path}")
+        return model.eval()
+
+    def checkpoint_path(self, model_name: str, depth: int = 0, extension: str = 'pt') -> Optional[str]:
+        """ Construct the path of the converted checkpoint of a model.
+
+        Args:
+            model_name (str): pretrained model name or path
+            depth (int): encoder layers kept, 0 for all
+            extension (str): 'pt' for converted weights, 'jit.pt' for traced encoders
+
+        Returns:
+            Optional[str]: checkpoint path, None if checkpoints are not kept
+        """
+        if self.checkpoint_dir is None:
+            return None
+        # serialized quantized modules are only guaranteed to load with the torch version that saved them
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name) + (f'.L{depth}' if depth > 0 else '')
+        return os.path.join(self.checkpoint_dir,
+                            f'{safe_name}.{self.name}.torch-{torch.__version__}.{extension}')
+
+    def autocast(self) -> ContextManager:
+        """ Context BERT forward passes run in.
+
+        Returns:
+            ContextManager: bf16 autocast for the bf16 backend, a no-op otherwise
+        """
+        if self.name == 'bf16':
+            return torch.autocast('cpu', dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def _convert(self, model: BertModel) -> BertModel:
+        """ Turn an fp32 model into this backend's one.
+
+        Args:
+            model (BertModel): fp32 model
+
+        Returns:
+            BertModel: converted model
+        """
+        if self.name == 'int8':
+            if 'fbgemm' not in torch.backends.quantized.supported_engines:
+                torch.backends.quantized.engine = 'qnnpack'  # ARM CPUs
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model.bfloat16()
@@ -4,13 +4,14 @@ import pickle
 from typing import Dict
 
 import numpy as np
-import spacy
 from scipy import spatial
 
+from seequery.utils.spacy_processor import SpacyProcessor
+
 
 class EmbeddingsManager:
     """ Manage predefined embeddings. """
-    def __init__(self, emb_config: dict, spacy_nlp: spacy.lang.xx.Language) -> None:
+    def __init__(self, emb_config: dict, spacy_nlp: SpacyProcessor) -> None:
         """ Load embeddings and provide methods to operate over them.
 
         Args:
@@ -40,8 +41,7 @@ class EmbeddingsManager:
         """
 
         if self.lemmatize:
-            phrase1 = " ".join([t.lemma_ for t in self.spacy_nlp(phrase1)])
-            phrase2 = " ".join([t.lemma_ for t in self.spacy_nlp(phrase2)])
+            phrase1, phrase2 = self.spacy_nlp.lemmatize_many([phrase1, phrase2])
             logging.debug(f"Emb::lemmatization: {phrase1}, {phrase2}")
 
         if phrase1.lower() == phrase2.lower():
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from seequery.embeddings.vector_search import VectorSearch, make_vector_search
+from seequery.ontology.ontology_manager import OntologyManager
+from seequery.utils.helpers import Helpers
+from seequery.utils.linking_category import LinkingCategory
+
+
+class LabelEmbeddingIndex:
+    """ Embeddings of ontology labels computed once per ontology and stored on disk. """
+    def __init__(self, labels: Dict[LinkingCategory, List[str]],
+                 vectors: Dict[LinkingCategory, np.ndarray], ann_config: Optional[dict] = None) -> None:
+        """ Wrap label vectors grouped by linking category.
+
+        Args:
+            labels (Dict[LinkingCategory, List[str]]): labels of each category, in onto_map order
+            vectors (Dict[LinkingCategory, np.ndarray]): float32 matrices, one row per label
+            ann_config (Optional[dict]): approximate search settings, exact search if None
+        """
+        self._labels = labels
+        self._vectors = vectors
+        # unit length rows turn cosine similarity into a single matrix-vector product
+        self._normalized = {category: self._normalize_rows(matrix) for category, matrix in vectors.items()}
+        self._searchers: Dict[LinkingCategory, VectorSearch] = {
+            category: make_vector_search(matrix, ann_config) for category, matrix in self._normalized.items()
+        }
+
+    @classmethod
+    def load_or_build(cls, ontology_mngr: OntologyManager, vectorizer: Any,
+                      index_dir: str, ann_config: Optional[dict] = None) -> 'LabelEmbeddingIndex':
+        """ Load the index of a given ontology and model, build and store it if missing.
+
+        Args:
+            ontology_mngr (OntologyManager): ontology manager holding labels to index
+            vectorizer (BertVectorizer): vectorizer used to embed labels
+            index_dir (str): directory the index files are kept in
+            ann_config (Optional[dict]): approximate search settings, exact search if None
+
+        Returns:
+            LabelEmbeddingIndex: index ready to be queried
+        """
+        path_prefix = os.path.join(index_dir, cls.index_key(ontology_mngr.path, vectorizer.model_id))
+        if os.path.exists(f'{path_prefix}.npy') and os.path.exists(f'{path_prefix}.json'):
+            logging.debug(f"LabelEmbeddingIndex::loading {path_prefix}")
+            return cls.load(path_prefix, ann_config)
+
+        logging.debug(f"LabelEmbeddingIndex::building {path_prefix}")
+        index = cls.build(ontology_mngr, vectorizer, ann_config)
+        index.save(path_prefix)
+        return index
+
+    @staticmethod
+    def index_key(ontology_path: str, model_name: str) -> str:
+        """ Construct the name identifying the index of a given ontology file and model.
+
+        Args:
+            ontology_path (str): path to the ontology file
+            model_name (str): name of the model used to embed labels
+
+        Returns:
+            str: index key
+        """
+        fingerprint = Helpers.file_fingerprint(ontology_path)
+        return hashlib.sha1(f'{fingerprint}:{model_name}'.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def build(cls, ontology_mngr: OntologyManager, vectorizer: Any,
+              ann_config: Optional[dict] = None) -> 'LabelEmbeddingIndex':
+        """ Embed every label of the ontology, each in its own context.
+
+        Args:
+            ontology_mngr (OntologyManager): ontology manager holding labels to index
+            vectorizer (BertVectorizer): vectorizer used to embed labels
+            ann_config (Optional[dict]): approximate search settings, exact search if None
+
+        Returns:
+            LabelEmbeddingIndex: index built
+        """
+        hidden_size = vectorizer.model.config.hidden_size
+        labels = dict()
+        vectors = dict()
+        for category in ontology_mngr.onto_map:
+            labels[category] = list(ontology_mngr.onto_map[category].keys())
+            if len(labels[category]) == 0:
+                vectors[category] = np.zeros((0, hidden_size), dtype=np.float32)
+                continue
+            normalized_labels = [Helpers.normalize_label(label) for label in labels[category]]
+            # the index itself is stored, keep the vector cache for pairs seen while linking
+            vectors[category] = vectorizer.vectorize_batch(normalized_labels, normalized_labels,
+                                                           use_cache=False).numpy().astype(np.float32)
+        return cls(labels, vectors, ann_config)
+
+    def save(self, path_prefix: str) -> None:
+        """ Store the index as a float32 matrix (.npy) and a label table (.json).
+
+        Args:
+            path_prefix (str): path without extension to store index files at
+        """
+        os.makedirs(os.path.dirname(path_prefix) or '.', exist_ok=True)
+        table = [{"category": category.name, "label": label}
+                 for category in self._labels for label in self._labels[category]]
+        matrix = np.concatenate([self._vectors[category] for category in self._labels])
+
+        # write to temporary files first so concurrent readers never see partial files
+        with open(f'{path_prefix}.npy.tmp', 'wb') as f:
+            np.save(f, matrix.astype(np.float32))
+        with open(f'{path_prefix}.json.tmp', 'w') as f:
+            json.dump(table, f)
+        os.replace(f'{path_prefix}.npy.tmp', f'{path_prefix}.npy')
+        os.replace(f'{path_prefix}.json.tmp', f'{path_prefix}.json')
+
+    @classmethod
+    def load(cls, path_prefix: str, ann_config: Optional[dict] = None) -> 'LabelEmbeddingIndex':
+        """ Load index files stored with `save`.
+
+        Args:
+            path_prefix (str): path without extension index files are stored at
+            ann_config (Optional[dict]): approximate search settings, exact search if None
+
+        Returns:
+            LabelEmbeddingIndex: index loaded
+        """
+        matrix = np.load(f'{path_prefix}.npy', mmap_mode='r')
+        with open(f'{path_prefix}.json', 'r') as f:
+            table = json.load(f)
+
+        labels: Dict[LinkingCategory, List[str]] = {category: [] for category in LinkingCategory}
+        rows: Dict[LinkingCategory, List[int]] = {category: [] for category in LinkingCategory}
+        for row, entry in enumerate(table):
+            category = LinkingCategory[entry['category']]
+            labels[category].append(entry['label'])
+            rows[category].append(row)
+
+        vectors = dict()
+        for category in LinkingCategory:
+            if len(rows[category]) > 0:
+                # rows of a category are contiguous, slicing keeps the memory map
+                vectors[category] = matrix[rows[category][0]:rows[category][-1] + 1]
+            else:
+                vectors[category] = np.zeros((0, matrix.shape[1]), dtype=np.float32)
+        return cls(labels, vectors, ann_config)
+
+    def labels(self, category: LinkingCategory) -> List[str]:
+        """ Get labels of a given category, in the order of index rows.
+
+        Args:
+            category (LinkingCategory): category of labels
+
+        Returns:
+            List[str]: labels
+        """
+        return self._labels.get(category, [])
+
+    def vectors(self, category: LinkingCategory) -> np.ndarray:
+        """ Get label vectors of a given category.
+
+        Args:
+            category (LinkingCategory): category of labels
+
+        Returns:
+            np.ndarray: matrix with one row per label
+        """
+        return self._vectors[category]
+
+    def similarities(self, category: LinkingCategory, vector: np.ndarray) -> np.ndarray:
+        """ Calculate cosine similarity between a vector and every label of a category.
+
+        Args:
+            category (LinkingCategory): category of labels
+            vector (np.ndarray): query vector
+
+        Returns:
+            np.ndarray: similarities, aligned with `labels(category)`
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        return self._normalized[category].dot(vector / max(float(np.linalg.norm(vector)), 1e-8))
+
+    def search(self, category: LinkingCategory, vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """ Find labels of a category most similar to a vector.
+
+        Args:
+            category (LinkingCategory): category of labels
+            vector (np.ndarray): query vector
+            k (int): how many labels to return
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: label positions and their similarities, best first
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        return self._searchers[category].search(vector / max(float(np.linalg.norm(vector)), 1e-8), k)
+
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        """ Scale matrix rows to unit length.
+
+        Args:
+            matrix (np.ndarray): matrix to normalize
+
+        Returns:
+            np.ndarray: float32 matrix with unit length rows
+        """
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return (matrix / np.maximum(norms, 1e-8)).astype(np.float32)
@@ -0,0 +1,94 @@
+import logging
+import os
+import warnings
+from typing import Dict, List, Optional
+
+import torch
+from transformers import BertModel, PretrainedConfig
+
+
+class TracedEncoder:
+    """ BERT encoder traced and frozen with TorchScript, called like the BertModel it was traced from.
+
+        Forward passes skip Python module dispatch. Inputs are padded to a few fixed sequence lengths,
+        so the TorchScript executor specializes and optimizes the graph for those shapes only.
+    """
+    def __init__(self, module: torch.jit.ScriptModule, config: PretrainedConfig, buckets: List[int]) -> None:
+        """ Wrap a traced encoder.
+
+        Args:
+            module (torch.jit.ScriptModule): frozen traced BertModel
+            config (PretrainedConfig): config of the traced model
+            buckets (List[int]): sequence lengths inputs are padded to
+        """
+        self.module = module
+        self.config = config
+        # the longest sequence BERT takes is always a bucket
+        self.buckets = sorted({bucket for bucket in buckets if 0 < bucket < config.max_position_embeddings}
+                              | {config.max_position_embeddings})
+
+    @classmethod
+    def trace(cls, model: BertModel, path: Optional[str], buckets: List[int]) -> 'TracedEncoder':
+        """ Trace and freeze a model, storing the result.
+
+        Args:
+            model (BertModel): model in eval mode
+            path (Optional[str]): file the traced encoder is kept in, None to keep it in memory only
+            buckets (List[int]): sequence lengths inputs are padded to
+
+        Returns:
+            TracedEncoder: traced encoder
+        """
+        # padding in the example keeps the attention mask in the graph,
+        # masks without any padding are skipped otherwise
+        input_ids = torch.ones((2, 16), dtype=torch.long)
+        attention_mask = torch.ones((2, 16), dtype=torch.long)
+        attention_mask[1, 8:] = 0
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter('ignore', torch.jit.TracerWarning)
+            warnings.simplefilter('ignore', FutureWarning)  # recent torch releases deprecate TorchScript
+            module = torch.jit.freeze(torch.jit.trace(model, (input_ids, attention_mask), strict=False))
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', FutureWarning)
+                torch.jit.save(module, f'{path}.tmp')
+            os.replace(f'{path}.tmp', path)
+            logging.debug(f"TracedEncoder::saved {path}")
+        return cls(module, model.config, buckets)
+
+    @classmethod
+    def load(cls, path: str, config: PretrainedConfig, buckets: List[int]) -> 'TracedEncoder':
+        """ Load a stored traced encoder.
+
+        Args:
+            path (str): file the traced encoder is kept in
+            config (PretrainedConfig): config of the traced model
+            buckets (List[int]): sequence lengths inputs are padded to
+
+        Returns:
+            TracedEncoder: traced encoder
+        """
+        logging.debug(f"TracedEncoder::loading {path}")
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            return cls(torch.jit.load(path), config, buckets)
+
+    def __call__(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> Dict[str, torch.Tensor]:
+        """ Encode a padded batch.
+
+        Args:
+            input_ids (torch.Tensor): (batch, length) token ids
+            attention_mask (torch.Tensor): (batch, length) 1 for tokens, 0 for padding
+
+        Returns:
+            Dict[str, torch.Tensor]: last_hidden_state of shape (batch, length, hidden)
+        """
+        length = input_ids.shape[1]
+        bucket = next(bucket for bucket in self.buckets if bucket >= length)
+        if bucket > length:
+            padding = (0, bucket - length)
+            input_ids = torch.nn.functional.pad(input_ids, padding, value=self.config.pad_token_id or 0)
+            attention_mask = torch.nn.functional.pad(attention_mask, padding, value=0)
+        outputs = self.module(input_ids, attention_mask)
+        return {'last_hidden_state': outputs['last_hidden_state'][:, :length]}
@@ -0,0 +1,132 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from seequery.utils.lru_cache import LRUCache
+from seequery.utils.sqlite_store import SqliteStore
+
+# a phrase and the context it is embedded in
+Pair = Tuple[str, str]
+
+
+class VectorCache:
+    """ Contextual embeddings of (focus, context) pairs of a single model, kept in memory and optionally
+        in a SQLite file shared between processes.
+
+        With the default float32 storage a hit returns the very vector computed when the pair was first
+        seen. float16 halves memory and disk use at the cost of rounding every vector.
+
+        The SQLite file is bounded when a process opens the cache: vectors written first are deleted down
+        to max_disk_entries, and vectors of models or precisions unused for max_age_days are deleted.
+    """
+    def __init__(self, model_id: str, capacity: int = 100000, max_bytes: int = 0,
+                 db_path: Optional[str] = None, dtype: str = 'float32', max_disk_entries: int = 0,
+                 max_age_days: float = 0) -> None:
+        """ Open the cache.
+
+        Args:
+            model_id (str): identifies the model and any setting changing its vectors
+            capacity (int): most vectors kept in memory
+            max_bytes (int): most bytes of vectors kept in memory, 0 for no limit
+            db_path (Optional[str]): SQLite file, vectors are kept in memory only if None
+            dtype (str): 'float32' or 'float16', precision vectors are stored with
+            max_disk_entries (int): most vectors of this model kept in the file, 0 for no limit
+            max_age_days (float): vectors of models unused for this long are deleted from the file,
+                                  0 keeps them
+        """
+        self.dtype = np.dtype(dtype)
+        # vectors of another model or precision must never be mixed in
+        self.namespace = f'{model_id}:{self.dtype.name}'
+        self.memory = LRUCache(capacity, max_bytes, lambda vector: vector.nbytes)
+        self.store = SqliteStore(db_path, 'vectors') if db_path else None
+        if self.store:
+            self.store.touch(self.namespace)
+            if max_age_days > 0:
+                self.store.prune(max_age_days * 24 * 3600, keep=self.namespace)
+            if max_disk_entries > 0:
+                self.store.trim(self.namespace, max_disk_entries)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, model_id: str, config: Optional[dict]) -> Optional['VectorCache']:
+        """ Open the cache described by the config.
+
+        Args:
+            model_id (str): identifies the model and any setting changing its vectors
+            config (Optional[dict]): vector_cache section of the embeddings config
+
+        Returns:
+            Optional[VectorCache]: cache, None if disabled
+        """
+        if not config or not config.get('enabled', False):
+            return None
+        return cls(model_id, config.get('capacity', 100000), config.get('max_mb', 0) * 1024 * 1024,
+                   config.get('db_path'), config.get('dtype', 'float32'), config.get('max_disk_entries', 0),
+                   config.get('max_age_days', 0))
+
+    def get_many(self, pairs: List[Pair]) -> Dict[Pair, np.ndarray]:
+        """ Look vectors up, in memory first, then on disk.
+
+        Args:
+            pairs (List[Pair]): (focus, context) pairs, repeated ones are looked up once
+
+        Returns:
+            Dict[Pair, np.ndarray]: vectors of pairs found, in storage precision
+        """
+        pairs = list(dict.fromkeys(pairs))
+        found = dict()
+        missing = []
+        for pair in pairs:
+            vector = self.memory.get(pair)
+            if vector is not None:
+                found[pair] = vector
+            else:
+                missing.append(pair)
+        memory_hits = len(found)
+
+        if self.store and len(missing) > 0:
+            keys = {self._key(pair): pair for pair in missing}
+            for key, value in self.store.get_many(self.namespace, list(keys.keys())).items():
+                vector = np.frombuffer(value, dtype=self.dtype)
+                found[keys[key]] = vector
+                self.memory.put(keys[key], vector)
+
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += len(found) - memory_hits
+            self.misses += len(pairs) - len(found)
+        return found
+
+    def put_many(self, vectors: Dict[Pair, np.ndarray]) -> None:
+        """ Store freshly computed vectors.
+
+        Args:
+            vectors (Dict[Pair, np.ndarray]): pairs mapped to float32 vectors
+        """
+        stored = {pair: vector.astype(self.dtype) for pair, vector in vectors.items()}
+        for pair, vector in stored.items():
+            self.memory.put(pair, vector)
+        if self.store:
+            self.store.put_many(self.namespace,
+                                {self._key(pair): vector.tobytes() for pair, vector in stored.items()})
+
+    def stats(self) -> Dict[str, float]:
+        """ Report hits and misses since the cache was opened.
+
+        Returns:
+            Dict[str, float]: hit and miss counts, hit rate, vectors and bytes kept in memory
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {"memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups > 0 else 0.0,
+                    "memory_entries": len(self.memory), "memory_bytes": self.memory.bytes}
+
+    @staticmethod
+    def _key(pair: Pair) -> str:
+        """ Join a pair into a single text key, the unit separator does not occur in CQs or labels. """
+        return f'{pair[0]}\x1f{pair[1]}'
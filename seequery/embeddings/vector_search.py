@@ -0,0 +1,111 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+import numpy as np
+
+from seequery.utils.helpers import Helpers
+
+
+class VectorSearch(ABC):
+    """ Nearest neighbour search over unit length vectors, by cosine similarity. """
+    @abstractmethod
+    def search(self, vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Find rows most similar to a given unit length vector.
+
+            Args:
+                vector (np.ndarray): unit length query vector
+                k (int): how many rows to return
+
+            Returns:
+                Tuple[np.ndarray, np.ndarray]: row ids and their similarities, best first
+        """
+        pass
+
+
+class ExactSearch(VectorSearch):
+    """ Score every row. """
+    def __init__(self, matrix: np.ndarray) -> None:
+        self.matrix = matrix
+
+    def search(self, vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.matrix.dot(vector)
+        ids = Helpers.top_k_indices(scores, k)
+        return ids, scores[ids]
+
+
+class IVFFlatSearch(VectorSearch):
+    """ Inverted file index: rows are clustered with spherical k-means and only rows
+        of the n_probe clusters closest to a query are scored.
+    """
+    def __init__(self, matrix: np.ndarray, n_lists: int, n_probe: int,
+                 iterations: int = 10, seed: int = 0) -> None:
+        """ Cluster rows of a given matrix.
+
+        Args:
+            matrix (np.ndarray): unit length rows to index
+            n_lists (int): number of clusters
+            n_probe (int): number of clusters scored per query, trades latency for recall
+            iterations (int): k-means iterations
+            seed (int): random seed used to pick initial centroids
+        """
+        self.matrix = matrix
+        self.n_lists = max(1, min(n_lists, len(matrix)))
+        self.n_probe = max(1, min(n_probe, self.n_lists))
+        self.centroids = self._train(iterations, seed)
+
+        assignment = np.argmax(self.matrix.dot(self.centroids.T), axis=1)
+        order = np.argsort(assignment, kind='stable')
+        boundaries = np.searchsorted(assignment[order], np.arange(self.n_lists + 1))
+        self.lists = [order[boundaries[i]:boundaries[i + 1]] for i in range(self.n_lists)]
+
+    def search(self, vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        probed = Helpers.top_k_indices(self.centroids.dot(vector), self.n_probe)
+        candidates = np.sort(np.concatenate([self.lists[i] for i in probed]))
+        scores = self.matrix[candidates].dot(vector)
+        best = Helpers.top_k_indices(scores, k)
+        return candidates[best], scores[best]
+
+    def _train(self, iterations: int, seed: int) -> np.ndarray:
+        """ Run spherical k-means on a sample of rows.
+
+        Args:
+            iterations (int): k-means iterations
+            seed (int): random seed
+
+        Returns:
+            np.ndarray: unit length centroids
+        """
+        rng = np.random.RandomState(seed)
+        # as in other IVF implementations, a few dozen points per list are enough to train on
+        sample_size = min(len(self.matrix), 64 * self.n_lists)
+        sample = self.matrix[rng.choice(len(self.matrix), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(sample.dot(centroids.T), axis=1)
+            for list_id in range(self.n_lists):
+                members = sample[assignment == list_id]
+                if len(members) == 0:
+                    continue  # keep an empty cluster where it was
+                centroid = members.sum(axis=0)
+                centroids[list_id] = centroid / max(float(np.linalg.norm(centroid)), 1e-8)
+        return centroids
+
+
+def make_vector_search(matrix: np.ndarray, ann_config: Optional[dict] = None) -> VectorSearch:
+    """ Choose a search strategy for a given matrix.
+
+    Args:
+        matrix (np.ndarray): unit length rows to search over
+        ann_config (Optional[dict]): `ann` section of the entity linker config
+
+    Returns:
+        VectorSearch: approximate search if enabled and the matrix is large enough, exact otherwise
+    """
+    if not ann_config or not ann_config.get('enabled', False) or \
+            len(matrix) < ann_config.get('min_labels', 5000):
+        return ExactSearch(matrix)
+
+    n_lists = ann_config.get('n_lists', 0) or int(np.sqrt(len(matrix)))
+    return IVFFlatSearch(matrix, n_lists, ann_config.get('n_probe', 8))
@@ -0,0 +1,152 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import owlready2
+
+
+class HierarchyIndex:
+    """ Transitive closure of the ontology hierarchy, computed once at load time.
+
+        Every indexed object and each of its ancestors gets an integer id; ancestors always get
+        smaller ids than their descendants, which keeps bitsets short. The closure of an object is
+        a bitset (Python int) of its ancestors ids, the object itself included.
+    """
+    def __init__(self, objects: List[Any], closures: Dict[Any, int],
+                 restrictions: Dict[Any, Tuple[int, int, bool, bool]]) -> None:
+        """ Wrap a precomputed closure.
+
+        Args:
+            objects (List[Any]): objects in id order
+            closures (Dict[Any, int]): objects mapped to bitsets of their ancestors
+            restrictions (Dict[Any, Tuple[int, int, bool, bool]]): properties mapped to domain and range
+                                                                   bitsets and whether they are given
+        """
+        self.objects = objects
+        self.ids: Dict[Any, int] = {obj: idx for idx, obj in enumerate(objects)}
+        self.closures = closures
+        self.restrictions = restrictions
+
+    @classmethod
+    def from_owlready(cls, objects: Iterable[Any], properties: Iterable[Any]) -> 'HierarchyIndex':
+        """ Walk the hierarchy of all objects and collect domains and ranges of properties.
+
+        Args:
+            objects (Iterable[Any]): ontology objects that may be checked against the hierarchy
+            properties (Iterable[Any]): properties whose domain and range is checked
+
+        Returns:
+            HierarchyIndex: closure computed
+        """
+        properties = list(properties)
+        ancestors: Dict[Any, Set[Any]] = dict()
+        for obj in list(objects) + properties:
+            if obj is not None and obj not in ancestors:
+                ancestors[obj] = cls._walk_ancestors(obj)
+
+        universe = set(ancestors.keys()).union(*ancestors.values())
+        # an ancestor has strictly fewer ancestors than its descendants, so it gets a smaller id
+        ordered = sorted(universe, key=lambda o: (len(ancestors[o]) if o in ancestors else 1, o.iri))
+        index = cls(ordered, dict(), dict())
+        for obj, obj_ancestors in ancestors.items():
+            index.closures[obj] = index.to_bitset(obj_ancestors)
+        for prop in properties:
+            index.restrictions[prop] = (index.to_bitset(prop.domain), index.to_bitset(prop.range),
+                                        len(prop.domain) > 0, len(prop.range) > 0)
+        return index
+
+    def to_bitset(self, objects: Iterable[Any]) -> int:
+        """ Put objects in a bitset, objects which are not ancestors of any indexed object are skipped.
+
+        Args:
+            objects (Iterable[Any]): objects to put in a bitset
+
+        Returns:
+            int: bitset of object ids
+        """
+        bitset = 0
+        for obj in objects:
+            if obj in self.ids:
+                bitset |= 1 << self.ids[obj]
+        return bitset
+
+    def closure(self, obj: Optional[Any]) -> int:
+        """ Get ancestors of an object, itself included.
+
+        Args:
+            obj (Optional[Any]): ontology object
+
+        Returns:
+            int: bitset of ancestor ids, only the object itself if it was not indexed, 0 for None
+        """
+        if obj is None:
+            return 0
+        return self.closures.get(obj, self.to_bitset([obj]))
+
+    def ancestors(self, obj: Optional[Any]) -> List[Any]:
+        """ Get ancestors of an object, itself included, in id order.
+
+        Args:
+            obj (Optional[Any]): ontology object
+
+        Returns:
+            List[Any]: ancestors, empty for None
+        """
+        return [self.objects[idx] for idx in self.bit_ids(self.closure(obj))]
+
+    @staticmethod
+    def bit_ids(bitset: int) -> List[int]:
+        """ Get ids of bits set.
+
+        Args:
+            bitset (int): bitset
+
+        Returns:
+            List[int]: ids in increasing order
+        """
+        ids = []
+        while bitset:
+            lowest = bitset & -bitset
+            ids.append(lowest.bit_length() - 1)
+            bitset ^= lowest
+        return ids
+
+    def is_ancestor(self, candidate: Optional[Any], obj: Optional[Any]) -> bool:
+        """ Check if an object is among ancestors of another one.
+
+        Args:
+            candidate (Optional[Any]): possible ancestor
+            obj (Optional[Any]): object whose ancestors are checked
+
+        Returns:
+            bool: True if candidate is an ancestor of obj or obj itself
+        """
+        if candidate is None or obj is None or candidate not in self.ids:
+            return False
+        return (self.closure(obj) >> self.ids[candidate]) & 1 == 1
+
+    def restriction(self, prop: Any) -> Tuple[int, int, bool, bool]:
+        """ Get domain and range of a property.
+
+        Args:
+            prop (Any): property
+
+        Returns:
+            Tuple[int, int, bool, bool]: domain and range bitsets, then whether domain and range are given,
+                                         properties not indexed have neither
+        """
+        return self.restrictions.get(prop, (0, 0, False, False))
+
+    @staticmethod
+    def _walk_ancestors(obj: Any) -> Set[Any]:
+        """ Collect ancestors of an object with owlready2.
+
+        Args:
+            obj (Any): ontology object
+
+        Returns:
+            Set[Any]: ancestors of a class or a property, classes of an individual, the object included
+        """
+        if isinstance(obj, owlready2.Thing):
+            # individuals have no ancestors() in owlready2, use those of their classes
+            classes: List[Any] = [c for c in obj.is_a if isinstance(c, owlready2.EntityClass)]
+            return {obj}.union(*[c.ancestors() for c in classes])
+        return set(obj.ancestors()) | {obj}
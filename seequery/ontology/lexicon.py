@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from seequery.utils.helpers import Helpers
+from seequery.utils.linking_category import LinkingCategory
+from seequery.utils.spacy_processor import SpacyProcessor
+
+
+@dataclass
+class LexiconEntry:
+    '''Class for keeping surface forms of an ontology label'''
+    label: str = ""
+    normalized_text: str = ""
+    lowercased: str = ""
+    lemma: str = ""
+    stripped: str = ""
+
+
+class OntologyLexicon:
+    """ Surface forms of all ontology labels, computed once when an ontology is loaded. """
+    FORMS = ['normalized_text', 'lowercased', 'lemma', 'stripped']
+
+    def __init__(self, onto_map: Dict[LinkingCategory, Dict[str, Any]], spacy_nlp: SpacyProcessor) -> None:
+        """ Normalize, lowercase, lemmatize and strip every label.
+
+        Args:
+            onto_map (Dict[LinkingCategory, Dict[str, Any]]): labels mapped to ontology objects, per category
+            spacy_nlp (SpacyProcessor): spacy processor used to lemmatize labels
+        """
+        self.entries: Dict[LinkingCategory, List[LexiconEntry]] = dict()
+        self.label_ids: Dict[LinkingCategory, Dict[str, int]] = dict()
+        # category -> form name -> form text -> ids of labels having it, in label order
+        self.form_ids: Dict[LinkingCategory, Dict[str, Dict[str, List[int]]]] = dict()
+
+        for category in onto_map:
+            labels = list(onto_map[category].keys())
+            normalized_labels = [Helpers.normalize_label(label) for label in labels]
+            lemmas = spacy_nlp.lemmatize_many([normalized.lower() for normalized in normalized_labels])
+
+            self.entries[category] = [
+                LexiconEntry(label=label,
+                             normalized_text=normalized,
+                             lowercased=label.lower(),
+                             lemma=lemma,
+                             stripped=Helpers.strip_s(normalized.lower()))
+                for label, normalized, lemma in zip(labels, normalized_labels, lemmas)
+            ]
+            self.label_ids[category] = {entry.label: idx for idx, entry in enumerate(self.entries[category])}
+            self.form_ids[category] = {form: dict() for form in self.FORMS}
+            for idx, entry in enumerate(self.entries[category]):
+                for form in self.FORMS:
+                    self.form_ids[category][form].setdefault(getattr(entry, form), []).append(idx)
+
+    def entry(self, category: LinkingCategory, label: str) -> LexiconEntry:
+        """ Get surface forms of a given label.
+
+        Args:
+            category (LinkingCategory): category of the label
+            label (str): label as in onto_map
+
+        Returns:
+            LexiconEntry: surface forms
+        """
+        return self.entries[category][self.label_ids[category][label]]
+
+    def find(self, category: LinkingCategory, form: str, text: str) -> List[int]:
+        """ Get ids of labels having a given surface form.
+
+        Args:
+            category (LinkingCategory): category of labels
+            form (str): one of FORMS
+            text (str): surface form to look for
+
+        Returns:
+            List[int]: ids of matching labels, in label order
+        """
+        return self.form_ids.get(category, {}).get(form, {}).get(text, [])
+
+    def find_equivalent(self, category: LinkingCategory, text: str, lemma: str) -> Optional[LexiconEntry]:
+        """ Find the first label equal to a phrase, to its lemma, or to it without a plural 's'.
+
+        Args:
+            category (LinkingCategory): category of labels
+            text (str): lowercased phrase
+            lemma (str): lemma of the phrase
+
+        Returns:
+            Optional[LexiconEntry]: first label in label order matching any of the forms
+        """
+        candidates: Iterable[List[int]] = [self.find(category, 'normalized_text', text),
+                                           self.find(category, 'lemma', lemma),
+                                           self.find(category, 'stripped', Helpers.strip_s(text))]
+        first_ids = [ids[0] for ids in candidates if len(ids) > 0]
+        if len(first_ids) == 0:
+            return None
+        return self.entries[category][min(first_ids)]
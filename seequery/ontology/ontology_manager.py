@@ -1,34 +1,77 @@
 import os
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import owlready2
 
+from seequery.ontology.hierarchy import HierarchyIndex
+from seequery.ontology.lexicon import OntologyLexicon
+from seequery.ontology.snapshot import OntologySnapshot
+from seequery.ontology.usage_index import UsageIndex
 from seequery.utils.helpers import Helpers
 from seequery.utils.linking_category import LinkingCategory
 
 
 class OntologyManager:
     """ Manage ontology. """
-    def __init__(self, config: dict) -> None:
+    def __init__(self, config: dict, spacy_nlp: Any = None) -> None:
         """ Load ontology and provide methods to operate over it.
 
         Args:
-            config (dict): config dict
+            config (dict): config dict, with an optional `snapshot_dir` to load the ontology
+                           from a snapshot, stored there on first load
+            spacy_nlp (Any): SpacyProcessor, if given the label lexicon is built right away
         """
-        self.ontology = self._load_ontology(config['onto_id'])
-        self.onto_map = {
-            LinkingCategory.CLASS: {self._get_label(c): c for c in
-                                    self.ontology.classes()},
-            LinkingCategory.DATA_PROPERTY: {self._get_label(p): p for p in
-                                            self.ontology.data_properties()},
-            LinkingCategory.OBJECT_PROPERTY: {self._get_label(p): p for p in
-                                              self.ontology.object_properties()},
-            LinkingCategory.INDIVIDUAL: {self._get_label(i): i for i in
-                                         self.ontology.individuals()}
-        }
+        self.path = self._resolve_path(config['onto_id'])
+        snapshot_dir = config.get('snapshot_dir')
+        snapshot_path = OntologySnapshot.path_prefix(snapshot_dir, self.path) if snapshot_dir else None
+
+        if snapshot_path and OntologySnapshot.exists(snapshot_path):
+            # no owlready2 parse, ontology objects are OntologyEntity records
+            self.ontology: Any = None
+            snapshot = OntologySnapshot.load(snapshot_path)
+            self.onto_map = snapshot.onto_map
+            self.prop_examples = snapshot.prop_examples
+            self.hierarchy = snapshot.hierarchy
+        else:
+            self.ontology = self._load_ontology(self.path)
+            self.onto_map = {
+                LinkingCategory.CLASS: {self._get_label(c): c for c in
+                                        self.ontology.classes()},
+                LinkingCategory.DATA_PROPERTY: {self._get_label(p): p for p in
+                                                self.ontology.data_properties()},
+                LinkingCategory.OBJECT_PROPERTY: {self._get_label(p): p for p in
+                                                  self.ontology.object_properties()},
+                LinkingCategory.INDIVIDUAL: {self._get_label(i): i for i in
+                                             self.ontology.individuals()}
+            }
+            self.prop_examples = self.get_usages()
+            self.hierarchy = HierarchyIndex.from_owlready(
+                [obj for category in self.onto_map for obj in self.onto_map[category].values()] +
+                [obj for usages in self.prop_examples.values() for usage in usages for obj in usage],
+                list(self.prop_examples.keys()) +
+                [obj for category in [LinkingCategory.OBJECT_PROPERTY, LinkingCategory.DATA_PROPERTY]
+                 for obj in self.onto_map[category].values()])
+            if snapshot_path:
+                OntologySnapshot(self.onto_map, self.prop_examples, self.hierarchy).save(snapshot_path)
+
         self.entities = [k for k, _ in self.onto_map[LinkingCategory.CLASS].items()] + [k for k, _ in self.onto_map[LinkingCategory.INDIVIDUAL].items()]
         self.properties = [k for k, _ in self.onto_map[LinkingCategory.OBJECT_PROPERTY].items()] + [k for k, _ in self.onto_map[LinkingCategory.DATA_PROPERTY].items()]
-        self.prop_examples = self.get_usages()
+        self.usage_index = UsageIndex(self.prop_examples, self.hierarchy)
+        self.lexicon: Optional[OntologyLexicon] = None
+        if spacy_nlp is not None:
+            self.build_lexicon(spacy_nlp)
+
+    def build_lexicon(self, spacy_nlp: Any) -> OntologyLexicon:
+        """ Compute surface forms of all labels once, so that they can be looked up per CQ.
+
+        Args:
+            spacy_nlp (Any): SpacyProcessor used to lemmatize labels
+
+        Returns:
+            OntologyLexicon: lexicon built
+        """
+        self.lexicon = OntologyLexicon(self.onto_map, spacy_nlp)
+        return self.lexicon
 
     def calc_restriction_score(self, predicate: Any, obj1: Any,
                                obj2: Any = None) -> Tuple[float, Optional[bool]]:
@@ -45,42 +88,35 @@ class OntologyManager:
             Returns:
                 Tuple[float, Optional[bool]]: restriction score with argswitch info
         """
-        subject_with_ancestors = set(obj1.ancestors())
-        subject_with_ancestors.add(obj1)
+        subject_with_ancestors = self.hierarchy.closure(obj1)
+        object_with_ancestors = self.hierarchy.closure(obj2) if obj2 else 0
+        domain, range_, has_domain, has_range = self.hierarchy.restriction(predicate)
 
-        if obj2:
-            object_with_ancestors = set(obj2.ancestors())
-            object_with_ancestors.add(obj2)
-        else:
-            object_with_ancestors = set()
-
-        if len(predicate.domain) == 0 and len(predicate.range) == 0:
+        if not has_domain and not has_range:
             # assign highest score when no restrictions
             return 1.0, None
         # empty domain -> check range only
-        if len(predicate.domain) == 0:
-            if len(set(predicate.range) & object_with_ancestors) > 0:
+        if not has_domain:
+            if range_ & object_with_ancestors:
                 return 1.0, False
-            elif len(set(predicate.range) & subject_with_ancestors) > 0:
+            elif range_ & subject_with_ancestors:
                 return 1.0, True
             else:
                 return 0.0, None
 
         # empty range -> check domain only
-        elif len(predicate.range) == 0:
-            if len(set(predicate.domain) & object_with_ancestors) > 0:
+        elif not has_range:
+            if domain & object_with_ancestors:
                 return 1.0, True
-            elif len(set(predicate.domain) & subject_with_ancestors) > 0:
+            elif domain & subject_with_ancestors:
                 return 1.0, False
             else:
                 return 0.0, None  # 0.5?
 
         # if in domain AND range
-        elif(len(set(predicate.domain) & subject_with_ancestors) > 0 and
-             len(set(predicate.range) & object_with_ancestors) > 0):
+        elif domain & subject_with_ancestors and range_ & object_with_ancestors:
             return 1.0, False
-        elif(len(set(predicate.range) & subject_with_ancestors) > 0 and
-             len(set(predicate.domain) & object_with_ancestors) > 0):
+        elif range_ & subject_with_ancestors and domain & object_with_ancestors:
             return 1.0, True  # inversed!
         else:
             return 0.0, None
@@ -102,98 +138,30 @@ class OntologyManager:
             Returns:
                 Tuple[float, Optional[bool]]: usage score, between 0 and 1 and (optional) argswitch
         """
-        max_score = 0.0
-        arg_switch = None
-
-        # iterate over all predicate instanes (relations)
-        if predicate not in self.prop_examples:
-            return 0.0, None
+        return self.usage_index.score(predicate, subject, obj)
 
-        for subj_obj in self.prop_examples[predicate]:
-            pred_subject, pred_object = subj_obj[0], subj_obj[1]
-            # explicit usage
-            if(pred_subject == subject and pred_object == obj):
-                return 1.0, False
-            elif pred_subject == obj and pred_object == subject:
-                return 1.0, True  # argswitch!
-            # one sided exact match and ancestor match
-            elif (subject in self._get_ancestors(pred_subject) and
-                  pred_object == obj):
-                max_score, arg_switch = \
-                    self._max_update(0.75, max_score, arg_switch, False)
-            elif (obj and subject == pred_subject and
-                  obj in self._get_ancestors(pred_object)):
-                max_score, arg_switch = \
-                    self._max_update(0.75, max_score, arg_switch, False)
-            elif (subject in self._get_ancestors(pred_object) and
-                  pred_object == subject):
-                max_score, arg_switch = \
-                    self._max_update(0.75, max_score, arg_switch, True)
-            elif (obj and subject == pred_object and
-                  subject in self._get_ancestors(pred_object)):
-                max_score, arg_switch = \
-                    self._max_update(0.75, max_score, arg_switch, True)
-            # single sided explicit match
-            elif (pred_subject == subject or pred_object == obj):
-                max_score, arg_switch = \
-                    self._max_update(0.5, max_score, arg_switch, False)
-            elif (pred_object == subject or pred_subject == obj):
-                max_score, arg_switch = \
-                    self._max_update(0.5, max_score, arg_switch, True)
-            # single sided ancestor match
-            elif (subject in self._get_ancestors(pred_subject) or
-                  obj in self._get_ancestors(pred_object)):
-                max_score, arg_switch = \
-                    self._max_update(0.25, max_score, arg_switch, False)
-            elif (subject in self._get_ancestors(pred_object) or
-                  obj in self._get_ancestors(pred_subject)):
-                max_score, arg_switch = \
-                    self._max_update(0.25, max_score, arg_switch, True)
-
-        return max_score, arg_switch
-
-    def _max_update(self, score: float, max_score: float, argswitch: Optional[bool],
-                    new_argswitch: Optional[bool]) -> Tuple[float, Optional[bool]]:
-        """ Update max_score and argswitch if current score is better than current max.
+    def _resolve_path(self, ontology_id: str) -> str:
+        """ Resolve ontology id or filepath into a filepath
 
         Args:
-            score (float): current score
-            max_score (float): current max score
-            argswitch (Optional[bool]): current should arguments be inverted
-            new_argswitch (Optional[bool]): new should arguments be inverted
+            ontology_id (str): ontology id or filepath
 
         Returns:
-            Tuple[float, Optional[bool]]: max score and decision -- should args be switched?
+            str: path to the ontology file
         """
-        if score > max_score:
-            return score, new_argswitch
-        else:
-            return max_score, argswitch
-
-    def _get_ancestors(self, obj: Any = None) -> Set[Any]:
-        """ Return ancestors of a given object
-
-        Returns:
-            set: ancestors of a given object
-        """
-        if not obj:
-            return set()
-        else:
-            return set(obj.ancestors())
+        if os.path.exists(ontology_id):
+            return ontology_id
+        return Helpers.onto2path(ontology_id)
 
-    def _load_ontology(self, ontology_id: str) -> Any:
-        """ Load ontology from its id or filepath
+    def _load_ontology(self, path: str) -> Any:
+        """ Load ontology from its filepath
 
         Args:
-            ontology_id (str): ontology id or filepath to load
+            path (str): filepath to load
 
         Returns:
             Any: ontology
         """
-        if os.path.exists(ontology_id):
-            path = ontology_id
-        else:
-            path = Helpers.onto2path(ontology_id)
         return owlready2.get_ontology(f"file://{path}").load()
 
     def _get_label(self, obj: Any) -> str:
@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from seequery.ontology.hierarchy import HierarchyIndex
+from seequery.utils.helpers import Helpers
+from seequery.utils.linking_category import LinkingCategory
+
+
+@dataclass(frozen=True)
+class OntologyEntity:
+    '''Class for keeping an ontology object restored from a snapshot, identified by its IRI'''
+    iri: str = ""
+    name: str = field(default="", compare=False)
+
+
+class OntologySnapshot:
+    """ Everything the pipeline needs from an ontology, stored so that the RDF/XML parse can be skipped.
+
+        Labels and IRIs are kept in a .json table, hierarchy closure, domains, ranges and usages
+        as sections of a single int64 array in a .npy file, which is memory mapped when loaded.
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, onto_map: Dict[LinkingCategory, Dict[str, Any]],
+                 prop_examples: Dict[Any, List[Tuple[Any, Any]]], hierarchy: HierarchyIndex) -> None:
+        """ Wrap ontology data.
+
+        Args:
+            onto_map (Dict[LinkingCategory, Dict[str, Any]]): labels mapped to ontology objects, per category
+            prop_examples (Dict[Any, List[Tuple[Any, Any]]]): properties mapped to their usages
+            hierarchy (HierarchyIndex): hierarchy closure covering all objects above
+        """
+        self.onto_map = onto_map
+        self.prop_examples = prop_examples
+        self.hierarchy = hierarchy
+
+    @classmethod
+    def path_prefix(cls, snapshot_dir: str, ontology_path: str) -> str:
+        """ Construct the path of the snapshot of a given ontology file.
+
+        Args:
+            snapshot_dir (str): directory snapshots are kept in
+            ontology_path (str): path to the ontology file
+
+        Returns:
+            str: path without extension
+        """
+        fingerprint = Helpers.file_fingerprint(ontology_path)
+        return os.path.join(snapshot_dir, f'{fingerprint}.v{cls.FORMAT_VERSION}')
+
+    @staticmethod
+    def exists(path_prefix: str) -> bool:
+        """ Check if snapshot files are stored at a given path.
+
+        Args:
+            path_prefix (str): path without extension
+
+        Returns:
+            bool: True if both files exist
+        """
+        return os.path.exists(f'{path_prefix}.npy') and os.path.exists(f'{path_prefix}.json')
+
+    def save(self, path_prefix: str) -> None:
+        """ Store the snapshot as an int64 array (.npy) and a table of labels and IRIs (.json).
+
+        Args:
+            path_prefix (str): path without extension to store snapshot files at
+        """
+        os.makedirs(os.path.dirname(path_prefix) or '.', exist_ok=True)
+        ids = self.hierarchy.ids
+        objects = self.hierarchy.objects
+
+        closures = [self.hierarchy.bit_ids(self.hierarchy.closure(obj)) for obj in objects]
+        properties = list(self.hierarchy.restrictions.keys())
+        restrictions = [self.hierarchy.restrictions[prop] for prop in properties]
+        usage_properties = list(self.prop_examples.keys())
+        sections = {
+            'closure_offsets': self._offsets([len(closure) for closure in closures]),
+            'closure_ids': self._concat(closures),
+            'restriction_properties': [ids[prop] for prop in properties],
+            'restriction_flags': [int(has_domain) | int(has_range) << 1
+                                  for _, _, has_domain, has_range in restrictions],
+            'domain_offsets': self._offsets([bin(domain).count('1') for domain, _, _, _ in restrictions]),
+            'domain_ids': self._concat([self.hierarchy.bit_ids(domain) for domain, _, _, _ in restrictions]),
+            'range_offsets': self._offsets([bin(range_).count('1') for _, range_, _, _ in restrictions]),
+            'range_ids': self._concat([self.hierarchy.bit_ids(range_) for _, range_, _, _ in restrictions]),
+            'usage_properties': [ids[prop] for prop in usage_properties],
+            'usage_offsets': self._offsets([len(self.prop_examples[prop]) for prop in usage_properties]),
+            # subject id, object id or -1 when the object is not a class
+            'usage_pairs': [ids[arg] if arg is not None else -1 for prop in usage_properties
+                            for usage in self.prop_examples[prop] for arg in usage],
+        }
+        spans = dict()
+        start = 0
+        for name, values in sections.items():
+            spans[name] = [start, start + len(values)]
+            start += len(values)
+        array = np.array([value for values in sections.values() for value in values], dtype=np.int64)
+
+        table = {
+            "version": self.FORMAT_VERSION,
+            "iris": [obj.iri for obj in objects],
+            "names": [getattr(obj, 'name', obj.iri) for obj in objects],
+            "categories": {category.name: {"labels": list(self.onto_map[category].keys()),
+                                           "ids": [ids[obj] for obj in self.onto_map[category].values()]}
+                           for category in self.onto_map},
+            "sections": spans,
+        }
+
+        # write to temporary files first so concurrent readers never see partial files
+        with open(f'{path_prefix}.npy.tmp', 'wb') as f:
+            np.save(f, array)
+        with open(f'{path_prefix}.json.tmp', 'w') as f:
+            json.dump(table, f)
+        os.replace(f'{path_prefix}.npy.tmp', f'{path_prefix}.npy')
+        os.replace(f'{path_prefix}.json.tmp', f'{path_prefix}.json')
+        logging.debug(f"OntologySnapshot::saved {path_prefix} with {len(objects)} objects")
+
+    @classmethod
+    def load(cls, path_prefix: str) -> 'OntologySnapshot':
+        """ Load snapshot files stored with `save`, ontology objects become OntologyEntity records.
+
+        Args:
+            path_prefix (str): path without extension snapshot files are stored at
+
+        Returns:
+            OntologySnapshot: snapshot loaded
+        """
+        array = np.load(f'{path_prefix}.npy', mmap_mode='r')
+        with open(f'{path_prefix}.json', 'r') as f:
+            table = json.load(f)
+        sections = {name: array[start:end].tolist() for name, (start, end) in table['sections'].items()}
+
+        objects = [OntologyEntity(iri=iri, name=name) for iri, name in zip(table['iris'], table['names'])]
+        closures = {obj: cls._to_bitset(cls._ragged(sections['closure_ids'],
+                                                    sections['closure_offsets'], idx))
+                    for idx, obj in enumerate(objects)}
+        restrictions = dict()
+        for idx, (prop_id, flags) in enumerate(zip(sections['restriction_properties'],
+                                                   sections['restriction_flags'])):
+            restrictions[objects[prop_id]] = (
+                cls._to_bitset(cls._ragged(sections['domain_ids'], sections['domain_offsets'], idx)),
+                cls._to_bitset(cls._ragged(sections['range_ids'], sections['range_offsets'], idx)),
+                bool(flags & 1), bool(flags & 2))
+        hierarchy = HierarchyIndex(objects, closures, restrictions)
+
+        onto_map = {LinkingCategory[name]: {label: objects[obj_id]
+                                            for label, obj_id in zip(entry['labels'], entry['ids'])}
+                    for name, entry in table['categories'].items()}
+
+        pairs = sections['usage_pairs']
+        prop_examples = dict()
+        for idx, prop_id in enumerate(sections['usage_properties']):
+            start, end = sections['usage_offsets'][idx], sections['usage_offsets'][idx + 1]
+            prop_examples[objects[prop_id]] = [
+                (objects[pairs[2 * i]], objects[pairs[2 * i + 1]] if pairs[2 * i + 1] >= 0 else None)
+                for i in range(start, end)
+            ]
+        logging.debug(f"OntologySnapshot::loaded {path_prefix} with {len(objects)} objects")
+        return cls(onto_map, prop_examples, hierarchy)
+
+    @staticmethod
+    def _offsets(lengths: List[int]) -> List[int]:
+        """ Turn lengths of consecutive runs into their offsets.
+
+        Args:
+            lengths (List[int]): run lengths
+
+        Returns:
+            List[int]: start of each run, followed by the total length
+        """
+        return np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).tolist()
+
+    @staticmethod
+    def _concat(runs: List[List[int]]) -> List[int]:
+        """ Concatenate runs.
+
+        Args:
+            runs (List[List[int]]): runs of ids
+
+        Returns:
+            List[int]: ids of all runs
+        """
+        return [value for run in runs for value in run]
+
+    @staticmethod
+    def _ragged(values: List[int], offsets: List[int], idx: int) -> List[int]:
+        """ Get a single run.
+
+        Args:
+            values (List[int]): concatenated runs
+            offsets (List[int]): offsets of runs
+            idx (int): run to get
+
+        Returns:
+            List[int]: values of the run
+        """
+        return values[offsets[idx]:offsets[idx + 1]]
+
+    @staticmethod
+    def _to_bitset(ids: List[int]) -> int:
+        """ Put ids in a bitset.
+
+        Args:
+            ids (List[int]): ids
+
+        Returns:
+            int: bitset
+        """
+        bitset = 0
+        for idx in ids:
+            bitset |= 1 << idx
+        return bitset
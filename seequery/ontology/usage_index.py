@@ -0,0 +1,120 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from seequery.ontology.hierarchy import HierarchyIndex
+
+# (position of the first usage matching, argswitch if that usage decides the score)
+Match = Tuple[Optional[int], bool]
+
+
+class PropertyUsages:
+    """ Hash indexes over usages of a single property, each key mapped to the first usage having it. """
+    def __init__(self, usages: List[Tuple[Any, Any]], ancestors: Callable[[Any], List[Any]]) -> None:
+        """ Index usages by their arguments and by ancestors of their arguments.
+
+        Args:
+            usages (List[Tuple[Any, Any]]): (subject, object) pairs the property is used with,
+                                            object may be None
+            ancestors (Callable[[Any], List[Any]]): ancestors of a usage argument, itself included
+        """
+        self.pairs: Dict[Tuple[Any, Any], int] = dict()
+        self.subjects: Dict[Any, int] = dict()
+        self.objects: Dict[Any, int] = dict()
+        self.subject_ancestors: Dict[Any, int] = dict()
+        self.object_ancestors: Dict[Any, int] = dict()
+        # (ancestor of subject, object) and (subject, ancestor of object)
+        self.subject_ancestor_object: Dict[Tuple[Any, Any], int] = dict()
+        self.subject_object_ancestor: Dict[Tuple[Any, Any], int] = dict()
+
+        # setdefault keeps the position of the first usage having a key
+        for position, (pred_subject, pred_object) in enumerate(usages):
+            self.pairs.setdefault((pred_subject, pred_object), position)
+            self.subjects.setdefault(pred_subject, position)
+            self.objects.setdefault(pred_object, position)
+            for ancestor in ancestors(pred_subject):
+                self.subject_ancestors.setdefault(ancestor, position)
+                self.subject_ancestor_object.setdefault((ancestor, pred_object), position)
+            for ancestor in ancestors(pred_object):
+                self.object_ancestors.setdefault(ancestor, position)
+                self.subject_object_ancestor.setdefault((pred_subject, ancestor), position)
+
+
+class UsageIndex:
+    """ Answer calc_usage_score tiers with a few hash lookups instead of a scan over all usages.
+
+        Within a tier, the usage seen first decides the argswitch, as in a scan in usage order.
+    """
+    def __init__(self, prop_examples: Dict[Any, List[Tuple[Any, Any]]], hierarchy: HierarchyIndex) -> None:
+        """ Index usages of every property.
+
+        Args:
+            prop_examples (Dict[Any, List[Tuple[Any, Any]]]): properties mapped to their usages
+            hierarchy (HierarchyIndex): hierarchy closure of usage arguments
+        """
+        ancestors: Dict[Any, List[Any]] = dict()
+
+        def cached_ancestors(obj: Any) -> List[Any]:
+            if obj not in ancestors:
+                ancestors[obj] = hierarchy.ancestors(obj)
+            return ancestors[obj]
+
+        self.properties: Dict[Any, PropertyUsages] = {
+            prop: PropertyUsages(usages, cached_ancestors) for prop, usages in prop_examples.items()
+        }
+
+    def score(self, predicate: Any, subject: Any, obj: Any = None) -> Tuple[float, Optional[bool]]:
+        """ Score how a property is used with given arguments.
+
+        Args:
+            predicate (Any): predicate to use
+            subject (Any): predicate subject
+            obj (Any): predicate object
+
+        Returns:
+            Tuple[float, Optional[bool]]: usage score, between 0 and 1 and (optional) argswitch
+        """
+        usages = self.properties.get(predicate)
+        if usages is None:
+            return 0.0, None
+
+        # explicit usage
+        swap = self._first([(usages.pairs.get((subject, obj)), False),
+                            (usages.pairs.get((obj, subject)), True)])
+        if swap is not None:
+            return 1.0, swap
+        # one sided exact match and ancestor match
+        swap = self._first([(usages.subject_ancestor_object.get((subject, obj)), False),
+                            (usages.subject_object_ancestor.get((subject, obj)) if obj else None, False),
+                            (usages.objects.get(subject), True)])
+        if swap is not None:
+            return 0.75, swap
+        # single sided explicit match
+        swap = self._first([(usages.subjects.get(subject), False),
+                            (usages.objects.get(obj), False),
+                            (usages.objects.get(subject), True),
+                            (usages.subjects.get(obj), True)])
+        if swap is not None:
+            return 0.5, swap
+        # single sided ancestor match
+        swap = self._first([(usages.subject_ancestors.get(subject), False),
+                            (usages.object_ancestors.get(obj), False),
+                            (usages.object_ancestors.get(subject), True),
+                            (usages.subject_ancestors.get(obj), True)])
+        if swap is not None:
+            return 0.25, swap
+        return 0.0, None
+
+    @staticmethod
+    def _first(matches: List[Match]) -> Optional[bool]:
+        """ Get argswitch of the earliest usage among matching ones.
+
+        Args:
+            matches (List[Match]): first usage positions of each condition of a tier, in precedence order
+
+        Returns:
+            Optional[bool]: argswitch of the earliest usage, the earlier condition wins on the same usage,
+                            None if no usage matches
+        """
+        found = [(position, swap) for position, swap in matches if position is not None]
+        if len(found) == 0:
+            return None
+        return min(found, key=lambda match: match[0])[1]
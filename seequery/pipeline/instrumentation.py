@@ -0,0 +1,179 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+# counters of the pipeline stage running in the current context, None outside of Pipeline.run
+_stage_counters: ContextVar[Optional[Dict[str, int]]] = ContextVar('stage_counters', default=None)
+
+# upper bounds (seconds) of histogram buckets, the last bucket is unbounded
+DEFAULT_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def count(name: str, value: int = 1) -> None:
+    """ Increment a counter of the pipeline stage currently running, does nothing outside of a stage.
+
+    Args:
+        name (str): counter name, e.g. 'bert_forward_passes'
+        value (int): how much to add
+    """
+    counters = _stage_counters.get()
+    if counters is not None:
+        counters[name] = counters.get(name, 0) + value
+
+
+@dataclass
+class StageRecord:
+    '''Class for keeping measurements of a single pipeline stage run over one or more CQs'''
+    stage: str
+    cqs: int = 1
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    counters: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@contextmanager
+def measure_stage(stage: str, cqs: int = 1) -> Iterator[StageRecord]:
+    """ Measure wall time, CPU time and counters of the code run inside.
+
+    Args:
+        stage (str): stage name
+        cqs (int): number of CQs processed together
+
+    Yields:
+        StageRecord: record filled in when the block exits
+    """
+    record = StageRecord(stage=stage, cqs=cqs)
+    token = _stage_counters.set(record.counters)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record.cpu_time = time.process_time() - cpu_start
+        record.wall_time = time.perf_counter() - wall_start
+        _stage_counters.reset(token)
+
+
+class PipelineObserver:
+    """ Receives a record after each pipeline stage, subclasses override on_stage. """
+    def on_stage(self, record: StageRecord) -> None:
+        """ Handle measurements of a stage.
+
+        Args:
+            record (StageRecord): stage measurements
+        """
+        pass
+
+
+class Histogram:
+    """ Cumulative-bucket histogram, as in Prometheus. """
+    def __init__(self, buckets: List[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        """ Get counts of observations not greater than each bucket bound, the last one is the total. """
+        totals = []
+        running = 0
+        for bucket_count in self.counts:
+            running += bucket_count
+            totals.append(running)
+        return totals
+
+    def to_dict(self) -> dict:
+        return {"buckets": self.buckets, "counts": self.counts, "sum": self.sum, "count": self.count}
+
+
+class StageMetrics(PipelineObserver):
+    """ Aggregates stage records of a process: wall and CPU time histograms and counter totals per stage. """
+    def __init__(self, buckets: List[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.wall_time: Dict[str, Histogram] = dict()
+        self.cpu_time: Dict[str, Histogram] = dict()
+        self.cqs: Dict[str, int] = dict()
+        self.counters: Dict[str, Dict[str, int]] = dict()
+        # the HTTP server translates in an executor thread while /metrics is served on the event loop
+        self.lock = threading.Lock()
+
+    def on_stage(self, record: StageRecord) -> None:
+        with self.lock:
+            if record.stage not in self.wall_time:
+                self.wall_time[record.stage] = Histogram(self.buckets)
+                self.cpu_time[record.stage] = Histogram(self.buckets)
+                self.cqs[record.stage] = 0
+                self.counters[record.stage] = dict()
+            self.wall_time[record.stage].observe(record.wall_time)
+            self.cpu_time[record.stage].observe(record.cpu_time)
+            self.cqs[record.stage] += record.cqs
+            stage_counters = self.counters[record.stage]
+            for name, value in record.counters.items():
+                stage_counters[name] = stage_counters.get(name, 0) + value
+
+    def to_json(self) -> dict:
+        """ Get aggregated measurements.
+
+        Returns:
+            dict: stages mapped to their CQ count, time histograms and counter totals
+        """
+        with self.lock:
+            return {stage: {"cqs": self.cqs[stage],
+                            "wall_time": self.wall_time[stage].to_dict(),
+                            "cpu_time": self.cpu_time[stage].to_dict(),
+                            "counters": dict(self.counters[stage])}
+                    for stage in self.wall_time}
+
+    def to_prometheus(self, prefix: str = 'seequery') -> str:
+        """ Get aggregated measurements in the Prometheus text exposition format.
+
+        Args:
+            prefix (str): metric name prefix
+
+        Returns:
+            str: metrics text
+        """
+        lines = []
+        with self.lock:
+            for metric, histograms in [('stage_wall_seconds', self.wall_time),
+                                       ('stage_cpu_seconds', self.cpu_time)]:
+                lines.append(f"# TYPE {prefix}_{metric} histogram")
+                for stage, histogram in histograms.items():
+                    bounds = [str(bound) for bound in histogram.buckets] + ['+Inf']
+                    for bound, total in zip(bounds, histogram.cumulative()):
+                        lines.append(f'{prefix}_{metric}_bucket{{stage="{stage}",le="{bound}"}} {total}')
+                    lines.append(f'{prefix}_{metric}_sum{{stage="{stage}"}} {histogram.sum}')
+                    lines.append(f'{prefix}_{metric}_count{{stage="{stage}"}} {histogram.count}')
+            lines.append(f"# TYPE {prefix}_stage_cqs_total counter")
+            for stage, total in self.cqs.items():
+                lines.append(f'{prefix}_stage_cqs_total{{stage="{stage}"}} {total}')
+            lines.append(f"# TYPE {prefix}_stage_events_total counter")
+            for stage, stage_counters in self.counters.items():
+                for name, total in stage_counters.items():
+                    lines.append(f'{prefix}_stage_events_total{{stage="{stage}",counter="{name}"}} {total}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """ Write aggregated measurements to a file, Prometheus text for .prom files, JSON otherwise.
+
+        Args:
+            path (str): output path
+        """
+        with open(path, 'w') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), f, indent=2)
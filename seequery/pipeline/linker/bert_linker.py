@@ -1,7 +1,13 @@
+from seequery.embeddings.bert_backend import BertBackend
+from seequery.embeddings.vector_cache import VectorCache
+from seequery.pipeline import instrumentation
 from seequery.pipeline.pipeline_component import PipelineComponent
 
-from transformers import BertTokenizer, BertModel
-from typing import List, Optional, Tuple
+from seequery.utils.lru_cache import LRUCache
+
+from transformers import BertTokenizerFast
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 import torch
 
 
@@ -11,13 +17,29 @@ class BertVectorizer(PipelineComponent):
         the most similar phrases among ontology vocabulary.
     '''
 
-    def __init__(self, model='bert-base-uncased', print_debug_info=False, ontology_mngr=None):
-        self.tokenizer = BertTokenizer.from_pretrained(model)
+    # tokenized texts kept, contexts and labels come back across templates and CQs
+    TOKENIZATION_CACHE_SIZE = 50000
+
+    def __init__(self, model='bert-base-uncased', print_debug_info=False, ontology_mngr=None,
+                 cache_config=None, backend=None, num_layers=0):
+        self.model_name = model
+        self.backend = backend or BertBackend()
+        # encoder layers run, 0 for all of them
+        self.num_layers = BertBackend.truncated_depth(model, num_layers)
+        # identifies vectors this vectorizer produces, in caches and stored label indexes
+        self.model_id = model + (f':{self.backend.name}' if self.backend.name != 'fp32' else '') \
+            + (f':L{self.num_layers}' if self.num_layers > 0 else '') \
+            + (':jit' if self.backend.torchscript else '')
+        # Rust backed tokenizer, maps tokens back to character offsets
+        self.tokenizer = BertTokenizerFast.from_pretrained(model)
+        # text -> (token ids, offsets), specials added
+        self.encodings = LRUCache(self.TOKENIZATION_CACHE_SIZE)
         self.print_debug_info = print_debug_info
-        self.model = BertModel.from_pretrained(model, return_dict=True)
-        self.model.eval()
+        self.model = self.backend.load(model, self.num_layers)
         self.cos = torch.nn.CosineSimilarity()
         self.ontology_mngr = ontology_mngr
+        # vectors of (focus, context) pairs already seen, see the embeddings.vector_cache config section
+        self.vector_cache = VectorCache.from_config(self.model_id, cache_config)
 
     def process(self, data: dict) -> dict:
         cq = data['cq']
@@ -40,58 +62,127 @@ class BertVectorizer(PipelineComponent):
 
     def vectorize(self, focus: str, context: str = ""):
         ''' Create an embedding of focus (a phrase being a part of a broader context) being aware of the context it was used into. '''
-        alignment = self.find_alignment(context,
-                                        focus)  # check where the focus (phrase) is located inside of the context
-        tokens = torch.tensor([self.tokenize(context)])  # transform context into a tensor of token ids
-        segments = torch.tensor([[1] * len(tokens[0])])  # mark whole context as a single sentence (required by BERT)
-
-        with torch.no_grad():
-            outputs = self.model(tokens, segments)  # run BERT
-            batch = outputs['last_hidden_state'][0]  # extract first batch
-            phrase_vectors = batch[alignment[0]:alignment[1]]  # extract embeddings related to focus (phrase)
-            return torch.mean(phrase_vectors, dim=0, keepdims=True)  # apply mean pooling of embeddings from a phrase
+        return self.vectorize_batch([focus], [context])
+
+    def vectorize_batch(self, focuses: List[str], contexts: Optional[List[str]] = None,
+                        batch_size: int = 32, use_cache: bool = True,
+                        spans: Optional[List[Tuple[int, int]]] = None) -> torch.Tensor:
+        ''' Embed many (focus, context) pairs at once. Contexts are padded to the longest one in a batch
+            and each focus is mean pooled over its span. Returns a (len(focuses), hidden) tensor.
+            Spans are character offsets of each focus in its context; without them a focus is its
+            first occurrence in the context, in any letter case (see `ask_about` for contexts whose
+            span is known). Pairs found in the vector cache are not encoded again, others are stored
+            in it. '''
+        if contexts is None:
+            contexts = focuses
+        pairs = [(focus, context if len(context) > 0 else focus) for focus, context in zip(focuses, contexts)]
+        if spans is None:
+            spans = [self._find_span(context, focus) for focus, context in pairs]
+        if self.vector_cache is None or not use_cache:
+            return self._encode(pairs, spans, batch_size)
+
+        cached = self.vector_cache.get_many(pairs)
+        missing = dict((pair, span) for pair, span in zip(pairs, spans) if pair not in cached)
+        computed: Dict[Tuple[str, str], np.ndarray] = dict()
+        if len(missing) > 0:
+            vectors = self._encode(list(missing), list(missing.values()), batch_size)
+            computed = dict(zip(missing, vectors.numpy()))
+            self.vector_cache.put_many(computed)
+
+        if len(pairs) == 0:
+            return torch.zeros((0, self.model.config.hidden_size))
+        rows = [computed[pair] if pair in computed else cached[pair] for pair in pairs]
+        return torch.from_numpy(np.stack(rows).astype(np.float32))
+
+    def _encode(self, pairs: List[Tuple[str, str]], spans: List[Tuple[int, int]],
+                batch_size: int) -> torch.Tensor:
+        ''' Run BERT over (focus, context) pairs, contexts of similar length batched together. '''
+        # token ids and the token span of each focus
+        encoded = [self._locate(context, span) for (_, context), span in zip(pairs, spans)]
+
+        # group contexts of similar length together to limit padding
+        order = sorted(range(len(encoded)), key=lambda i: len(encoded[i][0]))
+        vectors = torch.zeros((len(encoded), self.model.config.hidden_size))
+
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            max_len = max(len(encoded[i][0]) for i in rows)
+            input_ids = torch.full((len(rows), max_len), self.tokenizer.pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(rows), max_len), dtype=torch.long)
+            focus_mask = torch.zeros((len(rows), max_len))
+
+            for row, i in enumerate(rows):
+                tokens, (begin, end) = encoded[i]
+                input_ids[row, :len(tokens)] = torch.tensor(tokens)
+                attention_mask[row, :len(tokens)] = 1
+                focus_mask[row, begin:end] = 1.0
+
+            with torch.no_grad():
+                with self.backend.autocast():
+                    outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)  # run BERT
+                instrumentation.count('bert_forward_passes')
+                instrumentation.count('bert_sequences', len(rows))
+                hidden = outputs['last_hidden_state'].float()
+                # mean pooling of embeddings from each focus span
+                pooled = torch.bmm(focus_mask.unsqueeze(1), hidden).squeeze(1) \
+                    / focus_mask.sum(dim=1, keepdim=True)
+            vectors[rows] = pooled
+        return vectors
 
     def find_alignment(self, context: str, phrase: str) -> Optional[Tuple[int, int]]:
         ''' Check at what offsets a given phrase begins and ends inside of a context. '''
-        tokenized_context = self.tokenize(context)
-        tokenized_phrase = self.tokenize(phrase, add_specials=False)
-        start = self._find_align_start(tokenized_context, tokenized_phrase)
-        if start == -1:
+        try:
+            return self._locate(context, self._find_span(context, phrase))[1]
+        except ValueError:
             return None
-        end = start + len(tokenized_phrase)
-        return (start, end)
+
+    @staticmethod
+    def ask_about(context: str, phrase: str) -> Tuple[str, Tuple[int, int]]:
+        ''' Context asking about a phrase after another context, with the character span of the phrase. '''
+        prefix = context + ", how about "
+        return prefix + phrase + "?", (len(prefix), len(prefix) + len(phrase))
+
+    @staticmethod
+    def _find_span(context: str, phrase: str) -> Tuple[int, int]:
+        ''' Character span of the first occurrence of a phrase in a context, in any letter case. '''
+        begin = 0 if phrase == context else context.lower().find(phrase.lower())
+        if begin == -1:
+            raise ValueError(f"Phrase '{phrase}' not found in context '{context}'")
+        return (begin, begin + len(phrase))
+
+    def _locate(self, context: str, span: Tuple[int, int]) -> Tuple[List[int], Tuple[int, int]]:
+        ''' Tokenize a context and turn the character span of a phrase in it into a token span
+            with the offset mapping. '''
+        tokens, offsets = self._encode_text(context)
+        begin, end = span
+        starts: Dict[int, int] = dict()
+        ends: Dict[int, int] = dict()
+        for idx, (token_begin, token_end) in enumerate(offsets):
+            if token_begin == token_end:
+                continue  # special tokens
+            starts.setdefault(token_begin, idx)
+            ends[token_end] = idx
+        if begin >= end or begin not in starts or end not in ends:
+            raise ValueError(f"Phrase '{context[begin:end]}' of context '{context}' does not start "
+                             f"and end at token boundaries")
+        return tokens, (starts[begin], ends[end] + 1)
+
+    def _encode_text(self, text: str) -> Tuple[List[int], List[Tuple[int, int]]]:
+        ''' Token ids with [CLS] and [SEP] and character offsets of each token, cached. '''
+        encoded = self.encodings.get(text)
+        if encoded is None:
+            encoding = self.tokenizer(text, return_offsets_mapping=True)
+            encoded = (encoding['input_ids'], encoding['offset_mapping'])
+            self.encodings.put(text, encoded)
+        return encoded
 
     def tokenize(self, text, add_specials=True) -> List[int]:
         ''' Convert text into a sequence of token ids '''
         if add_specials:
-            text = "[CLS] " + text + " [SEP]"
-
-        tokens = self.tokenizer.tokenize(text)
+            return list(self._encode_text(text)[0])
+        tokens = self.tokenizer(text, add_special_tokens=False)['input_ids']
         self.log(f"Tokenized text: {tokens}")
-        return self.tokenizer.convert_tokens_to_ids(tokens)
-
-    def _find_align_start(self, haystack, needle):
-        """Return the index at which the sequence needle appears in the
-        sequence haystack, or -1 if it is not found, using the Boyer-
-        Moore-Horspool algorithm. The elements of needle and haystack must
-        be hashable.
-
-        >>> find([1, 1, 2], [1, 2])
-        1
-
-        """
-        h = len(haystack)
-        n = len(needle)
-        skip = {needle[i]: n - i - 1 for i in range(n - 1)}
-        i = n - 1
-        while i < h:
-            for j in range(n):
-                if haystack[i - j] != needle[-j - 1]:
-                    i += skip.get(haystack[i], n)
-                    break
-            else:
-                return i - n + 1
-        return -1
+        return tokens
 
     def similarity(self, focus1: str, focus2: str, context1: str = "", context2: str = ""):
         ''' Calculate cosine similarity between two phrases (focus1 and focus2).
@@ -99,34 +190,39 @@ class BertVectorizer(PipelineComponent):
             create more meaningful embeddings.'''
         if len(context1) == 0:
             context1 = focus1
-        if len(context2) == 0:
-            context2 = context1 + ", how about " + focus2 + "?"
-
         v1 = self.vectorize(focus1, context1)
-        v2 = self.vectorize(focus2, context2)
+        if len(context2) == 0:
+            context2, span2 = self.ask_about(context1, focus2)
+            v2 = self.vectorize_batch([focus2], [context2], spans=[span2])
+        else:
+            v2 = self.vectorize(focus2, context2)
         return self.cos(v1, v2)
 
     def most_similar(self, focus: str, context: str, possibilities: List[str]):
         ''' Find the most similar phrase to focus considering all possibilities '''
-        v1 = self.vectorize(focus, context)
         max_similarity = 0.0
         top_elem = None
+        if len(possibilities) == 0:
+            return (top_elem, max_similarity)
 
-        for possibility in possibilities:
-            v = self.vectorize(possibility, context + ', how about ' + possibility + "?")
-            similarity = self.cos(v1, v)[0]
-            if similarity > max_similarity:
-                max_similarity = similarity
-                top_elem = possibility
+        similarities = self._contextual_similarities(focus, context, possibilities)
+        best = int(torch.argmax(similarities))
+        if similarities[best] > max_similarity:
+            max_similarity = float(similarities[best])
+            top_elem = possibilities[best]
 
         return (top_elem, max_similarity)
 
     def rank_similarities(self, focus: str, context: str, possibilities: List[str], threshold=0.5):
-        v1 = self.vectorize(focus, context)
-        similarities = []
+        if len(possibilities) == 0:
+            return []
+        similarities = self._contextual_similarities(focus, context, possibilities)
+        return sorted(zip(possibilities, similarities), key=lambda x: x[1], reverse=True)
 
-        for possibility in possibilities:
-            v = self.vectorize(possibility, context + ', how about ' + possibility + "?")
-            similarity = self.cos(v1, v)[0]
-            similarities.append((possibility, similarity))
-        return sorted(similarities, key=lambda x: x[1], reverse=True)
+    def _contextual_similarities(self, focus: str, context: str, possibilities: List[str]) -> torch.Tensor:
+        ''' Similarities between focus and each possibility, the latter asked about in the focus context. '''
+        v1 = self.vectorize(focus, context)
+        asked = [self.ask_about(context, possibility) for possibility in possibilities]
+        vectors = self.vectorize_batch(possibilities, [context for context, _ in asked],
+                                       spans=[span for _, span in asked])
+        return self.cos(v1, vectors)
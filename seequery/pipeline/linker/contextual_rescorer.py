@@ -1,10 +1,10 @@
-import itertools
 from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 
 from seequery.embeddings.embeddings_manager import EmbeddingsManager
 from seequery.ontology.ontology_manager import OntologyManager
+from seequery.pipeline import instrumentation
 from seequery.pipeline.match_item import MatchItem
 from seequery.pipeline.pipeline_component import PipelineComponent
 from seequery.pipeline.scored_translation import ScoredTranslation
@@ -13,6 +13,9 @@ from seequery.utils.meta_template import MetaTemplateChunks
 
 class ContextualRescorer(PipelineComponent):
     """ Having possible translation, score them according to their coexistence. """
+    # usage scores are between 0 and 1
+    MAX_USAGE_SCORE = 1.0
+
     def __init__(self, ontology_manager: OntologyManager, embeddings_mngr: EmbeddingsManager) -> None:
         self.ontology_mngr = ontology_manager
         self.embeddings_mngr = embeddings_mngr
@@ -59,6 +62,11 @@ class ContextualRescorer(PipelineComponent):
     def get_best_combination(self, meta_enriched_vocab: dict) -> Tuple[dict, Optional[bool]]:
         """ Get best combination.
 
+            Combinations are visited in the order of itertools.product over property, lhs and rhs
+            candidates. A branch is pruned when even the best remaining translation scores with
+            the highest usage score could not beat the best combination found so far,
+            so the result is the same as of an exhaustive search.
+
             Args:
                 meta_entriched_vocab (dict): extracted phrases and template metadata
 
@@ -72,41 +80,41 @@ class ContextualRescorer(PipelineComponent):
         best_score = 0.0
         best_arg_swap = None
 
-        for relation, lhs, rhs in self._construct_all_possible_connections(meta_enriched_vocab):
-            # verify domain range restrictions
-            relation_obj, relation_st = relation
-            lhs_obj, lhs_st = lhs
-            rhs_obj, rhs_st = rhs
-
-            restriction_score, restriction_arg_swap = \
-                self.ontology_mngr.calc_restriction_score(relation_obj, lhs_obj, rhs_obj)
-            if restriction_score < 1.0:  # these candidates cannot be used together, skip
-                continue
-
-            scores = [relation_st.score, lhs_st.score]
-            if rhs_st:
-                scores.append(rhs_st.score)
-
-            avg_translation_score = np.mean(scores)
-
-            usage_score, usage_arg_swap = self.ontology_mngr.calc_usage_score(
-                relation_obj, lhs_obj, rhs_obj)
-
-            if restriction_arg_swap:
-                arg_swap = restriction_arg_swap
-            elif usage_arg_swap:
-                arg_swap = usage_arg_swap
-            else:
-                arg_swap = False
-
-            combined_score = 0.6 * avg_translation_score + 0.4 * usage_score
-
-            if combined_score > best_score:
-                best_score = combined_score
-                best_arg_swap = arg_swap
-                best_property = relation
-                best_lhs = lhs
-                best_rhs = rhs
+        property_translations, lhs_translations, rhs_translations = \
+            self._construct_all_possible_connections(meta_enriched_vocab)
+        if len(lhs_translations) == 0 or len(rhs_translations) == 0:
+            property_translations = []  # no combination exists
+        property_bounds = self._suffix_max(property_translations)
+        lhs_bounds = self._suffix_max(lhs_translations)
+        # an absent second argument is a single (None, None) candidate without a score
+        rhs_bounds: List[Optional[float]] = [None] * len(rhs_translations)
+        if len(rhs_translations) > 0 and rhs_translations[0][1] is not None:
+            rhs_bounds = list(self._suffix_max(rhs_translations))
+        evaluated = 0
+
+        for i, relation in enumerate(property_translations):
+            if self._upper_bound(property_bounds[i], lhs_bounds[0], rhs_bounds[0]) <= best_score:
+                break
+            for j, lhs in enumerate(lhs_translations):
+                if self._upper_bound(relation[1].score, lhs_bounds[j], rhs_bounds[0]) <= best_score:
+                    break
+                for k, rhs in enumerate(rhs_translations):
+                    if self._upper_bound(relation[1].score, lhs[1].score, rhs_bounds[k]) <= best_score:
+                        break
+
+                    scored_combination = self._score_combination(relation, lhs, rhs)
+                    evaluated += 1
+                    if scored_combination is None:  # these candidates cannot be used together, skip
+                        continue
+                    combined_score, arg_swap = scored_combination
+
+                    if combined_score > best_score:
+                        best_score = combined_score
+                        best_arg_swap = arg_swap
+                        best_property = relation
+                        best_lhs = lhs
+                        best_rhs = rhs
+        instrumentation.count('combinations_evaluated', evaluated)
 
         result = {}
         if best_property:
@@ -119,14 +127,92 @@ class ContextualRescorer(PipelineComponent):
             result["best_rhs"] = {"obj": None, "scored_translation": None}
         return result, best_arg_swap
 
-    def _construct_all_possible_connections(self, meta_enriched_vocab: dict) -> Any:
-        """ Construct all possible property and arguments translations.
+    def _score_combination(self, relation: Tuple[Any, ScoredTranslation], lhs: Tuple[Any, ScoredTranslation],
+                           rhs: Tuple[Any, Optional[ScoredTranslation]]) -> Optional[Tuple[float, bool]]:
+        """ Score a property used with given arguments.
+
+            Args:
+                relation (Tuple[Any, ScoredTranslation]): property candidate
+                lhs (Tuple[Any, ScoredTranslation]): first argument candidate
+                rhs (Tuple[Any, Optional[ScoredTranslation]]): second argument candidate,
+                                                               (None, None) if absent
+
+            Returns:
+                Optional[Tuple[float, bool]]: combined score with argswitch info,
+                                              None if domain/range restrictions are not met
+        """
+        # verify domain range restrictions
+        relation_obj, relation_st = relation
+        lhs_obj, lhs_st = lhs
+        rhs_obj, rhs_st = rhs
+
+        restriction_score, restriction_arg_swap = \
+            self.ontology_mngr.calc_restriction_score(relation_obj, lhs_obj, rhs_obj)
+        if restriction_score < 1.0:
+            return None
+
+        scores = [relation_st.score, lhs_st.score]
+        if rhs_st:
+            scores.append(rhs_st.score)
+
+        avg_translation_score = np.mean(scores)
+
+        usage_score, usage_arg_swap = self.ontology_mngr.calc_usage_score(
+            relation_obj, lhs_obj, rhs_obj)
+
+        if restriction_arg_swap:
+            arg_swap = restriction_arg_swap
+        elif usage_arg_swap:
+            arg_swap = usage_arg_swap
+        else:
+            arg_swap = False
+
+        return float(0.6 * avg_translation_score + 0.4 * usage_score), arg_swap
+
+    def _upper_bound(self, relation_score: float, lhs_score: float, rhs_score: Optional[float]) -> float:
+        """ Get the highest combined score possible for given translation scores.
+
+            Rounding is monotone, so the bound computed the same way as the combined score
+            is never lower than it.
+
+            Args:
+                relation_score (float): property translation score or its upper bound
+                lhs_score (float): first argument translation score or its upper bound
+                rhs_score (Optional[float]): second argument translation score or its upper bound,
+                                             None if absent
+
+            Returns:
+                float: upper bound of the combined score
+        """
+        scores = [relation_score, lhs_score]
+        if rhs_score is not None:
+            scores.append(rhs_score)
+        return float(0.6 * np.mean(scores) + 0.4 * self.MAX_USAGE_SCORE)
+
+    def _suffix_max(self, translations: List[Tuple[Any, ScoredTranslation]]) -> List[float]:
+        """ For each position, get the best translation score at or after it.
+
+            Args:
+                translations (List[Tuple[Any, ScoredTranslation]]): candidates in search order
+
+            Returns:
+                List[float]: suffix maxima
+        """
+        suffix_max = [st.score for _, st in translations]
+        for i in range(len(suffix_max) - 2, -1, -1):
+            suffix_max[i] = max(suffix_max[i], suffix_max[i + 1])
+        return suffix_max
+
+    def _construct_all_possible_connections(self, meta_enriched_vocab: dict
+                                            ) -> Tuple[List[Any], List[Any], List[Any]]:
+        """ Collect all possible property and arguments translations.
 
             Args:
                 meta_entriched_vocab (dict): extracted phrases and template metadata
 
             Returns:
-                Any: An iterator over possible combinations
+                Tuple[List[Any], List[Any], List[Any]]: property, lhs and rhs candidates
+                                                        whose product gives all combinations
         """
         meta = meta_enriched_vocab['meta']
         vocab = meta_enriched_vocab['vocab']
@@ -137,7 +223,7 @@ class ContextualRescorer(PipelineComponent):
         lhs_translations = self._collect_ontology_objects(vocab, lhs_idx)
         rhs_translations = self._collect_ontology_objects(vocab, rhs_idx) if rhs_idx else [(None, None)]
 
-        return itertools.product(property_translations, lhs_translations, rhs_translations)
+        return property_translations, lhs_translations, rhs_translations
 
     def _get_required_idxs(self, meta: MetaTemplateChunks) -> Tuple[str, str, Optional[str]]:
         """ Get idxes for further processing.
@@ -1,7 +1,12 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
 
 from seequery.embeddings.embeddings_manager import EmbeddingsManager
+from seequery.embeddings.label_index import LabelEmbeddingIndex
 from seequery.ontology.ontology_manager import OntologyManager
+from seequery.pipeline.linker.bert_linker import BertVectorizer
 from seequery.pipeline.linker.contextual_rescorer import ContextualRescorer
 from seequery.pipeline.match_item import MatchItem
 from seequery.pipeline.pipeline_component import PipelineComponent
@@ -9,19 +14,23 @@ from seequery.pipeline.scored_translation import ScoredTranslation
 from seequery.utils.helpers import Helpers
 from seequery.utils.linking_category import LinkingCategory
 from seequery.utils.meta_template import MetaTemplateChunks
-import re
+from seequery.utils.spacy_processor import SpacyProcessor
 
 
 class EntityLinker(PipelineComponent):
     """ Linking phrases from a CQ to ontology vocabulary. """
-    def __init__(self, ontology_mngr: OntologyManager, embeddings_mngr: EmbeddingsManager, spacy_nlp,
-                 config: dict) -> None:
+    def __init__(self, ontology_mngr: OntologyManager, embeddings_mngr: EmbeddingsManager,
+                 spacy_nlp: SpacyProcessor, config: dict) -> None:
         self.ontology_mngr = ontology_mngr
         self.embeddings_mngr = embeddings_mngr
         self.config = config
         self.spacy_nlp = spacy_nlp
+        self.lexicon = ontology_mngr.lexicon or ontology_mngr.build_lexicon(spacy_nlp)
         self.contextual_rescorer = ContextualRescorer(self.ontology_mngr, self.embeddings_mngr)
-        self.labels_to_normalized, self.normalized_to_labels = self._normalize_labels()
+        self.label_index = LabelEmbeddingIndex.load_or_build(
+            self.ontology_mngr, self.embeddings_mngr,
+            config.get('label_index_dir', 'resources/embeddings/label_index'),
+            config.get('ann'))
 
     def process(self, data: dict) -> dict:
         """ A method processing given data with current pipeline step.
@@ -32,111 +41,194 @@ class EntityLinker(PipelineComponent):
             Returns:
                 dict: a dict holding object state enriched with current pipeline results
         """
+        return self.process_many([data])[0]
 
-        if 'status' in data and data['status']['type'] == 'ERROR':
-            return data
-
-        errors = []
+    def process_many(self, batch: List[dict]) -> List[dict]:
+        """ Link items of many CQs, sharing lemmatization and BERT forward passes between them.
 
-        for meta_enriched_vocab in data['vocab_for_templates']:
-            meta = meta_enriched_vocab['meta']
-            limit_entities = self.config['best_mappings'] if len(meta.relations) > 0 else 1
-
-            if meta_enriched_vocab['success']:
-                vectorized_labels = self._vectorize_labels(data['cq'])
-                for chunk_idx, match_item in meta_enriched_vocab['vocab'].items():
-                    if not match_item.is_explicit_match:
-                        category = self._get_category(chunk_idx, meta)
-                        match_item.scored_candidates = self.link_item_translations(
-                            match_item, category, limit_entities, data['cq'], vectorized_labels)
-                        if len(match_item.scored_candidates) == 0:
-                            errors.append(match_item.normalized_text)
+            Args:
+                batch (List[dict]): dicts holding states of objects
 
-        if len(errors) > 0:
-            data['status'] = {"type": "ERROR", "message": f"No translations for {', '.join(list(set(errors)))}"}
-        else:
-            data = self.contextual_rescorer.process(data)
-        return data
+            Returns:
+                List[dict]: dicts holding object states enriched with current pipeline results, in input order
+        """
+        active = [data for data in batch if not ('status' in data and data['status']['type'] == 'ERROR')]
+
+        # (state the item comes from, item, category, limit)
+        requests: List[Tuple[dict, MatchItem, LinkingCategory, int]] = []
+        for data in active:
+            for meta_enriched_vocab in data['vocab_for_templates']:
+                meta = meta_enriched_vocab['meta']
+                limit_entities = self.config['best_mappings'] if len(meta.relations) > 0 else 1
+
+                if meta_enriched_vocab['success']:
+                    for chunk_idx, match_item in meta_enriched_vocab['vocab'].items():
+                        if not match_item.is_explicit_match:
+                            category = self._get_category(chunk_idx, meta)
+                            requests.append((data, match_item, category, limit_entities))
+
+        translations = self.link_many([(match_item, category, limit, data['cq'])
+                                       for data, match_item, category, limit in requests])
+
+        errors: Dict[int, List[str]] = {id(data): [] for data in active}
+        for (data, match_item, _, _), scored_candidates in zip(requests, translations):
+            match_item.scored_candidates = scored_candidates
+            if len(match_item.scored_candidates) == 0:
+                errors[id(data)].append(match_item.normalized_text)
+
+        for data in active:
+            if len(errors[id(data)]) > 0:
+                data['status'] = {"type": "ERROR",
+                                  "message": f"No translations for {', '.join(list(set(errors[id(data)])))}"}
+            else:
+                self.contextual_rescorer.process(data)
+        return batch
 
     def link_item_translations(self, item: MatchItem, category: LinkingCategory,
-                               limit: int, cq: str, vectorized_labels) -> List[ScoredTranslation]:
+                               limit: int, cq: str) -> List[ScoredTranslation]:
         """ Attach possible translations above threshold and sort them in descending order.
 
             Args:
                 item (MatchItem): item to assign translations
                 category (LinkingCategory): category of current item
                 limit (int): how many top tranlations to preserve
+                cq (str): CQ the item comes from
 
             Returns:
                 List[ScoredTranslation]: a list of translations proposed
         """
-        translations: List[ScoredTranslation] = []
+        return self.link_many([(item, category, limit, cq)])[0]
+
+    def link_many(self, requests: List[Tuple[MatchItem, LinkingCategory, int, str]]
+                  ) -> List[List[ScoredTranslation]]:
+        """ Attach possible translations to many items, encoding all of them in shared forward passes.
 
-        match_lemma = " ".join([t.lemma_ for t in self.spacy_nlp(item.normalized_text.lower())])
+            Args:
+                requests (List[Tuple[MatchItem, LinkingCategory, int, str]]): items to assign translations,
+                    with their category, how many top translations to preserve and the CQ they come from
 
-        for label in vectorized_labels[category]:
-            normalized_label = self.labels_to_normalized[category][label]
-            label_lemma = " ".join([t.lemma_ for t in self.spacy_nlp(normalized_label.lower())])
-            if item.normalized_text.lower() == normalized_label.lower() or label_lemma == match_lemma or Helpers.strip_s(item.normalized_text.lower()) == Helpers.strip_s(normalized_label.lower()):
-                return [ScoredTranslation(score=1.0, onto_label=label, category=category)]
+            Returns:
+                List[List[ScoredTranslation]]: translations proposed for each item, in descending order
+        """
+        results: List[List[ScoredTranslation]] = [[] for _ in requests]
+        texts = list(dict.fromkeys(item.normalized_text.lower() for item, _, _, _ in requests))
+        lemmas = dict(zip(texts, self.spacy_nlp.lemmatize_many(texts)))
+
+        # exact, lemma and plural equality are dictionary lookups in the precomputed lexicon
+        pending = []
+        for idx, (item, category, _, _) in enumerate(requests):
+            if len(self.label_index.labels(category)) == 0:
+                continue
+            match_text = item.normalized_text.lower()
+            equivalent = self.lexicon.find_equivalent(category, match_text, lemmas[match_text])
+            if equivalent is not None:
+                results[idx] = [ScoredTranslation(score=1.0, onto_label=equivalent.label, category=category)]
             else:
-                if re.search(f"\b{item.normalized_text.lower()}\b", f"\b{normalized_label.lower()}\b") or re.search(f"\b{match_lemma}\b", f"\b{label_lemma}\b"):
-                    score = 1.0
-                else:
-                    context = cq.lower() + ", how about " + item.normalized_text + "?"
-                    v = self.embeddings_mngr.vectorize(item.normalized_text, context)
-                    score = self.embeddings_mngr.cos(v, vectorized_labels[category][label])
-
-                    # score = self.embeddings_mngr.similarity(item.normalized_text, normalized_label, cq)
-
-            if self._similarity_over_threshold(category, score):
-                translations.append(ScoredTranslation(score=score, onto_label=label, category=category))
-        translations = sorted(translations, key=lambda x: x.score, reverse=True)[:limit]
-        return translations
-
-    def _vectorize_labels(self, context):
-        context = context.lower()
-        vectorized_labels = dict()
-        for category in self.ontology_mngr.onto_map:
-            vectorized_labels[category] = dict()
-            for label in self.ontology_mngr.onto_map[category]:
-                normalized_label = Helpers.normalize_label(label)
-                extended_context = context + ", how about " + normalized_label + "?"
-                vectorized_labels[category][label] = self.embeddings_mngr.vectorize(normalized_label, extended_context)
-        return vectorized_labels
-
-    def _normalize_labels(self):
-        labels_to_normalized = dict()
-        normalized_to_label = dict()
-        for category in self.ontology_mngr.onto_map:
-            labels_to_normalized[category] = dict()
-            normalized_to_label[category] = dict()
-            for label in self.ontology_mngr.onto_map[category]:
-                labels_to_normalized[category][label] = Helpers.normalize_label(label)
-                normalized_to_label[category][Helpers.normalize_label(label)] = label
-        return labels_to_normalized, normalized_to_label
-
-    def _similarity_over_threshold(self, category: LinkingCategory, score: float) -> bool:
-        """ Check if calculated similarity falls above the expected threshold.
+                pending.append(idx)
+        if len(pending) == 0:
+            return results
+
+        # search label vectors precomputed out of CQ context, each item text is vectorized once
+        item_vectors, rows = self._vectorize_pairs([(requests[idx][0].normalized_text,
+                                                     requests[idx][0].normalized_text) for idx in pending])
+        rerank_top_k = self.config.get('contextual_rerank_top_k', 0)
+        searched = dict()
+        for idx in pending:
+            item, category, limit, _ = requests[idx]
+            row = rows[(item.normalized_text, item.normalized_text)]
+            searched[idx] = self.label_index.search(category, item_vectors[row].numpy(),
+                                                    max(limit, rerank_top_k))
+        if rerank_top_k > 0:
+            # only the best labels are rescored in context, the others keep their index similarity
+            heads = {idx: (label_ids[:rerank_top_k], scores[:rerank_top_k])
+                     for idx, (label_ids, scores) in searched.items()}
+            reranked = self._rerank_contextually(requests, heads)
+            searched = {idx: (label_ids, np.concatenate([reranked[idx][1], scores[rerank_top_k:]]))
+                        for idx, (label_ids, scores) in searched.items()}
+
+        for idx, (label_ids, scores) in searched.items():
+            item, category, limit, _ = requests[idx]
+            labels = self.label_index.labels(category)
+            over_threshold = scores >= self._get_threshold(category)
+            label_ids, scores = label_ids[over_threshold], scores[over_threshold]
+
+            # only the survivors become translations
+            results[idx] = [ScoredTranslation(score=float(scores[i]), onto_label=labels[label_ids[i]],
+                                              category=category)
+                            for i in Helpers.top_k_indices(scores, limit)]
+        return results
+
+    def _vectorize_pairs(self, pairs: List[Tuple[str, str]], spans: Optional[List[Tuple[int, int]]] = None
+                         ) -> Tuple[torch.Tensor, Dict[Tuple[str, str], int]]:
+        """ Vectorize distinct (focus, context) pairs in a single batch.
+
+            Args:
+                pairs (List[Tuple[str, str]]): phrases with the context they are vectorized in
+                spans (Optional[List[Tuple[int, int]]]): character span of each phrase in its context,
+                                                         None if each phrase is its whole context
+
+            Returns:
+                Tuple[torch.Tensor, Dict[Tuple[str, str], int]]: vectors and rows of each pair
+        """
+        unique = dict(zip(pairs, spans if spans is not None else [(0, len(context)) for _, context in pairs]))
+        vectors = self.embeddings_mngr.vectorize_batch([focus for focus, _ in unique],
+                                                       [context for _, context in unique],
+                                                       spans=list(unique.values()))
+        return vectors, {pair: row for row, pair in enumerate(unique)}
+
+    def _rerank_contextually(self, requests: List[Tuple[MatchItem, LinkingCategory, int, str]],
+                             searched: Dict[int, Tuple[np.ndarray, np.ndarray]]
+                             ) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """ Rescore selected labels with vectors built in the context of CQs.
+
+            Args:
+                requests (List[Tuple[MatchItem, LinkingCategory, int, str]]): items with category,
+                                                                              limit and CQ
+                searched (Dict[int, Tuple[np.ndarray, np.ndarray]]): request positions mapped to
+                                                                     positions and scores of labels
+                                                                     found in the label index
+
+            Returns:
+                Dict[int, Tuple[np.ndarray, np.ndarray]]: request positions mapped to the same label positions
+                                                          and their contextual similarities
+        """
+        def in_context(cq: str, phrase: str) -> Tuple[Tuple[str, str], Tuple[int, int]]:
+            context, span = BertVectorizer.ask_about(cq.lower(), phrase)
+            return (phrase, context), span
+
+        focus_pairs = dict()
+        for idx, (label_ids, _) in searched.items():
+            item, category, _, cq = requests[idx]
+            labels = self.label_index.labels(category)
+            focus_pairs[idx] = [in_context(cq, item.normalized_text)] + [
+                in_context(cq, self.lexicon.entry(category, labels[label_id]).normalized_text)
+                for label_id in label_ids]
+        in_contexts = [pair_span for pairs in focus_pairs.values() for pair_span in pairs]
+        vectors, rows = self._vectorize_pairs([pair for pair, _ in in_contexts],
+                                              [span for _, span in in_contexts])
+
+        reranked = dict()
+        for idx, (label_ids, _) in searched.items():
+            pair_rows = [rows[pair] for pair, _ in focus_pairs[idx]]
+            item_vector = vectors[pair_rows[0]:pair_rows[0] + 1]
+            label_vectors = vectors[pair_rows[1:]]
+            reranked[idx] = (label_ids, self.embeddings_mngr.cos(item_vector, label_vectors).numpy())
+        return reranked
+
+    def _get_threshold(self, category: LinkingCategory) -> float:
+        """ Get the minimal similarity a translation of a given category has to score.
 
             Args:
                 category (LinkingCategory): category of current item
-                score (float): translation similarity score
 
             Returns:
-                bool: True if a translation scores over the threshold
+                float: similarity threshold
         """
         if category in [LinkingCategory.INDIVIDUAL, LinkingCategory.CLASS]:
-            if score >= self.config['min_entity_similarity']:
-                return True
-            else:
-                return False
+            return self.config['min_entity_similarity']
         elif category in [LinkingCategory.DATA_PROPERTY, LinkingCategory.OBJECT_PROPERTY]:
-            if score >= self.config['min_relation_similarity']:
-                return True
-            else:
-                return False
-        return True
+            return self.config['min_relation_similarity']
+        return -np.inf
 
     def _get_category(self, chunk_idx: str, meta_template: MetaTemplateChunks) -> LinkingCategory:
         """ Check category of a given chunk_idx.
@@ -1,7 +1,9 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from nltk.tokenize import word_tokenize
 from nltk.util import everygrams
+from scipy import sparse
 
 
 class EverygramSimilarityScorer():
@@ -21,7 +23,7 @@ class EverygramSimilarityScorer():
         set2 = set(self.get_everygrams(text2))
         return 1.0 * len(set1 & set2) / len(set1 | set2)
 
-    def get_everygrams(self, text: str) -> List[List[str]]:
+    def get_everygrams(self, text: str) -> List[Tuple[str, ...]]:
         """
             Generate everygrams from a given text
 
@@ -29,7 +31,46 @@ class EverygramSimilarityScorer():
                 text (str): text to generate everygrams from
 
             Returns:
-                List[List[str]]: everygrams generated
+                List[Tuple[str, ...]]: everygrams generated
         """
         text = word_tokenize(text)
         return list(everygrams(text))
+
+
+class EverygramIndex():
+    """ Jaccard similarity over everygrams between a query and many texts known in advance """
+    def __init__(self, texts: List[str], scorer: Optional[EverygramSimilarityScorer] = None) -> None:
+        """
+            Precompute everygram sets of all texts as rows of a sparse binary matrix
+
+            Args:
+                texts (List[str]): texts to be compared with queries
+                scorer (Optional[EverygramSimilarityScorer]): scorer generating everygrams
+        """
+        self.scorer = scorer if scorer is not None else EverygramSimilarityScorer()
+        self.vocabulary: Dict[Tuple[str, ...], int] = dict()
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            for gram in set(self.scorer.get_everygrams(text)):
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+        self.matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                                        shape=(len(texts), len(self.vocabulary)))
+        self.set_sizes = np.asarray(self.matrix.sum(axis=1), dtype=np.int64).ravel()
+
+    def scores(self, text: str) -> np.ndarray:
+        """
+            Calculate Jaccard similarity between a text and every indexed text
+
+            Args:
+                text (str): query text
+
+            Returns:
+                np.ndarray: jaccard scores, in order of indexed texts
+        """
+        grams = set(self.scorer.get_everygrams(text))
+        query = np.zeros(len(self.vocabulary), dtype=np.int64)
+        query[[self.vocabulary[gram] for gram in grams if gram in self.vocabulary]] = 1
+        intersections = self.matrix.dot(query)
+        unions = len(grams) + self.set_sizes - intersections
+        return np.divide(intersections, unions, out=np.zeros(len(unions)), where=unions > 0)
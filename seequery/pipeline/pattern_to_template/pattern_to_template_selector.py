@@ -1,9 +1,14 @@
 import json
 import re
+from typing import Dict, List, Tuple
 
-from seequery.pipeline.pattern_to_template.everygram_similarity_scorer import \
-    EverygramSimilarityScorer
+import numpy as np
+
+from seequery.pipeline.pattern_to_template.everygram_similarity_scorer import (
+    EverygramIndex, EverygramSimilarityScorer)
+from seequery.pipeline import instrumentation
 from seequery.pipeline.pipeline_component import PipelineComponent
+from seequery.utils.query_template import CompiledQueryTemplate
 
 
 class PatternToTemplateSelector(PipelineComponent):
@@ -25,6 +30,22 @@ class PatternToTemplateSelector(PipelineComponent):
                     self.pattern_mapping[new_cq_pattern] = self.pattern_mapping.pop(cq_pattern)
             self.known_patterns = self.pattern_mapping.keys()
 
+        # templates are parsed once, each CQ only picks already compiled ones
+        self.pattern_mapping = {
+            pattern: [CompiledQueryTemplate.compile(variants) for variants in templates]
+            for pattern, templates in self.pattern_mapping.items()
+        }
+        self.known_patterns = self.pattern_mapping.keys()
+
+        # known patterns grouped by (max EC id, max PC id), in mapping order
+        bucketed: Dict[Tuple[int, int], List[str]] = dict()
+        for known_pattern in self.known_patterns:
+            bucketed.setdefault(self._get_bucket(known_pattern), []).append(known_pattern)
+        self.pattern_buckets: Dict[Tuple[int, int], Tuple[List[str], EverygramIndex]] = {
+            bucket: (patterns, EverygramIndex(patterns, self.everygram_scorer))
+            for bucket, patterns in bucketed.items()
+        }
+
     def process(self, data: dict) -> dict:
         """
             A method processing given data with current pipeline step.
@@ -35,13 +56,43 @@ class PatternToTemplateSelector(PipelineComponent):
             Returns:
                 dict: a dict holding object state enriched with current pipeline results
         """
-        data['cq_pattern'] = self.construct_cq_pattern(data)
-        if self.drop_aux_verbs:
-            data['cq_pattern'] = self.drop_auxiliary_if_pc_detected(data['cq_pattern'])
-        if self.drop_qm:
-            data['cq_pattern'] = self.drop_question_mark(data['cq_pattern'])
+        return self.process_many([data])[0]
+
+    def process_many(self, batch: List[dict]) -> List[dict]:
+        """
+            Select templates for many CQs, searching each distinct CQ pattern once.
+
+            Args:
+                batch (List[dict]): dicts holding states of objects
+
+            Returns:
+                List[dict]: dicts holding object states enriched with current pipeline results, in input order
+        """
+        closest_matches: Dict[str, str] = dict()
+        for data in batch:
+            data['cq_pattern'] = self.construct_cq_pattern(data)
+            if self.drop_aux_verbs:
+                data['cq_pattern'] = self.drop_auxiliary_if_pc_detected(data['cq_pattern'])
+            if self.drop_qm:
+                data['cq_pattern'] = self.drop_question_mark(data['cq_pattern'])
+
+            if data['cq_pattern'] not in closest_matches:
+                closest_matches[data['cq_pattern']] = self.get_closest_match(data['cq_pattern'])
+            self._select_templates(data, closest_matches[data['cq_pattern']])
+        return batch
+
+    def _select_templates(self, data: dict, closest_pattern: str) -> dict:
+        """
+            Collect templates of the closest known pattern.
 
-        data['closest_pattern'] = self.get_closest_match(data['cq_pattern'])
+            Args:
+                data (dict): a dict holding object state
+                closest_pattern (str): closest known CQ pattern, empty if none
+
+            Returns:
+                dict: a dict holding object state enriched with current pipeline results
+        """
+        data['closest_pattern'] = closest_pattern
         if data['closest_pattern'] == "":
             data['status'] = {
                 "type": "ERROR",
@@ -104,27 +155,29 @@ class PatternToTemplateSelector(PipelineComponent):
         Returns:
             str: closest CQ pattern selected
         """
-        max_ec = self._get_max_chunk_id(pattern, "EC")
-        max_pc = self._get_max_chunk_id(pattern, "PC")
-
         # consider only those patterns with same EC/PC number
-        valid_matches = []
-        for known_pattern in self.known_patterns:
-            known_max_ec = self._get_max_chunk_id(known_pattern, "EC")
-            known_max_pc = self._get_max_chunk_id(known_pattern, "PC")
-            if max_ec == known_max_ec and max_pc == known_max_pc:
-                valid_matches.append(known_pattern)
-
-        # search for closest pattern using an anygram jaccard similarity
-        best_match = ""
-        best_score = 0.0
-
-        for known_pattern in valid_matches:
-            score = self.everygram_scorer.score(pattern, known_pattern)
-            if score > best_score:
-                best_score = score
-                best_match = known_pattern
-        return best_match
+        if self._get_bucket(pattern) not in self.pattern_buckets:
+            return ""
+        valid_matches, index = self.pattern_buckets[self._get_bucket(pattern)]
+
+        # search for closest pattern using an anygram jaccard similarity, the first one wins ties
+        scores = index.scores(pattern)
+        instrumentation.count('templates_considered', len(valid_matches))
+        best_idx = int(np.argmax(scores))
+        if scores[best_idx] <= 0.0:
+            return ""
+        return valid_matches[best_idx]
+
+    def _get_bucket(self, pattern: str) -> Tuple[int, int]:
+        """ Get max ids assigned to ECs and PCs of a pattern.
+
+        Args:
+            pattern (str): pattern to search in
+
+        Returns:
+            Tuple[int, int]: max EC id and max PC id
+        """
+        return self._get_max_chunk_id(pattern, "EC"), self._get_max_chunk_id(pattern, "PC")
 
     def _get_max_chunk_id(self, pattern: str, chunk: str) -> int:
         """ Get max id assigned to a given chunk type.
@@ -139,7 +192,7 @@ class PatternToTemplateSelector(PipelineComponent):
         max_idx = 0
 
         for m in re.finditer(rf'\b{chunk}[0-9]+\b', pattern):
-            curent_idx = int(m.group()[-1])
+            curent_idx = int(m.group()[len(chunk):])
             if curent_idx > max_idx:
                 max_idx = curent_idx
 
@@ -1,38 +1,49 @@
 import logging
-
-import spacy
+from typing import Dict, List, Optional, Tuple
 
 from seequery.embeddings.embeddings_manager import EmbeddingsManager
 from seequery.ontology.ontology_manager import OntologyManager
+from seequery.pipeline.instrumentation import PipelineObserver, StageMetrics, StageRecord, count, \
+    measure_stage
 from seequery.pipeline.linker.entity_linker import EntityLinker
 from seequery.pipeline.pattern_to_template.pattern_to_template_selector import \
     PatternToTemplateSelector
 #from seequery.pipeline.linker.bert_linker import BertVectorizer
 from seequery.pipeline.query_filler.query_filler import QueryFiller
 from seequery.pipeline.reorganizer.reorganizer import Reorganizer
+from seequery.pipeline.translation_cache import TranslationCache
 from seequery.pipeline.vocab.direct_matcher import DirectMatcher
 from seequery.pipeline.vocab.merger import Merger
 from seequery.pipeline.vocab.reqtagger import ReqTagger
 from seequery.utils.helpers import Helpers
+from seequery.utils.spacy_processor import SpacyProcessor
 
 
 class Pipeline:
     """ A class defining pipeline steps to be run to create queries. """
+    # pseudo-stage of translation cache lookups, counting 'cache_hits' and 'cache_misses'
+    CACHE_STAGE = 'TranslationCache'
+
     def __init__(self, config: dict, embedding_mngr: EmbeddingsManager,
-                 onto_mngr: OntologyManager, spacy_nlp: spacy.lang.xx.Language):
+                 onto_mngr: OntologyManager, spacy_nlp: SpacyProcessor,
+                 embeddings_config: Optional[dict] = None):
         """ Initialize processing pipeline.
 
         Args:
             config (dict): Pipeline config dict
             embedding_mngr (EmbeddingManager): Embedding manager object
             onto_mngr (OntologyManager): Ontology manager object.
-            spacy_nlp (Any): callback to a spacy processor
+            spacy_nlp (SpacyProcessor): spacy processor
+            embeddings_config (Optional[dict]): embeddings config dict,
+                                                part of the translation cache fingerprint
         """
 
         self.config = config
         self.embedding_mngr = embedding_mngr
         self.ontology_mngr = onto_mngr
         self.spacy_nlp = spacy_nlp
+        if self.ontology_mngr.lexicon is None:
+            self.ontology_mngr.build_lexicon(spacy_nlp)
         self.components = [
             ReqTagger(spacy_nlp, self.ontology_mngr),
             DirectMatcher(self.ontology_mngr),
@@ -42,23 +53,76 @@ class Pipeline:
             EntityLinker(self.ontology_mngr, self.embedding_mngr, self.spacy_nlp, config['entity_linker']),
             QueryFiller(self.ontology_mngr)
         ]
+        # aggregated stage measurements of this process, more observers can be attached with add_observer
+        self.metrics = StageMetrics()
+        self.observers: List[PipelineObserver] = [self.metrics]
+        self.cache = self._open_cache(config.get('cache', {}), embeddings_config)
+
+    def _open_cache(self, cache_config: dict,
+                    embeddings_config: Optional[dict]) -> Optional[TranslationCache]:
+        """ Open the translation result cache for the current ontology, mappings, config and models.
+
+            Args:
+                cache_config (dict): cache section of the pipeline config
+                embeddings_config (Optional[dict]): embeddings config
+
+            Returns:
+                Optional[TranslationCache]: cache, None if disabled
+        """
+        if not cache_config.get('enabled', False):
+            return None
+        mapping_paths = [section['mapping_path'] for section in self.config.values()
+                         if isinstance(section, dict) and 'mapping_path' in section]
+        spacy_meta = self.spacy_nlp.nlp.meta
+        models = [f"{spacy_meta.get('lang')}_{spacy_meta.get('name')}-{spacy_meta.get('version')}",
+                  getattr(self.embedding_mngr, 'model_id', type(self.embedding_mngr).__name__)]
+        fingerprint = TranslationCache.fingerprint(self.ontology_mngr.path, mapping_paths, self.config,
+                                                   models, embeddings_config)
+        logging.debug(f"Pipeline::translation cache {fingerprint}")
+        return TranslationCache(fingerprint, cache_config.get('capacity', 10000), cache_config.get('db_path'),
+                                cache_config.get('max_age_days', 30))
 
-    def run(self, cq: str) -> dict:
+    def add_observer(self, observer: PipelineObserver) -> None:
+        """ Notify an observer after each pipeline stage.
+
+            Args:
+                observer (PipelineObserver): observer receiving stage records
+        """
+        self.observers.append(observer)
+
+    def run(self, cq: str, use_cache: bool = True) -> dict:
         """ Process CQ with the pipeline.
 
             Args:
                 cq (str): Competency Question as string
+                use_cache (bool): return a cached translation if there is one. Cached outputs
+                                  hold only 'cq' and 'queries' (or 'status' on error).
 
             Returns:
-                processing_data (dict): dict with all produced components outputs
+                processing_data (dict): dict with all produced components outputs,
+                                        'instrumentation' holds measurements of each stage,
+                                        the cache lookup included
 
         """
         cq = Helpers.clean_cq(cq)
         logging.debug(f"Pipeline::run preprocessing, cq cleaned {cq}")
+        records: List[dict] = []
+        if use_cache and self.cache:
+            cached, lookup_record = self._lookup(self.cache, [cq])
+            records.append(lookup_record)
+            if cq in cached:
+                cached[cq]['instrumentation'] = records
+                return cached[cq]
 
-        data = {"cq": cq}
+        data: dict = {"cq": cq}
         for component in self.components:
-            data = component.process(data)
+            with measure_stage(type(component).__name__) as record:
+                data = component.process(data)
+            self._notify(record)
+            records.append(record.to_dict())
+        data['instrumentation'] = records
+        if self.cache:
+            self.cache.put(cq, data)
         #try:
         #    for component in self.components:
         #        data = component.process(data)
@@ -68,3 +132,73 @@ class Pipeline:
         #    print(e)
         #    return {"QueryGenerationFailure": "Cannot generate a query from given CQ/ontology."}
         return data
+
+    def run_many(self, cqs: List[str], use_cache: bool = True) -> List[dict]:
+        """ Process many CQs with the pipeline, each step handling all of them at once.
+
+            Args:
+                cqs (List[str]): Competency Questions as strings
+                use_cache (bool): take cached translations and run only the remaining CQs
+
+            Returns:
+                List[dict]: dicts with all produced components outputs, in input order.
+                            CQs equal after cleaning share the same dict. 'instrumentation' holds
+                            measurements of each stage, taken over the whole batch.
+        """
+        cleaned = [Helpers.clean_cq(cq) for cq in cqs]
+        distinct = list(dict.fromkeys(cleaned))
+        outputs: Dict[str, dict] = dict()
+        lookup_records: List[dict] = []
+        if use_cache and self.cache:
+            outputs, lookup_record = self._lookup(self.cache, distinct)
+            lookup_records.append(lookup_record)
+            for data in outputs.values():
+                data['instrumentation'] = lookup_records
+        missing = [cq for cq in distinct if cq not in outputs]
+        logging.debug(f"Pipeline::run_many {len(cqs)} CQs, {len(distinct)} distinct, {len(missing)} to run")
+
+        if len(missing) > 0:
+            batch: List[dict] = [{"cq": cq} for cq in missing]
+            records = list(lookup_records)
+            for component in self.components:
+                with measure_stage(type(component).__name__, len(batch)) as record:
+                    batch = component.process_many(batch)
+                self._notify(record)
+                records.append(record.to_dict())
+            for cq, data in zip(missing, batch):
+                data['instrumentation'] = records
+                outputs[cq] = data
+                if self.cache:
+                    self.cache.put(cq, data)
+        return [outputs[cq] for cq in cleaned]
+
+    def _lookup(self, cache: TranslationCache, cqs: List[str]) -> Tuple[Dict[str, dict], dict]:
+        """ Look CQs up in the translation cache, measured as a pseudo-stage so that observers
+            see CQs answered without running the pipeline.
+
+            Args:
+                cache (TranslationCache): translation cache of the pipeline
+                cqs (List[str]): cleaned CQs
+
+            Returns:
+                Tuple[Dict[str, dict], dict]: cached outputs of CQs found and the lookup measurements
+        """
+        found: Dict[str, dict] = dict()
+        with measure_stage(self.CACHE_STAGE, len(cqs)) as record:
+            for cq in cqs:
+                cached = cache.get(cq)
+                if cached is not None:
+                    found[cq] = cached
+            count('cache_hits', len(found))
+            count('cache_misses', len(cqs) - len(found))
+        self._notify(record)
+        return found, record.to_dict()
+
+    def _notify(self, record: StageRecord) -> None:
+        """ Pass measurements of a stage to all observers.
+
+            Args:
+                record (StageRecord): stage measurements
+        """
+        for observer in self.observers:
+            observer.on_stage(record)
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import List
 
 
 class PipelineComponent(ABC):
@@ -14,3 +15,16 @@ class PipelineComponent(ABC):
                 dict: a dict holding object state enriched with current pipeline results
         """
         pass
+
+    def process_many(self, batch: List[dict]) -> List[dict]:
+        """
+            A method processing many CQs with current pipeline step, one after another unless
+            a step shares work between them.
+
+            Args:
+                batch (List[dict]): dicts holding states of objects
+
+            Returns:
+                List[dict]: dicts holding object states enriched with current pipeline results, in input order
+        """
+        return [self.process(data) for data in batch]
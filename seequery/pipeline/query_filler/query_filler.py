@@ -1,10 +1,9 @@
-import re
-from operator import itemgetter
-from typing import Dict, List, Union
+from typing import Dict
 
 from seequery.ontology.ontology_manager import OntologyManager
 from seequery.pipeline.match_item import MatchItem
 from seequery.pipeline.pipeline_component import PipelineComponent
+from seequery.utils.query_template import CompiledQueryTemplate, TemplateParts
 
 
 class QueryFiller(PipelineComponent):
@@ -32,58 +31,31 @@ class QueryFiller(PipelineComponent):
                 queries.append("")
                 continue
 
-            query_variants = data['query_templates'][idx]
+            compiled_template: CompiledQueryTemplate = data['query_templates'][idx]
             swap = True if 'swap' in meta_enriched_vocab and meta_enriched_vocab['swap'] else False
 
-            template = self.choose_template_variant(query_variants, swap)
+            template = compiled_template.variant(swap)
             queries.append(self.fill_template(template, meta_enriched_vocab['vocab']))
 
         data['queries'] = queries
         return data
 
-    def fill_template(self, template: str, vocab: Dict[str, MatchItem]) -> str:
+    def fill_template(self, template: TemplateParts, vocab: Dict[str, MatchItem]) -> str:
         """ Fill templates with IRIs
 
         Args:
-            template (str): Template to be filled
+            template (TemplateParts): Template to be filled
             vocab (Dict[str, MatchItem]): each chunk translation information
 
         Returns:
             str: template filled with IRIs
         """
-        chunk_spans = []
-        for m in re.finditer("<(IS_EC|HAS_EC|EC|PC)[0-9]+>", template):
-            # store where chunk starts, ends and what is the chunk_idx (withiout angle brackets)
-            chunk_spans.append(
-                (m.span()[0], m.span()[1], m.group()[1:-1]))
-
-        chunk_spans = sorted(chunk_spans, key=itemgetter(0), reverse=True)  # sort from the latest
-
-        for begin, end, chunk_idx in chunk_spans:
-            # if HAS_EC{n} or IS_EC{n} seen in property
-            if chunk_idx[:-1] not in ['PC', 'EC']:
-                chunk_idx = chunk_idx.split("_")[1]  # get id after prefix
-
+        iris = dict()
+        for chunk_idx in template.slots:
+            if chunk_idx in iris:
+                continue
             match_item = vocab[chunk_idx]
             onto_label = match_item.scored_candidates[0].onto_label
             category = match_item.scored_candidates[0].category
-            onto_iri = self.ontology_mngr.onto_map[category][onto_label].iri
-
-            template = template[:begin] + "<" + onto_iri + ">" + template[end:]
-        return template
-
-    def choose_template_variant(self, variants: Union[str, dict], argswap: bool) -> str:
-        """ If multiple SPARQL-OWL query template variants provided, choose appropriate based on 'argswap'
-
-        Args:
-            variants (List[str]): List of template variants
-            argswap (bool): are arguments swapped?
-
-        Returns:
-            str: variant chosen
-        """
-
-        if isinstance(variants, dict):
-            return variants['reversed'] if argswap else variants['normal']
-        else:
-            return variants
+            iris[chunk_idx] = self.ontology_mngr.onto_map[category][onto_label].iri
+        return template.fill(iris)
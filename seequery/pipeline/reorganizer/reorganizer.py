@@ -26,13 +26,9 @@ class Reorganizer(PipelineComponent):
             return data
 
         data['vocab_for_templates'] = []
-        for template_order_variants in data['query_templates']:
-            if isinstance(template_order_variants, dict):
-                template = template_order_variants['normal']
-            else:
-                template = template_order_variants
-            # template = template_order_variants  # {TODO: argswap handling! see pattern_mapping.json}
-            meta = MetaTemplateChunks.from_template(template)
+        for compiled_template in data['query_templates']:
+            # meta information comes from the normal variant
+            meta = compiled_template.meta
 
             if meta.can_be_handled():
                 vocab = self.make_vocab_map(data, meta)
@@ -0,0 +1,135 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from seequery.utils.helpers import Helpers
+from seequery.utils.lru_cache import LRUCache
+from seequery.utils.sqlite_store import SqliteStore
+
+
+class TranslationCache:
+    """ Translation results of CQs, kept in memory and optionally in a SQLite file shared between processes.
+
+        Entries are stored under a fingerprint of everything a translation depends on (ontology file,
+        mapping files, pipeline and embeddings config, models and the pipeline code), so changing any of
+        these starts from an empty cache while entries of other settings stay untouched until unused
+        for max_age_days.
+    """
+    FORMAT_VERSION = 1
+
+    def __init__(self, fingerprint: str, capacity: int = 10000, db_path: Optional[str] = None,
+                 max_age_days: float = 30) -> None:
+        """ Open the cache.
+
+        Args:
+            fingerprint (str): fingerprint of translation settings, see `fingerprint`
+            capacity (int): most results kept in memory
+            db_path (Optional[str]): SQLite file, results are kept in memory only if None
+            max_age_days (float): results of settings unused for this long are deleted from the file,
+                                  0 keeps them
+        """
+        self.namespace = f'{fingerprint}.v{self.FORMAT_VERSION}'
+        self.memory = LRUCache(capacity)
+        self.store = SqliteStore(db_path, 'translations') if db_path else None
+        if self.store:
+            self.store.touch(self.namespace)
+            if max_age_days > 0:
+                self.store.prune(max_age_days * 24 * 3600, keep=self.namespace)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(ontology_path: str, mapping_paths: List[str], pipeline_config: dict, models: List[str],
+                    embeddings_config: Optional[dict] = None) -> str:
+        """ Hash everything a translation depends on.
+
+        Args:
+            ontology_path (str): path to the ontology file
+            mapping_paths (List[str]): paths to pattern and template mapping files
+            pipeline_config (dict): pipeline section of the config, thresholds included
+            models (List[str]): names and versions of spaCy and BERT models
+            embeddings_config (Optional[dict]): embeddings section of the config, vector precision included
+
+        Returns:
+            str: hex digest
+        """
+        sha1 = hashlib.sha1()
+        for path in [ontology_path] + sorted(set(mapping_paths)):
+            sha1.update(Helpers.file_fingerprint(path).encode('utf-8'))
+        # the cache section itself does not change translations
+        settings = {key: value for key, value in pipeline_config.items() if key != 'cache'}
+        sha1.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+        # nor do sizes and locations of stored vectors and weights, vector precision does
+        embeddings = {key: value for key, value in (embeddings_config or {}).items()
+                      if key != 'checkpoint_dir'}
+        if isinstance(embeddings.get('vector_cache'), dict):
+            embeddings['vector_cache'] = {key: value for key, value in embeddings['vector_cache'].items()
+                                          if key not in ('capacity', 'max_mb', 'db_path', 'max_age_days')}
+        sha1.update(json.dumps(embeddings, sort_keys=True, default=str).encode('utf-8'))
+        sha1.update(json.dumps(models).encode('utf-8'))
+        # any change to the package code may change translations as well
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for path in sorted(glob.glob(os.path.join(package_dir, '**', '*.py'), recursive=True)):
+            sha1.update(Helpers.file_fingerprint(path).encode('utf-8'))
+        return sha1.hexdigest()
+
+    def get(self, cq: str) -> Optional[dict]:
+        """ Look a translation up, in memory first, then on disk.
+
+        Args:
+            cq (str): cleaned CQ
+
+        Returns:
+            Optional[dict]: a copy of the stored pipeline output, None on a miss
+        """
+        output = self.memory.get(cq)
+        if output is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return dict(output)
+
+        value = self.store.get(self.namespace, cq) if self.store else None
+        if value is not None:
+            output = json.loads(value.decode('utf-8'))
+            self.memory.put(cq, output)
+            with self._lock:
+                self.disk_hits += 1
+            return dict(output)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, cq: str, output: dict) -> None:
+        """ Store the part of a pipeline output translation results are made of.
+
+        Args:
+            cq (str): cleaned CQ
+            output (dict): pipeline output
+        """
+        if 'status' in output and output['status']['type'] == 'ERROR':
+            entry = {"cq": cq, "status": output['status']}
+        elif 'queries' in output:
+            entry = {"cq": cq, "queries": output['queries']}
+        else:
+            return
+        self.memory.put(cq, entry)
+        if self.store:
+            self.store.put(self.namespace, cq, json.dumps(entry, default=str).encode('utf-8'))
+
+    def stats(self) -> Dict[str, float]:
+        """ Report hits and misses since the cache was opened.
+
+        Returns:
+            Dict[str, float]: hit and miss counts, hit rate and entries kept in memory
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {"memory_hits": self.memory_hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups > 0 else 0.0,
+                    "memory_entries": len(self.memory)}
@@ -1,17 +1,44 @@
-import re
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+from seequery.ontology.lexicon import LexiconEntry
 from seequery.ontology.ontology_manager import OntologyManager
 from seequery.pipeline.match_item import MatchItem
 from seequery.pipeline.pipeline_component import PipelineComponent
 from seequery.pipeline.scored_translation import ScoredTranslation
+from seequery.utils.aho_corasick import AhoCorasick
 from seequery.utils.helpers import Helpers
 from seequery.utils.linking_category import LinkingCategory
 
 
 class DirectMatcher(PipelineComponent):
+    # optional inflections, tried in this order
+    SUFFIXES = ['ing', 'ed', 'es', 's', '']
+
     def __init__(self, ontology_mngr: OntologyManager) -> None:
         self.ontology_mngr = ontology_mngr
+        if ontology_mngr.lexicon is None:
+            raise ValueError("DirectMatcher needs the label lexicon, see OntologyManager.build_lexicon")
+        lexicon = ontology_mngr.lexicon
+
+        # labels in the order they claim CQ spans: category after category, longest labels first
+        self.labels_in_order: List[Tuple[LinkingCategory, LexiconEntry]] = []
+        for category in self.ontology_mngr.onto_map:
+            entries = lexicon.entries[category]
+            for entry in sorted(entries, key=lambda e: len(e.label), reverse=True):
+                self.labels_in_order.append((category, entry))
+
+        # each label is matched by its normalized form, then by its lowercased form
+        forms: Dict[str, int] = dict()
+        self.form_owners: List[List[Tuple[int, int]]] = []  # pattern id -> (label rank, alternative)
+        for rank, (_, entry) in enumerate(self.labels_in_order):
+            for alternative, form in enumerate(dict.fromkeys([entry.normalized_text, entry.lowercased])):
+                if len(form) == 0:
+                    continue
+                if form not in forms:
+                    forms[form] = len(forms)
+                    self.form_owners.append([])
+                self.form_owners[forms[form]].append((rank, alternative))
+        self.automaton = AhoCorasick(list(forms.keys()))
 
     def process(self, data: dict) -> dict:
         """
@@ -28,32 +55,86 @@ class DirectMatcher(PipelineComponent):
 
         spans_generated: List[Tuple[int, int]] = []
 
-        for category in self.ontology_mngr.onto_map:
-            labels_available = list(self.ontology_mngr.onto_map[category].keys())
-            labels_from_longest = sorted(labels_available, key=len, reverse=True)
-
-            for label in labels_from_longest:
-                normalized_label = Helpers.normalize_label(label).lower()
-                label_lower = label.lower()
-                r = rf'\b({re.escape(normalized_label)}|{re.escape(label_lower)})(ing|ed|es|s)?\b'
-
-                for m in re.finditer(r, cq):
-                    current_span = (m.span()[0], m.span()[1])
-                    if any([Helpers.is_subspan(current_span, s) for s in spans_generated]):
-                        continue
-                    ec = True if category in [LinkingCategory.CLASS, LinkingCategory.INDIVIDUAL] else False
-                    key = 'entities' if ec else 'relations'
-                    result[key].append(MatchItem(char_begin=m.span()[0],
-                                                 char_end=m.span()[1],
-                                                 raw_text=m.group(),
-                                                 normalized_text=m.group(),
-                                                 is_ec=ec,
-                                                 is_explicit_match=True,
-                                                 scored_candidates=[ScoredTranslation(
-                                                    score=1.0,
-                                                    onto_label=label,
-                                                    category=category
-                                                 )]))
-                    spans_generated.append(current_span)
+        for rank, matches in sorted(self.find_label_matches(cq).items()):
+            category, entry = self.labels_in_order[rank]
+            for current_span in matches:
+                if any([Helpers.is_subspan(current_span, s) for s in spans_generated]):
+                    continue
+                ec = True if category in [LinkingCategory.CLASS, LinkingCategory.INDIVIDUAL] else False
+                key = 'entities' if ec else 'relations'
+                result[key].append(MatchItem(char_begin=current_span[0],
+                                             char_end=current_span[1],
+                                             raw_text=cq[current_span[0]:current_span[1]],
+                                             normalized_text=cq[current_span[0]:current_span[1]],
+                                             is_ec=ec,
+                                             is_explicit_match=True,
+                                             scored_candidates=[ScoredTranslation(
+                                                score=1.0,
+                                                onto_label=entry.label,
+                                                category=category
+                                             )]))
+                spans_generated.append(current_span)
         data['direct_matches'] = result
         return data
+
+    def find_label_matches(self, cq: str) -> Dict[int, List[Tuple[int, int]]]:
+        """ Find where labels occur in a CQ, as whole words optionally followed by an inflection.
+            Per label, matches do not overlap and are taken from left to right.
+
+            Args:
+                cq (str): lowercased CQ
+
+            Returns:
+                Dict[int, List[Tuple[int, int]]]: label ranks mapped to spans they match
+        """
+        # label rank -> start offset -> alternative -> end offset
+        candidates: Dict[int, Dict[int, Dict[int, int]]] = dict()
+        for start, pattern_id in self.automaton.find_all(cq):
+            if not self._is_word_boundary(cq, start):
+                continue
+            end = self._inflected_end(cq, start + len(self.automaton.patterns[pattern_id]))
+            if end is None:
+                continue
+            for rank, alternative in self.form_owners[pattern_id]:
+                candidates.setdefault(rank, dict()).setdefault(start, dict())[alternative] = end
+
+        matches: Dict[int, List[Tuple[int, int]]] = dict()
+        for rank, starts in candidates.items():
+            last_end = 0
+            for start in sorted(starts):
+                if start < last_end:
+                    continue
+                alternatives = starts[start]
+                last_end = alternatives[min(alternatives)]  # the normalized form wins if both match
+                matches.setdefault(rank, []).append((start, last_end))
+        return matches
+
+    def _inflected_end(self, text: str, end: int) -> Optional[int]:
+        """ Extend a match with the first inflection followed by a word boundary.
+
+            Args:
+                text (str): text being matched
+                end (int): offset where the matched form ends
+
+            Returns:
+                Optional[int]: end of the match, None if no inflection ends on a word boundary
+        """
+        for suffix in self.SUFFIXES:
+            if text.startswith(suffix, end) and self._is_word_boundary(text, end + len(suffix)):
+                return end + len(suffix)
+        return None
+
+    @staticmethod
+    def _is_word_boundary(text: str, position: int) -> bool:
+        """ Check the regex \\b condition at a given offset.
+
+            Args:
+                text (str): text being matched
+                position (int): offset between two characters
+
+            Returns:
+                bool: True if exactly one side of the offset is a word character
+        """
+        before = position > 0 and (text[position - 1].isalnum() or text[position - 1] == '_')
+        after = position < len(text) and (text[position].isalnum() or text[position] == '_')
+        return before != after
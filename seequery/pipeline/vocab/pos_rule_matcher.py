@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional, Tuple
+
+# (minimal repetitions, maximal repetitions or None if unbounded, accepted tags)
+RuleItem = Tuple[int, Optional[int], Tuple[str, ...]]
+
+
+class PosRuleMatcher:
+    """ Match POS tag rules against a sequence of tags, all rules in a single pass.
+
+        A rule is a list of items such as 'NN|NNS' (one of the tags), '{0+}JJ' (zero or more),
+        '{1+}JJ' (one or more) or '{1?}DT' (optional). Repetitions are greedy and the first match
+        found while backtracking is kept. An item may also accept a tag it is a prefix of
+        (e.g. 'NN' for 'NNS') when that tag is the last one of a match.
+    """
+    QUANTIFIERS = {'{0+}': (0, None), '{1+}': (1, None), '{1?}': (0, 1)}
+
+    def __init__(self, rule_sets: Dict[str, List[List[str]]]) -> None:
+        """ Compile rules once.
+
+        Args:
+            rule_sets (Dict[str, List[List[str]]]): named sets of rules
+        """
+        self.rules: List[Tuple[str, List[RuleItem]]] = [
+            (name, [self.parse_item(item) for item in rule])
+            for name, rules in rule_sets.items() for rule in rules
+        ]
+        self.rule_set_names = list(rule_sets.keys())
+
+    @classmethod
+    def parse_item(cls, item: str) -> RuleItem:
+        """ Parse a single rule item.
+
+        Args:
+            item (str): rule item, e.g. '{0+}NN|NNS'
+
+        Returns:
+            RuleItem: repetition bounds and accepted tags
+        """
+        min_count, max_count = cls.QUANTIFIERS.get(item[:4], (1, 1))
+        if item[:4] in cls.QUANTIFIERS:
+            item = item[4:]
+        return (min_count, max_count, tuple(item.split('|')))
+
+    def find_all(self, tags: List[str]) -> Dict[str, List[Tuple[int, int]]]:
+        """ Find matches of all rules. Matches of the same rule do not overlap.
+
+        Args:
+            tags (List[str]): POS tags of consecutive tokens
+
+        Returns:
+            Dict[str, List[Tuple[int, int]]]: rule set names mapped to (first token, last token + 1) spans
+        """
+        matches: Dict[str, List[Tuple[int, int]]] = {name: [] for name in self.rule_set_names}
+        next_start = [0] * len(self.rules)
+
+        for start in range(len(tags)):
+            for rule_idx, (name, items) in enumerate(self.rules):
+                if start < next_start[rule_idx]:
+                    continue
+                end = self._match(items, 0, 0, start, tags)
+                if end is not None:
+                    matches[name].append((start, end))
+                    next_start[rule_idx] = end
+        return matches
+
+    def _match(self, items: List[RuleItem], item_idx: int, count: int, position: int,
+               tags: List[str]) -> Optional[int]:
+        """ Depth first search for the first way rule items match tags from a given position.
+
+        Args:
+            items (List[RuleItem]): rule items
+            item_idx (int): current item
+            count (int): how many times the current item has matched so far
+            position (int): current token
+            tags (List[str]): POS tags
+
+        Returns:
+            Optional[int]: position after the last matched token, None if there is no match
+        """
+        if item_idx == len(items):
+            return position
+
+        min_count, max_count, accepted = items[item_idx]
+        if (max_count is None or count < max_count) and position < len(tags):
+            tag = tags[position]
+            for accepted_tag in accepted:
+                if tag == accepted_tag:
+                    end = self._match(items, item_idx, count + 1, position + 1, tags)
+                    if end is not None:
+                        return end
+                elif tag.startswith(accepted_tag) and self._can_end(items, item_idx, count + 1):
+                    return position + 1
+        if count >= min_count:
+            return self._match(items, item_idx + 1, 0, position, tags)
+        return None
+
+    def _can_end(self, items: List[RuleItem], item_idx: int, count: int) -> bool:
+        """ Check if a match may end while at a given item.
+
+        Args:
+            items (List[RuleItem]): rule items
+            item_idx (int): current item
+            count (int): how many times the current item has matched
+
+        Returns:
+            bool: True if the current item is satisfied and all following items are optional
+        """
+        return count >= items[item_idx][0] and all(item[0] == 0 for item in items[item_idx + 1:])
@@ -1,12 +1,14 @@
 import re
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
 import spacy
 
 from seequery.ontology.ontology_manager import OntologyManager
 from seequery.pipeline.match_item import MatchItem
 from seequery.pipeline.pipeline_component import PipelineComponent
+from seequery.pipeline.vocab.pos_rule_matcher import PosRuleMatcher
 from seequery.utils.helpers import Helpers
+from seequery.utils.spacy_processor import SpacyProcessor
 
 
 class ReqTagger(PipelineComponent):
@@ -40,73 +42,48 @@ class ReqTagger(PipelineComponent):
         ['JJ|JJS']
     ]
 
-    def __init__(self, nlp: spacy.lang.xx.Language, ontology_mngr: OntologyManager) -> None:
+    def __init__(self, nlp: SpacyProcessor, ontology_mngr: OntologyManager) -> None:
         self.nlp = nlp
         self.ontology_mngr = ontology_mngr
-        for idx in range(len(self.RULES_RELATIONS)):
-            self.RULES_RELATIONS[idx] = ['{1?}AUX|VBP'] + self.RULES_RELATIONS[idx]
+        self.rejected = {'entities': set(self.NON_ENTITY_THINGS), 'relations': set(self.NON_RELATION_THING)}
+        # compiled once, RULES_RELATIONS itself stays untouched
+        self.matcher = PosRuleMatcher({
+            'entities': self.RULES_ENTITIES,
+            'relations': [['{1?}AUX|VBP'] + rule for rule in self.RULES_RELATIONS]
+        })
 
-    def parse_rule(self, rule: List[str]) -> str:
-        """ Parse rule expressed as list of tokens into internal representation.
-
-        Args:
-            rule (List[str]): rule as a list of requirements.
-
-        Returns:
-            str: parsed rule.
-        """
-        return r''.join(self.parse_item(item) for item in rule)
-
-    def parse_item(self, item: str) -> str:
-        postfix = ""
-        if item.startswith("{"):
-            if item.startswith('{0+}'):
-                postfix = '*'
-            elif item.startswith('{1+}'):
-                postfix = '+'
-            elif item.startswith('{1?}'):
-                postfix = '?'
-            item = item[4:]
-        return rf"([0-9]+::({item}),?){postfix}"
-
-    def find_matching_spans(self, doc: spacy.tokens.doc.Doc, rules: List[List[str]],
-                            rejected: List[str], cq: str) -> List[Tuple[int, int]]:
-        """ Find spans matching rules.
+    def find_matching_spans(self, doc: spacy.tokens.doc.Doc, cq: str) -> Dict[str, List[Tuple[int, int]]]:
+        """ Find spans matching entity and relation rules.
 
         Args:
             doc (spacy.tokens.doc.Doc): spacy tokenized document
-            rules (List[List[str]]): rules to be used
-            rejected (List[str]): phrases to be rejected
             cq (str): cq to be processed
 
         Returns:
-            List[Tuple[int, int]]: list of spans
+            Dict[str, List[Tuple[int, int]]]: character spans of 'entities' and 'relations'
 
         """
-        spans = []
-        pos_text = ",".join(
-            ["{i}::{pos}".format(i=i, pos=t.tag_) for i, t in enumerate(doc)])
-
-        for rule in rules:  # try to extract chunks
-            rule_parsed = self.parse_rule(rule)
-            for m in re.finditer(rule_parsed, pos_text):
-                id_tags = [elem for elem in m.group().split(",") if elem != '']
-                ids = sorted([int(id_tag.split("::")[0]) for id_tag in id_tags])
+        token_spans = self.matcher.find_all([t.tag_ for t in doc])
+        spans: Dict[str, List[Tuple[int, int]]] = dict()
+
+        for key, matches in token_spans.items():
+            spans[key] = []
+            for begin, end in matches:
+                ids = list(range(begin, end))
                 if doc[ids[0]].text.lower() in {'many', 'much', 'any', 'different'}:
                     ids = ids[1:]
                 if len(ids) > 2 and doc[ids[-1]].text.lower() in {'than'}:
                     if doc[ids[-2]].text.lower() in {'less', 'more'}:
                         ids = ids[:-2]
-                        pass
                 if len(ids) > 1 and doc[ids[-1]].text.lower() in {'exactly', 'more', 'less'}:
                     ids = ids[:-1]
                 if len(ids) == 0:
                     continue
-                # ids = [id for id in ids if doc[id].text.lower() not in {'many', 'much', 'any', 'different'}]
                 span = (doc[ids[0]].idx, doc[ids[-1]].idx + len(doc[ids[-1]]))
-                if cq[span[0]:span[1]].lower() not in rejected:
-                    spans.append(span)
-        return sorted(Helpers.filter_subspans(spans))
+                if cq[span[0]:span[1]].lower() not in self.rejected[key]:
+                    spans[key].append(span)
+            spans[key] = Helpers.filter_subspans(spans[key])
+        return spans
 
     def process(self, data: dict) -> dict:
         """
@@ -118,10 +95,35 @@ class ReqTagger(PipelineComponent):
             Returns:
                 dict: a dict holding object state enriched with current pipeline results
         """
+        return self._process_doc(data, self.nlp(data['cq'].lower()))
+
+    def process_many(self, batch: List[dict]) -> List[dict]:
+        """
+            Tag many CQs, parsed together with nlp.pipe.
+
+            Args:
+                batch (List[dict]): dicts holding states of objects
+
+            Returns:
+                List[dict]: dicts holding object states enriched with current pipeline results, in input order
+        """
+        docs = self.nlp.pipe([data['cq'].lower() for data in batch])
+        return [self._process_doc(data, doc) for data, doc in zip(batch, docs)]
+
+    def _process_doc(self, data: dict, doc: spacy.tokens.doc.Doc) -> dict:
+        """
+            Find potential entities and relations of a CQ already parsed.
+
+            Args:
+                data (dict): a dict holding object state
+                doc (spacy.tokens.doc.Doc): spacy tokenized lowercased CQ
+
+            Returns:
+                dict: a dict holding object state enriched with current pipeline results
+        """
         cq = data['cq']
-        doc = self.nlp(cq.lower())
-        entity_spans = self.find_matching_spans(doc, self.RULES_ENTITIES, self.NON_ENTITY_THINGS, cq)
-        relations_spans = self.find_matching_spans(doc, self.RULES_RELATIONS, self.NON_RELATION_THING, cq)
+        spans = self.find_matching_spans(doc, cq)
+        entity_spans, relations_spans = spans['entities'], spans['relations']
 
         entities = []
         for begin, end in entity_spans:
@@ -3,8 +3,6 @@ import sys
 
 from seequery.translator import CQToSPARQLOWL
 
-logging.basicConfig(filename='cq_to_sparql.log', level=logging.DEBUG)
-
 cqs = [
     'Are anchovies and capers used together?',
     'Are different bases available?',
@@ -51,15 +49,16 @@ cqs = [
 ]
 
 def main() -> None:
+    # configured here, not at import, the CQ lists are also imported by benchmarks
+    logging.basicConfig(filename='cq_to_sparql.log', level=logging.DEBUG)
     if len(sys.argv) == 1:
         translator = CQToSPARQLOWL()
     else:
         config = CQToSPARQLOWL.load_config(sys.argv[1])
         translator = CQToSPARQLOWL(config=config)
 
-    for cq in cqs:
+    for cq, query in zip(cqs, translator.translate_many(cqs)):
         print(f"Processing CQ {cq}")
-        query = translator.translate(cq)
         print(query)
         #print(translator.translate(input("Please type your CQ: "), dump_debug_info=True))
         #    print(query)
@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from seequery.translator import CQToSPARQLOWL
+
+MAX_BODY_SIZE = 64 * 1024
+
+
+class TranslationServer:
+    """ HTTP/JSON translation service. Requests arriving close together are translated in one
+        micro-batch, so that they share spaCy and BERT forward passes.
+
+        Endpoints:
+            POST /translate with {"cq": "..."} -- translation of a single CQ
+            GET /health -- 'loading', 'ready' or 'failed', 503 until the translator is loaded
+            GET /metrics -- per stage time histograms and counters in the Prometheus text format
+    """
+    def __init__(self, config: dict, host: str = '127.0.0.1', port: int = 8080, max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, queue_size: int = 1024) -> None:
+        """ Prepare the server, the translator is loaded once the server starts.
+
+        Args:
+            config (dict): application config
+            host (str): address to listen on
+            port (int): port to listen on
+            max_batch_size (int): most CQs translated together
+            max_wait_ms (float): how long the first request of a batch waits for others to join
+            queue_size (int): most CQs waiting for translation, more are rejected with 429
+        """
+        self.config = config
+        self.host = host
+        self.port = port
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue_size = queue_size
+        self.queue: Optional[asyncio.Queue] = None  # bound to the running loop in serve_forever
+        # models are not thread safe, batches are translated one after another off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='translator')
+        self.translator: Optional[CQToSPARQLOWL] = None
+        self.status = 'loading'
+        self.started_at = time.time()
+        self.batches = 0
+        self.translated = 0
+
+    async def serve_forever(self) -> None:
+        """ Start listening right away, load the translator in the background and translate batches. """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.queue = queue
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logging.info(f"TranslationServer::listening on {self.host}:{self.port}")
+        asyncio.ensure_future(self._load())
+        asyncio.ensure_future(self._batch_loop(queue))
+        async with server:
+            await server.serve_forever()
+
+    async def _load(self) -> None:
+        """ Load models and the ontology without blocking the event loop. """
+        try:
+            loop = asyncio.get_running_loop()
+            self.translator = await loop.run_in_executor(self.executor, CQToSPARQLOWL, self.config)
+            self.status = 'ready'
+            logging.info(f"TranslationServer::ready after {time.time() - self.started_at:.1f}s")
+        except Exception:
+            self.status = 'failed'
+            logging.exception("TranslationServer::loading failed")
+
+    async def _batch_loop(self, queue: asyncio.Queue) -> None:
+        """ Collect queued CQs into micro-batches and translate them.
+
+        Args:
+            queue (asyncio.Queue): queue of (CQ, future) pairs requests wait on
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            cqs = [cq for cq, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self._translate_batch, cqs)
+            except Exception as e:
+                logging.exception("TranslationServer::batch failed")
+                results = [{"cq": cq, "status": "ERROR", "message": str(e)} for cq in cqs]
+            self.batches += 1
+            self.translated += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _translate_batch(self, cqs: List[str]) -> List[dict]:
+        """ Translate a micro-batch, run in the executor.
+
+        Args:
+            cqs (List[str]): CQs to translate
+
+        Returns:
+            List[dict]: response bodies, in input order, errors of single CQs included
+        """
+        if self.translator is None:
+            raise RuntimeError(f"Translator {self.status}")
+        return self.translator.translate_records(cqs)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ Serve a single HTTP request.
+
+        Args:
+            reader (asyncio.StreamReader): client stream
+            writer (asyncio.StreamWriter): response stream
+        """
+        try:
+            status, body = await self._route(*await self._read_request(reader))
+        except ValueError as e:
+            status, body = HTTPStatus.BAD_REQUEST, {"status": "ERROR", "message": str(e)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+
+        if isinstance(body, str):
+            payload, content_type = body.encode('utf-8'), "text/plain; version=0.0.4"
+        else:
+            payload, content_type = json.dumps(body).encode('utf-8'), "application/json"
+        headers = [f"HTTP/1.1 {status.value} {status.phrase}",
+                   f"Content-Type: {content_type}",
+                   f"Content-Length: {len(payload)}",
+                   "Connection: close"]
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        """ Read request line, headers and body.
+
+        Args:
+            reader (asyncio.StreamReader): client stream
+
+        Returns:
+            Tuple[str, str, bytes]: method, path and body
+        """
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise ValueError("Malformed request line")
+        method, path, _ = request_line
+
+        content_length = 0
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if line == "":
+                break
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                content_length = int(value.strip())
+        if content_length > MAX_BODY_SIZE:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(content_length) if content_length > 0 else b""
+        return method, path.split('?')[0], body
+
+    async def _route(self, method: str, path: str,
+                     body: bytes) -> Tuple[HTTPStatus, Union[Dict[str, Any], str]]:
+        """ Dispatch a request to its endpoint.
+
+        Args:
+            method (str): HTTP method
+            path (str): request path
+            body (bytes): request body
+
+        Returns:
+            Tuple[HTTPStatus, Union[Dict[str, Any], str]]: response status and JSON or plain text body
+        """
+        if path == '/health' and method == 'GET':
+            return self._health()
+        if path == '/metrics' and method == 'GET':
+            return self._metrics()
+        if path == '/translate' and method == 'POST':
+            return await self._translate(body)
+        return HTTPStatus.NOT_FOUND, {"status": "ERROR", "message": f"No endpoint {method} {path}"}
+
+    def _health(self) -> Tuple[HTTPStatus, Dict[str, Any]]:
+        """ Report if models and the ontology are loaded.
+
+        Returns:
+            Tuple[HTTPStatus, Dict[str, Any]]: response status and body
+        """
+        body = {"status": self.status, "uptime_s": time.time() - self.started_at,
+                "queued": self.queue.qsize() if self.queue else 0, "batches": self.batches,
+                "translated": self.translated}
+        if self.translator is not None:
+            body["ontology"] = self.translator.ontology_mngr.path
+            if self.translator.pipeline.cache:
+                body["cache"] = self.translator.pipeline.cache.stats()
+            if self.translator.embeddings_mngr.vector_cache:
+                body["vector_cache"] = self.translator.embeddings_mngr.vector_cache.stats()
+            return HTTPStatus.OK, body
+        return HTTPStatus.SERVICE_UNAVAILABLE, body
+
+    def _metrics(self) -> Tuple[HTTPStatus, Union[Dict[str, Any], str]]:
+        """ Expose pipeline stage measurements.
+
+        Returns:
+            Tuple[HTTPStatus, Union[Dict[str, Any], str]]: response status and Prometheus text body
+        """
+        if self.translator is None:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"status": "ERROR", "message": f"Translator {self.status}"}
+        return HTTPStatus.OK, self.translator.pipeline.metrics.to_prometheus()
+
+    async def _translate(self, body: bytes) -> Tuple[HTTPStatus, Dict[str, Any]]:
+        """ Queue a CQ for translation and wait for its batch to finish.
+
+        Args:
+            body (bytes): JSON request body with a 'cq' field
+
+        Returns:
+            Tuple[HTTPStatus, Dict[str, Any]]: response status and body
+        """
+        try:
+            cq = json.loads(body.decode('utf-8'))['cq']
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Expected a JSON object with a 'cq' string")
+        if not isinstance(cq, str) or cq.strip() == "":
+            raise ValueError("Expected a JSON object with a 'cq' string")
+        if self.translator is None or self.queue is None:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"status": "ERROR", "message": f"Translator {self.status}"}
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((cq, future))
+        except asyncio.QueueFull:
+            return HTTPStatus.TOO_MANY_REQUESTS, {"status": "ERROR", "message": "Translation queue is full"}
+        return HTTPStatus.OK, await future
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve CQ to SPARQL-OWL translation over HTTP")
+    parser.add_argument('config', nargs='?', default='config.yaml', help='path to config YAML file')
+    parser.add_argument('--host', help='overrides server.host')
+    parser.add_argument('--port', type=int, help='overrides server.port')
+    args = parser.parse_args()
+
+    logging.basicConfig(filename='cq_to_sparql.log', level=logging.DEBUG)
+    config = CQToSPARQLOWL.load_config(args.config)
+    if config is None:
+        parser.error(f"{args.config} is not a valid YAML config")
+    server_config = config.get('server', {})
+    server = TranslationServer(config,
+                               host=args.host or server_config.get('host', '127.0.0.1'),
+                               port=args.port or server_config.get('port', 8080),
+                               max_batch_size=server_config.get('max_batch_size', 32),
+                               max_wait_ms=server_config.get('max_wait_ms', 5.0),
+                               queue_size=server_config.get('queue_size', 1024))
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == '__main__':
+    main()
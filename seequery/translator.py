@@ -1,15 +1,16 @@
 import logging
 import pprint
-from typing import List, Optional, Tuple, Union
+import time
+from typing import Dict, List, Optional, Tuple, Union
 
-import spacy
 import yaml
-from spacy.cli.download import download as spacy_download
 
+from seequery.embeddings.bert_backend import BertBackend
 from seequery.embeddings.embeddings_manager import EmbeddingsManager
 from seequery.ontology.ontology_manager import OntologyManager
 from seequery.pipeline.linker.bert_linker import BertVectorizer
 from seequery.pipeline.pipeline import Pipeline
+from seequery.utils.spacy_processor import SpacyProcessor
 
 
 class CQToSPARQLOWL:
@@ -20,16 +21,34 @@ class CQToSPARQLOWL:
             logging.debug("No config provided. Fallback to default config.yaml")
             self.config = self.load_config('config.yaml')
 
-        self.spacy_nlp = self._load_spacy(self.config['spacy_model'])
-        self.ontology_mngr = OntologyManager(self.config['ontology'])
-        self.embeddings_mngr = BertVectorizer(ontology_mngr=self.ontology_mngr)
+        # seconds spent loading each part, reported by benchmarks
+        self.startup_times: Dict[str, float] = dict()
+        start = time.perf_counter()
+        self.spacy_nlp = SpacyProcessor.from_config(self.config)
+        self.startup_times['spacy'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.ontology_mngr = OntologyManager(self.config['ontology'], self.spacy_nlp)
+        self.startup_times['ontology'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        embeddings_config = self.config.get('embeddings', {})
+        self.embeddings_mngr = BertVectorizer(ontology_mngr=self.ontology_mngr,
+                                              cache_config=embeddings_config.get('vector_cache'),
+                                              backend=BertBackend.from_config(embeddings_config),
+                                              num_layers=embeddings_config.get('num_layers', 0))
+        self.startup_times['bert'] = time.perf_counter() - start
+
+        start = time.perf_counter()
         self.pipeline = Pipeline(self.config['pipeline'],
                                  self.embeddings_mngr,
                                  self.ontology_mngr,
-                                 self.spacy_nlp)
+                                 self.spacy_nlp,
+                                 embeddings_config)
+        self.startup_times['pipeline'] = time.perf_counter() - start
 
     def translate(self, cq: str,
-                  dump_debug_info: bool = False) -> Union[List[str], List[Tuple[List[str], dict]]]:
+                  dump_debug_info: bool = False) -> Union[List[str], List[Tuple[List[str], dict]], None]:
         """Translate CQ into SPARQL-OWL query.
 
             Args:
@@ -39,10 +58,90 @@ class CQToSPARQLOWL:
                 sparql-owl queries (List[str]): SPARQL-OWL query recommendations OR single-item list wih error
                                                 OR a single-item list with tuple
                                                 (recommendations, debug_state)
+                                                OR None if the pipeline reported an error
         """
         logging.debug(f'\n\nTranslating CQ: {cq}')
 
-        output = self.pipeline.run(cq)
+        # cached outputs lack the debug state, run the whole pipeline when it is asked for
+        return self._format_output(self.pipeline.run(cq, use_cache=not dump_debug_info), dump_debug_info)
+
+    def translate_many(self, cqs: List[str], batch_size: int = 64, dump_debug_info: bool = False
+                       ) -> List[Union[List[str], List[Tuple[List[str], dict]], None]]:
+        """Translate many CQs into SPARQL-OWL queries, running each pipeline step over a batch of them.
+
+            Args:
+                cqs (List[str]): Competency Questions as strings
+                batch_size (int): how many CQs go through the pipeline together
+
+            Returns:
+                List[Union[List[str], List[Tuple[List[str], dict]], None]]: what `translate` returns
+                                                                            for each CQ, in input order
+        """
+        logging.debug(f'\n\nTranslating {len(cqs)} CQs in batches of {batch_size}')
+
+        results = []
+        for start in range(0, len(cqs), batch_size):
+            outputs = self.pipeline.run_many(cqs[start:start + batch_size], use_cache=not dump_debug_info)
+            for output in outputs:
+                results.append(self._format_output(output, dump_debug_info))
+        return results
+
+    def translate_records(self, cqs: List[str]) -> List[dict]:
+        """Translate a batch of CQs into JSON serializable records.
+
+            If the batch raises, its CQs are translated again one by one, so that only
+            the CQ at fault is answered with an error.
+
+            Args:
+                cqs (List[str]): Competency Questions as strings
+
+            Returns:
+                List[dict]: for each CQ, in input order, {"cq", "status": "OK", "queries"}
+                            or {"cq", "status": "ERROR", "message"}
+        """
+        try:
+            outputs = self.pipeline.run_many(cqs)
+        except Exception:
+            logging.exception(f"CQToSPARQLOWL::batch of {len(cqs)} CQs failed, translating them one by one")
+            outputs = [self._run_guarded(cq) for cq in cqs]
+
+        records = []
+        for cq, output in zip(cqs, outputs):
+            if 'status' in output and output['status']['type'] == 'ERROR':
+                records.append({"cq": cq, "status": "ERROR", "message": output['status']['message']})
+            elif 'QueryGenerationFailure' in output:
+                records.append({"cq": cq, "status": "ERROR", "message": output['QueryGenerationFailure']})
+            else:
+                records.append({"cq": cq, "status": "OK", "queries": output['queries']})
+        return records
+
+    def _run_guarded(self, cq: str) -> dict:
+        """Run the pipeline on a single CQ, turning an exception into an error status.
+
+            Args:
+                cq (str): Competency Question as string
+
+            Returns:
+                dict: pipeline output, with an ERROR status if the pipeline raised
+        """
+        try:
+            return self.pipeline.run(cq)
+        except Exception as e:
+            logging.exception(f"CQToSPARQLOWL::translation of '{cq}' failed")
+            return {"cq": cq, "status": {"type": "ERROR", "message": str(e)}}
+
+    @staticmethod
+    def _format_output(output: dict,
+                       dump_debug_info: bool) -> Union[List[str], List[Tuple[List[str], dict]], None]:
+        """Turn pipeline output into translation results.
+
+            Args:
+                output (dict): dict with all produced components outputs
+                dump_debug_info (bool): should pipeline output be returned along with queries
+
+            Returns:
+                Union[List[str], List[Tuple[List[str], dict]], None]: see `translate`, None on error
+        """
         if 'status' in output and output['status']['type'] == 'ERROR':
             print(f"ERROR: {output['status']['message']}")
             # pprint.pprint(output)
@@ -65,21 +164,3 @@ class CQToSPARQLOWL:
                 return yaml.safe_load(stream)
             except yaml.YAMLError:
                 return None
-
-    def _load_spacy(self, model_name: str) -> spacy.lang.xx.Language:
-        """If a model name is available, load it, if not, download and load.
-            Args:
-                model_name (str): name of the model to be loaded.
-
-            Returns:
-                spacy model
-        """
-        try:
-            model = spacy.load(model_name)
-        except OSError:
-            logging.debug(
-                f"Model '{model_name}' not found. Downloading and installing.")
-            spacy_download(model_name)
-            model = spacy.load(model_name)
-
-        return model
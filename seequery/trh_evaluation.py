@@ -3,8 +3,6 @@ import sys
 
 from seequery.translator import CQToSPARQLOWL
 
-logging.basicConfig(filename='cq_to_sparql.log', level=logging.DEBUG)
-
 cqs = [
 	"What is the patient’s age?",
 	"Which health issue does the patient report?",
@@ -29,15 +27,16 @@ cqs = [
 ]
 
 def main() -> None:
+    # configured here, not at import, the CQ lists are also imported by benchmarks
+    logging.basicConfig(filename='cq_to_sparql.log', level=logging.DEBUG)
     if len(sys.argv) == 1:
         translator = CQToSPARQLOWL()
     else:
         config = CQToSPARQLOWL.load_config(sys.argv[1])
         translator = CQToSPARQLOWL(config=config)
 
-    for cq in cqs:
+    for cq, query in zip(cqs, translator.translate_many(cqs)):
         print(f"Processing CQ {cq}")
-        query = translator.translate(cq)
         print(query)
         #print(translator.translate(input("Please type your CQ: "), dump_debug_info=True))
         #    print(query)
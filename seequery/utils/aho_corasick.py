@@ -0,0 +1,56 @@
+from collections import deque
+from typing import Dict, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """ Automaton finding every occurrence of many patterns in a single pass over a text. """
+    def __init__(self, patterns: List[str]) -> None:
+        """ Compile patterns into a trie with failure links.
+
+        Args:
+            patterns (List[str]): non-empty patterns, their positions serve as pattern ids
+        """
+        self.patterns = patterns
+        self.goto: List[Dict[str, int]] = [dict()]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append(dict())
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(pattern_id)
+
+        # breadth first, so failure links of shorter prefixes are ready when needed
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find_all(self, text: str) -> Iterator[Tuple[int, int]]:
+        """ Find all, possibly overlapping, occurrences of patterns.
+
+        Args:
+            text (str): text to search in
+
+        Returns:
+            Iterator[Tuple[int, int]]: pairs of (start offset, pattern id), ordered by end offset
+        """
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern_id in self.output[state]:
+                yield position + 1 - len(self.patterns[pattern_id]), pattern_id
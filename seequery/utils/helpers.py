@@ -1,6 +1,9 @@
+import hashlib
 import re
 from typing import List, Tuple
 
+import numpy as np
+
 
 class Helpers:
     @staticmethod
@@ -28,6 +31,22 @@ class Helpers:
         else:
             return ontology_name_or_path
 
+    @staticmethod
+    def file_fingerprint(path: str) -> str:
+        """ Calculate a content hash of a given file.
+
+        Args:
+            path (str): path to the file
+
+        Returns:
+            hex digest of the file contents
+        """
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
     @staticmethod
     def normalize_label(label: str) -> str:
         """ Handle different naming conventions and transform them into common
@@ -62,7 +81,7 @@ class Helpers:
         normalizers = {
             r"[-\"\'”]": "",  # remove all dashes and quotations
             r"\(.*?\)": "",   # remove all ( )
-            r"[ \t]+": " ",   # remove all multiplied whitespaces
+            r"\s+": " ",      # remove all multiplied whitespaces, line breaks included
             r" \?": "?",       # remove whitespaces before ?
             r"a single": "exactly 1",
             r"one": '1',
@@ -75,7 +94,7 @@ class Helpers:
 
         for regex in normalizers:
             cq = re.sub(regex, normalizers[regex], cq)
-        return cq
+        return cq.strip()
 
     @staticmethod
     def is_subspan(a: Tuple[int, int], b: Tuple[int, int]) -> bool:
@@ -114,20 +133,17 @@ class Helpers:
             spans (List[Tuple[int, int]]): list of spans
 
         Returns:
-            Filtered list of spans.
+            Filtered list of spans without duplicates, sorted by their beginning.
         """
         filtered = []
+        max_end = None
 
-        for span in spans:
-            accept = True
-            for compared in spans:
-                if span[0] >= compared[0] and span[1] <= compared[1]:
-                    if span[0] != compared[0] or span[1] != compared[1]:
-                        accept = False
-            if accept:
+        # a span is covered iff an earlier one (starting before it, or at the same
+        # position but ending later) reaches at least as far
+        for span in sorted(set(spans), key=lambda s: (s[0], -s[1])):
+            if max_end is None or span[1] > max_end:
                 filtered.append(span)
-
-        filtered = list(dict.fromkeys(filtered))  # remove duplicates if present
+            max_end = span[1] if max_end is None else max(max_end, span[1])
 
         return filtered
 
@@ -136,3 +152,25 @@ class Helpers:
         if text.endswith('s'):
             return text[:-1]
         return text
+
+    @staticmethod
+    def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+        """ Select indices of the k highest scores without sorting all of them.
+
+        Args:
+            scores (np.ndarray): 1-d array of scores
+            k (int): how many indices to select
+
+        Returns:
+            Indices of the best scores, best first. Ties keep the lower index first.
+        """
+        if k <= 0 or len(scores) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if k >= len(scores):
+            selected = np.arange(len(scores))
+        else:
+            kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            above = np.flatnonzero(scores > kth_score)
+            ties = np.flatnonzero(scores == kth_score)[:k - len(above)]
+            selected = np.concatenate([above, ties])
+        return selected[np.lexsort((selected, -scores[selected]))]
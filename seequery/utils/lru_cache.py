@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """ Bounded in-memory mapping dropping the least recently used entries when full,
+        safe to share between threads. """
+    def __init__(self, capacity: int, max_bytes: int = 0,
+                 sizeof: Optional[Callable[[Any], int]] = None) -> None:
+        """ Create an empty cache.
+
+        Args:
+            capacity (int): most entries kept, 0 keeps none
+            max_bytes (int): most bytes kept as measured by sizeof, 0 for no limit
+            sizeof (Optional[Callable[[Any], int]]): size of a value in bytes, required with max_bytes
+        """
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """ Get an entry and mark it as recently used.
+
+        Args:
+            key (Hashable): entry key
+
+        Returns:
+            Optional[Any]: entry value, None if missing
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """ Store an entry, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (Hashable): entry key
+            value (Any): entry value
+        """
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._size(self._entries[key])
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self.bytes += self._size(value)
+            while len(self._entries) > self.capacity or (self.max_bytes > 0 and self.bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= self._size(evicted)
+
+    def _size(self, value: Any) -> int:
+        return self.sizeof(value) if self.sizeof else 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -46,10 +46,11 @@ class MetaTemplateChunks:
                     object_property_chunks.add(chunk)
 
             chunks_in_template.add(chunk)
-            relations = ecs_used_as_pcs | object_property_chunks | data_property_chunks
-            entities = chunks_in_template - relations
             cnt += 1
 
+        relations = ecs_used_as_pcs | object_property_chunks | data_property_chunks
+        entities = chunks_in_template - relations
+
         if cnt == 0:
             print(template)
 
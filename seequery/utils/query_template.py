@@ -0,0 +1,86 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Union
+
+from seequery.utils.meta_template import MetaTemplateChunks
+
+CHUNK_REGEX = re.compile("<(IS_EC|HAS_EC|EC|PC)[0-9]+>")
+
+
+@dataclass
+class TemplateParts:
+    '''Class for keeping a template split into literal fragments and chunk slots'''
+    fragments: List[str] = field(default_factory=list)
+    slots: List[str] = field(default_factory=list)
+
+    @staticmethod
+    def from_template(template: str) -> 'TemplateParts':
+        """ Split a template around its chunks, keeping angle brackets in fragments.
+
+        Args:
+            template (str): template to split
+        Returns:
+            TemplateParts: literal fragments surrounding chunk ids
+        """
+        fragments = []
+        slots = []
+        last_end = 0
+        for m in CHUNK_REGEX.finditer(template):
+            fragments.append(template[last_end:m.start() + 1])
+            chunk = m.group()[1:-1]  # strip angle brackets
+            # HAS_EC{n} or IS_EC{n} refer to EC{n}
+            slots.append(chunk.split("_")[1] if "_" in chunk else chunk)
+            last_end = m.end() - 1
+        fragments.append(template[last_end:])
+        return TemplateParts(fragments=fragments, slots=slots)
+
+    def fill(self, values: Dict[str, str]) -> str:
+        """ Put a value in place of each chunk.
+
+        Args:
+            values (Dict[str, str]): chunk ids mapped to their values
+        Returns:
+            str: template filled
+        """
+        parts = [""] * (2 * len(self.slots) + 1)
+        parts[0::2] = self.fragments
+        parts[1::2] = [values[slot] for slot in self.slots]
+        return "".join(parts)
+
+
+@dataclass
+class CompiledQueryTemplate:
+    '''Class for keeping a SPARQL-OWL template parsed once, when a mapping is loaded'''
+    normal: TemplateParts = field(default_factory=TemplateParts)
+    reversed: TemplateParts = field(default_factory=TemplateParts)
+    meta: MetaTemplateChunks = field(default_factory=MetaTemplateChunks)
+
+    @staticmethod
+    def compile(variants: Union[str, dict]) -> 'CompiledQueryTemplate':
+        """ Parse a template or its 'normal' and 'reversed' argument order variants.
+
+        Args:
+            variants (Union[str, dict]): template or a dict of template variants
+        Returns:
+            CompiledQueryTemplate: compiled template
+        """
+        if isinstance(variants, dict):
+            normal = variants['normal']
+            reversed_ = variants.get('reversed', normal)
+        else:
+            normal, reversed_ = variants, variants
+        normal_parts = TemplateParts.from_template(normal)
+        return CompiledQueryTemplate(
+            normal=normal_parts,
+            reversed=normal_parts if reversed_ == normal else TemplateParts.from_template(reversed_),
+            meta=MetaTemplateChunks.from_template(normal))
+
+    def variant(self, argswap: bool) -> TemplateParts:
+        """ Choose template variant appropriate for argument order.
+
+        Args:
+            argswap (bool): are arguments swapped?
+        Returns:
+            TemplateParts: variant chosen
+        """
+        return self.reversed if argswap else self.normal
@@ -0,0 +1,113 @@
+import logging
+from typing import Iterable, List, Optional
+
+import spacy
+from spacy.cli.download import download as spacy_download
+from spacy.tokens import Doc
+
+from seequery.pipeline import instrumentation
+
+
+class SpacyProcessor:
+    """ Single entry point to spaCy: runs only the components the pipeline needs
+        (tagger for tag_, attribute_ruler and lemmatizer for lemma_) and batches texts with nlp.pipe.
+    """
+    # components whose output (dependencies, entities) is never read
+    DEFAULT_EXCLUDED = ['parser', 'ner']
+
+    def __init__(self, nlp: spacy.language.Language, batch_size: int = 64) -> None:
+        """ Wrap a loaded spaCy pipeline.
+
+        Args:
+            nlp (spacy.language.Language): spaCy pipeline
+            batch_size (int): how many texts are processed at once by nlp.pipe
+        """
+        self.nlp = nlp
+        self.batch_size = batch_size
+
+    @classmethod
+    def load(cls, model_name: str, exclude: Optional[List[str]] = None,
+             batch_size: int = 64) -> 'SpacyProcessor':
+        """ If a model name is available, load it, if not, download and load.
+
+        Args:
+            model_name (str): name of the model to be loaded
+            exclude (Optional[List[str]]): components not to be loaded, DEFAULT_EXCLUDED if None
+            batch_size (int): how many texts are processed at once by nlp.pipe
+
+        Returns:
+            SpacyProcessor: processor wrapping the model
+        """
+        exclude = cls.DEFAULT_EXCLUDED if exclude is None else exclude
+        try:
+            model = spacy.load(model_name, exclude=exclude)
+        except OSError:
+            logging.debug(
+                f"Model '{model_name}' not found. Downloading and installing.")
+            spacy_download(model_name)
+            model = spacy.load(model_name, exclude=exclude)
+        logging.debug(f"SpacyProcessor::loaded {model_name} with components {model.pipe_names}")
+        return cls(model, batch_size)
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'SpacyProcessor':
+        """ Load a processor described by the application config.
+
+        Args:
+            config (dict): application config, with a `spacy` section or a `spacy_model` name
+
+        Returns:
+            SpacyProcessor: processor wrapping the model
+        """
+        spacy_config = config.get('spacy', {'model': config.get('spacy_model', 'en_core_web_trf')})
+        return cls.load(spacy_config['model'], spacy_config.get('exclude'),
+                        spacy_config.get('batch_size', 64))
+
+    def __call__(self, text: str) -> Doc:
+        """ Process a single text.
+
+        Args:
+            text (str): text to process
+
+        Returns:
+            Doc: processed document
+        """
+        instrumentation.count('spacy_calls')
+        instrumentation.count('spacy_docs')
+        return self.nlp(text)
+
+    def pipe(self, texts: Iterable[str]) -> List[Doc]:
+        """ Process many texts in batches.
+
+        Args:
+            texts (Iterable[str]): texts to process
+
+        Returns:
+            List[Doc]: processed documents, in input order
+        """
+        docs = list(self.nlp.pipe(texts, batch_size=self.batch_size))
+        instrumentation.count('spacy_calls')
+        instrumentation.count('spacy_docs', len(docs))
+        return docs
+
+    def lemmatize(self, text: str) -> str:
+        """ Replace each token of a text with its lemma.
+
+        Args:
+            text (str): text to lemmatize
+
+        Returns:
+            str: space separated lemmas
+        """
+        return self.lemmatize_many([text])[0]
+
+    def lemmatize_many(self, texts: Iterable[str]) -> List[str]:
+        """ Replace each token of many texts with its lemma, in batches.
+
+        Args:
+            texts (Iterable[str]): texts to lemmatize
+
+        Returns:
+            List[str]: space separated lemmas, in input order
+        """
+        return [" ".join([t.lemma_ for t in doc]) for doc in self.pipe(texts)]
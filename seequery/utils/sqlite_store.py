@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class SqliteStore:
+    """ Key-value table in a SQLite file, shared by threads of a process and by processes on one machine.
+
+        Keys are grouped in namespaces, so that entries computed under different settings never mix.
+        The last time each namespace was opened or written is kept, so that namespaces of settings no
+        longer in use can be pruned.
+    """
+    def __init__(self, path: str, table: str) -> None:
+        """ Open the database, creating the file and table if missing.
+
+        Args:
+            path (str): database file
+            table (str): table name
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.table = table
+        # one connection guarded by a lock, the HTTP server loads and translates in different threads
+        self._connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            # write ahead logging lets readers of other processes proceed while one process writes
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                                     f"(namespace TEXT, key TEXT, value BLOB, PRIMARY KEY (namespace, key))")
+            self._connection.execute(f"CREATE TABLE IF NOT EXISTS {table}_namespaces "
+                                     f"(namespace TEXT PRIMARY KEY, last_used REAL)")
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        """ Read an entry.
+
+        Args:
+            namespace (str): namespace of the entry
+            key (str): entry key
+
+        Returns:
+            Optional[bytes]: entry value, None if missing
+        """
+        with self._lock:
+            row = self._connection.execute(f"SELECT value FROM {self.table} WHERE namespace = ? AND key = ?",
+                                           (namespace, key)).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def put(self, namespace: str, key: str, value: bytes) -> None:
+        """ Write an entry, replacing the stored one.
+
+        Args:
+            namespace (str): namespace of the entry
+            key (str): entry key
+            value (bytes): entry value
+        """
+        with self._lock, self._connection:
+            self._connection.execute(f"INSERT OR REPLACE INTO {self.table} (namespace, key, value) "
+                                     f"VALUES (?, ?, ?)", (namespace, key, sqlite3.Binary(value)))
+            self._touch(namespace)
+
+    def get_many(self, namespace: str, keys: List[str]) -> Dict[str, bytes]:
+        """ Read many entries at once.
+
+        Args:
+            namespace (str): namespace of the entries
+            keys (List[str]): entry keys
+
+        Returns:
+            Dict[str, bytes]: values of the keys found
+        """
+        found = dict()
+        with self._lock:
+            # stay below the SQLite limit of bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self._connection.execute(f"SELECT key, value FROM {self.table} "
+                                                f"WHERE namespace = ? AND key IN ({placeholders})",
+                                                [namespace] + chunk).fetchall()
+                found.update({key: bytes(value) for key, value in rows})
+        return found
+
+    def put_many(self, namespace: str, entries: Dict[str, bytes]) -> None:
+        """ Write many entries in a single transaction.
+
+        Args:
+            namespace (str): namespace of the entries
+            entries (Dict[str, bytes]): keys mapped to values
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(f"INSERT OR REPLACE INTO {self.table} (namespace, key, value) "
+                                         f"VALUES (?, ?, ?)",
+                                         [(namespace, key, sqlite3.Binary(value))
+                                          for key, value in entries.items()])
+            self._touch(namespace)
+
+    def count(self, namespace: str) -> int:
+        """ Count entries of a namespace.
+
+        Args:
+            namespace (str): namespace to count
+
+        Returns:
+            int: number of entries
+        """
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM {self.table} WHERE namespace = ?",
+                                            (namespace,)).fetchone()[0]
+
+    def touch(self, namespace: str) -> None:
+        """ Mark a namespace as in use.
+
+        Args:
+            namespace (str): namespace
+        """
+        with self._lock, self._connection:
+            self._touch(namespace)
+
+    def prune(self, max_age: float, keep: Optional[str] = None) -> int:
+        """ Delete namespaces not opened or written for a while, with all their entries.
+
+        Entries of namespaces never marked as in use, written before namespaces were tracked, are deleted too.
+
+        Args:
+            max_age (float): seconds since a namespace was last used after which it is deleted
+            keep (Optional[str]): namespace never deleted, the one in use
+
+        Returns:
+            int: number of namespaces deleted
+        """
+        with self._lock, self._connection:
+            stale = [row[0] for row in self._connection.execute(
+                f"SELECT namespace FROM {self.table}_namespaces WHERE last_used < ? AND namespace IS NOT ?",
+                (time.time() - max_age, keep)).fetchall()]
+            self._connection.executemany(f"DELETE FROM {self.table}_namespaces WHERE namespace = ?",
+                                         [(namespace,) for namespace in stale])
+            untracked = [row[0] for row in self._connection.execute(
+                f"SELECT DISTINCT namespace FROM {self.table} WHERE namespace IS NOT ? AND namespace NOT IN "
+                f"(SELECT namespace FROM {self.table}_namespaces)", (keep,)).fetchall()]
+            self._connection.executemany(f"DELETE FROM {self.table} WHERE namespace = ?",
+                                         [(namespace,) for namespace in untracked])
+        return len(set(stale) | set(untracked))
+
+    def trim(self, namespace: str, max_entries: int) -> int:
+        """ Delete the entries of a namespace written first, until at most max_entries remain.
+
+        Args:
+            namespace (str): namespace to trim
+            max_entries (int): entries kept
+
+        Returns:
+            int: number of entries deleted
+        """
+        with self._lock, self._connection:
+            # rowids grow with each write, replaced entries included, so the smallest ones are the oldest
+            return self._connection.execute(
+                f"DELETE FROM {self.table} WHERE namespace = ? AND rowid NOT IN "
+                f"(SELECT rowid FROM {self.table} WHERE namespace = ? ORDER BY rowid DESC LIMIT ?)",
+                (namespace, namespace, max_entries)).rowcount
+
+    def _touch(self, namespace: str) -> None:
+        """ Record the current time as the last use of a namespace, called within a transaction. """
+        self._connection.execute(f"INSERT OR REPLACE INTO {self.table}_namespaces (namespace, last_used) "
+                                 f"VALUES (?, ?)", (namespace, time.time()))
@@ -47,6 +47,8 @@ setuptools.setup(
     entry_points={
         'console_scripts': [
             'seequery = seequery.translation_loop:main',
+            'seequery-server = seequery.server:main',
+            'seequery-bulk = seequery.bulk_translation:main',
         ],
     }
 )
@@ -0,0 +1,102 @@
+import itertools
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+from seequery.pipeline.linker.contextual_rescorer import ContextualRescorer
+from seequery.pipeline.match_item import MatchItem
+from seequery.pipeline.scored_translation import ScoredTranslation
+from seequery.utils.linking_category import LinkingCategory
+from seequery.utils.meta_template import MetaTemplateChunks
+
+
+class StubOntologyManager:
+    """ Ontology manager with random restriction and usage scores of each (property, lhs, rhs) triple. """
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+        self.onto_map: Dict[LinkingCategory, Dict[str, str]] = {category: dict() for category in LinkingCategory}
+        self.restriction_scores: Dict[Tuple[Any, Any, Any], Tuple[float, bool]] = dict()
+        self.usage_scores: Dict[Tuple[Any, Any, Any], Tuple[float, bool]] = dict()
+
+    def calc_restriction_score(self, relation: Any, lhs: Any, rhs: Any) -> Tuple[float, bool]:
+        key = (relation, lhs, rhs)
+        if key not in self.restriction_scores:
+            self.restriction_scores[key] = (1.0 if self.rng.random() < 0.7 else 0.0, self.rng.random() < 0.3)
+        return self.restriction_scores[key]
+
+    def calc_usage_score(self, relation: Any, lhs: Any, rhs: Any) -> Tuple[float, bool]:
+        key = (relation, lhs, rhs)
+        if key not in self.usage_scores:
+            # coarse scores, so that equally scored combinations occur
+            self.usage_scores[key] = (self.rng.choice([0.0, 0.25, 0.5, 0.75, 1.0]), self.rng.random() < 0.3)
+        return self.usage_scores[key]
+
+
+def make_candidates(rng: random.Random, ontology_mngr: StubOntologyManager, prefix: str,
+                    category: LinkingCategory) -> List[ScoredTranslation]:
+    candidates = []
+    for i in range(rng.randint(0, 6)):
+        label = f'{prefix}{i}'
+        ontology_mngr.onto_map[category][label] = f'obj:{label}'
+        candidates.append(ScoredTranslation(score=rng.choice([0.5, 0.6, 0.7, 0.8, 0.9, 1.0, rng.random()]),
+                                            onto_label=label, category=category))
+    if rng.random() < 0.5:
+        candidates.sort(key=lambda candidate: -candidate.score)
+    return candidates
+
+
+def make_vocab(seed: int) -> Tuple[StubOntologyManager, dict]:
+    rng = random.Random(seed)
+    ontology_mngr = StubOntologyManager(rng)
+    entities = {'EC1', 'EC2'} if rng.random() < 0.7 else {'EC1'}
+    vocab = {'PC1': MatchItem(scored_candidates=make_candidates(rng, ontology_mngr, 'p',
+                                                                LinkingCategory.OBJECT_PROPERTY))}
+    for chunk_idx in entities:
+        vocab[chunk_idx] = MatchItem(scored_candidates=make_candidates(rng, ontology_mngr, chunk_idx,
+                                                                       LinkingCategory.CLASS))
+    meta = MetaTemplateChunks(chunks={'PC1'} | entities, relations={'PC1'}, entities=entities)
+    return ontology_mngr, {'meta': meta, 'vocab': vocab, 'success': True}
+
+
+def exhaustive_best_combination(rescorer: ContextualRescorer, meta_enriched_vocab: dict) -> Tuple[dict, Optional[bool]]:
+    """ Reference search, scoring every combination in itertools.product order. """
+    best, best_score, best_arg_swap = None, 0.0, None
+    for relation, lhs, rhs in itertools.product(*rescorer._construct_all_possible_connections(meta_enriched_vocab)):
+        scored_combination = rescorer._score_combination(relation, lhs, rhs)
+        if scored_combination is not None and scored_combination[0] > best_score:
+            best_score, best_arg_swap = scored_combination
+            best = (relation, lhs, rhs)
+
+    result = {}
+    if best:
+        result['best_property'] = {"obj": best[0][0], "scored_translation": best[0][1]}
+        result['best_lhs'] = {"obj": best[1][0], "scored_translation": best[1][1]}
+    if best and best[2][1]:
+        result['best_rhs'] = {"obj": best[2][0], "scored_translation": best[2][1]}
+    else:
+        result['best_rhs'] = {"obj": None, "scored_translation": None}
+    return result, best_arg_swap
+
+
+@pytest.mark.parametrize('seed', range(500))
+def test_pruned_search_matches_exhaustive_search(seed: int) -> None:
+    ontology_mngr, meta_enriched_vocab = make_vocab(seed)
+    rescorer = ContextualRescorer(ontology_mngr, None)
+
+    expected = exhaustive_best_combination(rescorer, meta_enriched_vocab)
+
+    assert rescorer.get_best_combination(meta_enriched_vocab) == expected
+
+
+def test_upper_bound_is_not_below_combined_score() -> None:
+    rng = random.Random(0)
+    rescorer = ContextualRescorer(StubOntologyManager(rng), None)
+    for _ in range(10000):
+        scores = [rng.random() for _ in range(3)]
+        rhs_score = scores[2] if rng.random() < 0.5 else None
+        relation = ('r', ScoredTranslation(score=scores[0]))
+        lhs = ('l', ScoredTranslation(score=scores[1]))
+        rhs = ('x', ScoredTranslation(score=rhs_score)) if rhs_score is not None else (None, None)
+        combined_score, _ = rescorer._score_combination(relation, lhs, rhs) or (0.0, False)
+        assert rescorer._upper_bound(scores[0], scores[1], rhs_score) >= combined_score